@@ -0,0 +1,397 @@
+"""
+Generator for the Grafana dashboard of the greenhouse.
+
+Builds the dashboard from the plant count and the zone layout, so it does not have to be edited by hand when plants are
+added. The load on InfluxDB does not grow with the number of panels or plants:
+- Each twin is read by a single query, panels showing other fields of the same twin reuse its result
+  (Grafana's "-- Dashboard --" datasource) instead of querying again.
+- Per-plant data is fetched with one pivoted query for all plants instead of one query per field.
+- Greenhouse overviews are grouped per zone and downsampled to the panel's resolution in InfluxDB.
+- Details of single zones are drill-downs: a repeated row per zone selected in the "zone" variable.
+
+The controls (canvas panels) and the 3D greenhouse are taken from the base dashboard.
+
+Example:
+    python generate_dashboard.py --plant_amount 10000 --zone_size 50
+"""
+
+import argparse
+import copy
+import json
+import os
+
+DASHBOARD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grafana_dashboard.json")
+
+DASHBOARD_DATASOURCE = {"type": "datasource", "uid": "-- Dashboard --"}
+
+# lower bound of the window of downsampled queries, Grafana uses it as the minimum of v.windowPeriod
+MIN_INTERVAL = "1m"
+MAX_DATA_POINTS = 500
+
+
+def field(name: str) -> str:
+    """
+    Returns the InfluxDB field of a feature of a twin, as written by the OpenTwins Telegraf service.
+    """
+    return f"value_{name}_properties_value"
+
+
+def field_filter(*names: str) -> str:
+    return " or ".join(f'r._field == "{field(name)}"' for name in names)
+
+
+class DashboardGenerator:
+    """
+    A class that builds the dashboard panels and their queries.
+
+    Attributes:
+        plant_amount (int): The number of plants in the greenhouse.
+        zone_size (int): The number of neighbouring plants in a zone.
+        namespace (str): The namespace of the twins.
+        datasource (dict): The InfluxDB datasource of the queries.
+        bucket (str): The InfluxDB bucket the twin data is stored in.
+    """
+
+    def __init__(self, plant_amount: int, zone_size: int, namespace: str, datasource: dict, bucket: str = "default"):
+        self.plant_amount = plant_amount
+        self.zone_size = zone_size
+        self.namespace = namespace
+        self.datasource = datasource
+        self.bucket = bucket
+        self.container_id = f"{namespace}:my_plants"
+        self.panels = []
+        self._next_id = 1
+        self._y = 0
+
+    @property
+    def zone_count(self) -> int:
+        return (self.plant_amount + self.zone_size - 1) // self.zone_size
+
+    def source(self) -> str:
+        return f'from(bucket: "{self.bucket}")\n  |> range(start: v.timeRangeStart, stop: v.timeRangeStop)'
+
+    def thing_query(self, thing_id: str, *names: str) -> str:
+        """
+        Returns a query for the latest values of several features of one twin.
+        """
+        return (
+            f"{self.source()}\n"
+            f'  |> filter(fn: (r) => r.thingId == "{thing_id}")\n'
+            f"  |> filter(fn: (r) => {field_filter(*names)})\n"
+            "  |> last()"
+        )
+
+    def add_panel(self, panel: dict, x: int, w: int, h: int, y_offset: int = 0) -> int:
+        panel["id"] = self._next_id
+        panel["gridPos"] = {"h": h, "w": w, "x": x, "y": self._y + y_offset}
+        self._next_id += 1
+        self.panels.append(panel)
+        return panel["id"]
+
+    def add_row(self, title: str, repeat: str = None):
+        row = {"collapsed": False, "panels": [], "title": title, "type": "row"}
+        if repeat is not None:
+            row["repeat"] = repeat
+        self.add_panel(row, 0, 24, 1)
+        self._y += 1
+
+    def end_row(self, height: int):
+        self._y += height
+
+    def stat(self, title: str, feature: str, targets: list, datasource: dict = None, **options) -> dict:
+        """
+        Returns a stat panel showing the latest value of a feature.
+        The targets either query InfluxDB or reference the query of another panel.
+        """
+        panel = {
+            "datasource": datasource or self.datasource,
+            "fieldConfig": {
+                "defaults": {
+                    "color": {"mode": "thresholds"},
+                    "mappings": [],
+                    "thresholds": {"mode": "absolute", "steps": [{"color": "green", "value": None}]},
+                },
+                "overrides": [],
+            },
+            "options": {
+                "colorMode": "value",
+                "graphMode": "none",
+                "justifyMode": "auto",
+                "orientation": "auto",
+                "percentChangeColorMode": "standard",
+                "reduceOptions": {"calcs": ["lastNotNull"], "fields": f"/^{field(feature)}/", "values": False},
+                "showPercentChange": False,
+                "textMode": "value",
+                "wideLayout": True,
+            },
+            "pluginVersion": "11.3.0",
+            "targets": targets,
+            "title": title,
+            "type": "stat",
+        }
+        panel["options"].update(options)
+        return panel
+
+    def stat_group(self, thing_id: str, stats: list, x: int, w: int, h: int, columns: int, y_offset: int = 0):
+        """
+        Adds stat panels for several features of one twin, backed by a single query.
+
+        Parameters:
+            thing_id (str): The twin the features belong to.
+            stats (list): (title, feature) pairs.
+            x (int): The horizontal position of the group.
+            w (int): The width of each panel.
+            h (int): The height of each panel.
+            columns (int): The number of panels per line.
+            y_offset (int): The vertical position of the group within the row.
+        """
+        query = self.thing_query(thing_id, *(feature for _, feature in stats))
+        source_id = None
+        for i, (title, feature) in enumerate(stats):
+            if source_id is None:
+                targets = [{"datasource": self.datasource, "query": query, "refId": "A"}]
+                datasource = self.datasource
+            else:
+                targets = [{"datasource": DASHBOARD_DATASOURCE, "panelId": source_id, "refId": "A"}]
+                datasource = DASHBOARD_DATASOURCE
+            panel_id = self.add_panel(
+                self.stat(title, feature, targets, datasource),
+                x + (i % columns) * w,
+                w,
+                h,
+                y_offset + (i // columns) * h,
+            )
+            source_id = source_id or panel_id
+
+    def timeseries(self, title: str, query: str) -> dict:
+        """
+        Returns a time series panel, downsampled to at most MAX_DATA_POINTS windows of at least MIN_INTERVAL.
+        """
+        defaults = {"custom": {"drawStyle": "line", "lineWidth": 1, "fillOpacity": 0, "spanNulls": True}}
+        return {
+            "datasource": self.datasource,
+            "fieldConfig": {"defaults": defaults, "overrides": []},
+            "interval": MIN_INTERVAL,
+            "maxDataPoints": MAX_DATA_POINTS,
+            "options": {
+                "legend": {"displayMode": "list", "placement": "bottom", "showLegend": True},
+                "tooltip": {"mode": "multi", "sort": "none"},
+            },
+            "pluginVersion": "11.3.0",
+            "targets": [{"datasource": self.datasource, "query": query, "refId": "A"}],
+            "title": title,
+            "type": "timeseries",
+        }
+
+    def plants_query(self) -> str:
+        """
+        Returns the query of the 3D greenhouse: the age and recommended action of every plant, pivoted into one row
+        per plant, and the position and action of the robot.
+        """
+        return (
+            'import "strings"\n'
+            'import "join"\n'
+            "\n"
+            f"{self.source()}\n"
+            f'  |> filter(fn: (r) => r.parent == "{self.container_id}")\n'
+            f'  |> filter(fn: (r) => {field_filter("datetime_planted", "soil_moisture", "soil_nutrients")})\n'
+            "  |> last()\n"
+            '  |> keep(columns: ["thingId", "_field", "_value"])\n'
+            "  |> map(fn: (r) => ({r with _value: string(v: r._value)}))\n"
+            "  |> group()\n"
+            '  |> pivot(rowKey: ["thingId"], columnKey: ["_field"], valueColumn: "_value")\n'
+            "  |> map(fn: (r) => {\n"
+            '    parts = strings.split(v: r.thingId, t: "_")\n'
+            "    return {\n"
+            "      plant_id: parts[length(arr: parts) - 1],\n"
+            f"      age: r.{field('datetime_planted')},\n"
+            f"      recommended_action: if exists r.{field('soil_moisture')} and float(v: r.{field('soil_moisture')}) < 50.0 then \"water\"\n"
+            f"                          else if exists r.{field('soil_nutrients')} and float(v: r.{field('soil_nutrients')}) < 50.0 then \"fertilize\"\n"
+            '                          else ""\n'
+            "    }\n"
+            "  })\n"
+            '  |> yield(name: "plant_with_soil")\n'
+            "\n"
+            "robot_pos = "
+            + self.thing_query(f"{self.namespace}:my_robot", "position")
+            + '\n  |> keep(columns: ["_value"])\n'
+            '  |> set(key: "temp_id", value: "id")\n'
+            '  |> rename(columns: {_value: "position"})\n'
+            "\n"
+            "robot_action = "
+            + self.thing_query(f"{self.namespace}:my_robot", "action")
+            + '\n  |> keep(columns: ["_value", "_time"])\n'
+            '  |> set(key: "temp_id", value: "id")\n'
+            '  |> rename(columns: {_value: "action"})\n'
+            "\n"
+            "join.full(\n"
+            "  left: robot_pos,\n"
+            "  right: robot_action,\n"
+            "  on: (l, r) => l.temp_id == r.temp_id,\n"
+            "  as: (l, r) => ({position: l.position, action: r.action, time: r._time})\n"
+            ")"
+        )
+
+    def zone_averages_query(self) -> str:
+        """
+        Returns the query of the mean soil moisture and nutrient level of each zone over time.
+        Each plant is downsampled first, so the zone of a row is only computed once per plant and window.
+        """
+        return (
+            'import "strings"\n'
+            "\n"
+            f"{self.source()}\n"
+            f'  |> filter(fn: (r) => r.parent == "{self.container_id}")\n'
+            f'  |> filter(fn: (r) => {field_filter("soil_moisture", "soil_nutrients")})\n'
+            "  |> aggregateWindow(every: v.windowPeriod, fn: mean, createEmpty: false)\n"
+            "  |> map(fn: (r) => {\n"
+            '    parts = strings.split(v: r.thingId, t: "_")\n'
+            f"    return {{r with zone: string(v: (int(v: parts[length(arr: parts) - 1]) - 1) / {self.zone_size} + 1)}}\n"
+            "  })\n"
+            '  |> group(columns: ["zone", "_field"])\n'
+            "  |> aggregateWindow(every: v.windowPeriod, fn: mean, createEmpty: false)"
+        )
+
+    def plant_status_query(self) -> str:
+        """
+        Returns the query of the number of plants per health and ripeness state.
+        """
+        return (
+            f"{self.source()}\n"
+            f'  |> filter(fn: (r) => r.parent == "{self.container_id}")\n'
+            f'  |> filter(fn: (r) => {field_filter("health", "ripeness")})\n'
+            "  |> last()\n"
+            '  |> group(columns: ["_value"])\n'
+            '  |> count(column: "thingId")\n'
+            '  |> rename(columns: {_value: "state", thingId: "_value"})'
+        )
+
+    def zone_query(self) -> str:
+        """
+        Returns the query of the soil of all plants of the zone selected by the repeated row, downsampled.
+        """
+        return (
+            f"{self.source()}\n"
+            f'  |> filter(fn: (r) => r.thingId =~ /^{self.container_id}:plant_(${{zone:raw}})$/)\n'
+            f'  |> filter(fn: (r) => {field_filter("soil_moisture", "soil_nutrients")})\n'
+            "  |> aggregateWindow(every: v.windowPeriod, fn: mean, createEmpty: false)"
+        )
+
+    def zone_variable(self) -> dict:
+        """
+        Returns the variable selecting the zones shown in detail.
+        The value of a zone is the alternation of its plant numbers, used to filter on the indexed thingId tag.
+        """
+        options = []
+        for zone in range(self.zone_count):
+            first = zone * self.zone_size + 1
+            last = min(first + self.zone_size, self.plant_amount + 1)
+            plants = "|".join(str(i) for i in range(first, last))
+            options.append({"selected": zone == 0, "text": str(zone + 1), "value": plants})
+        return {
+            "current": {"text": [options[0]["text"]], "value": [options[0]["value"]]},
+            "includeAll": False,
+            "label": "Zone",
+            "multi": True,
+            "name": "zone",
+            "options": options,
+            "query": ", ".join(f"{o['text']} : {o['value']}" for o in options),
+            "type": "custom",
+        }
+
+    def build(self, base: dict) -> dict:
+        """
+        Builds the dashboard, taking the control panels and the 3D greenhouse from the base dashboard.
+        """
+        base_panels = {panel["title"]: panel for panel in base["panels"]}
+        robot_id = f"{self.namespace}:my_robot"
+        plant_id = f"{self.container_id}:plant_${{plant_id}}"
+
+        self.add_row("Robot")
+        self.add_panel(copy.deepcopy(base_panels["Set Robot State/Activity"]), 0, 10, 7)
+        self.stat_group(robot_id, [("Current Activity/State", "state")], 10, 6, 4, 1)
+        arm = {"options": {"content": "${arm_pos}", "mode": "markdown"}, "title": "Arm Position", "type": "text"}
+        self.add_panel(arm, 10, 3, 3, 4)
+        self.stat_group(robot_id, [("Position", "position")], 13, 3, 3, 1, 4)
+        self.end_row(7)
+
+        self.add_row("Plants")
+        unity = copy.deepcopy(base_panels["3D Greenhouse"])
+        unity["targets"] = [{"datasource": self.datasource, "query": self.plants_query(), "refId": "A"}]
+        self.add_panel(unity, 0, 14, 13)
+        self.add_panel(copy.deepcopy(base_panels["Do at plant ${plant_id}:"]), 14, 8, 7)
+        plant_stats = [
+            ("Plant Health", "health"),
+            ("Ripeness", "ripeness"),
+            ("Soil Moisture", "soil_moisture"),
+            ("Soil Nutrient Level", "soil_nutrients"),
+        ]
+        self.stat_group(plant_id, plant_stats, 14, 3, 3, 2, 7)
+        self.end_row(13)
+
+        self.add_row("Irrigation")
+        irrigation_stats = [
+            ("Flow rate", "flow_rate"),
+            ("Water used", "water_used"),
+            ("Fertigation used", "fertigation_used"),
+        ]
+        self.stat_group(f"{self.namespace}:irrigation", irrigation_stats, 0, 4, 4, 3)
+        self.end_row(4)
+
+        self.add_row("Environment")
+        environment_stats = [("Humidity", "humidity"), ("Temperature", "temperature"), ("Light", "light")]
+        self.stat_group(f"{self.namespace}:my_env", environment_stats, 0, 5, 3, 3)
+        self.end_row(3)
+
+        self.add_row("Greenhouse")
+        status = self.stat(
+            "Plant Status",
+            "health",
+            [{"datasource": self.datasource, "query": self.plant_status_query(), "refId": "A"}],
+            textMode="value_and_name",
+        )
+        status["options"]["reduceOptions"]["fields"] = ""
+        status["fieldConfig"]["defaults"]["displayName"] = "${__field.labels.state}"
+        self.add_panel(status, 0, 6, 8)
+        self.add_panel(self.timeseries("Zone Averages", self.zone_averages_query()), 6, 18, 8)
+        self.end_row(8)
+
+        self.add_row("Zone ${zone:text}", repeat="zone")
+        self.add_panel(self.timeseries("Soil of the Plants in Zone ${zone:text}", self.zone_query()), 0, 24, 8)
+        self.end_row(8)
+
+        dashboard = {key: value for key, value in base.items() if key not in ("panels", "templating")}
+        dashboard["panels"] = self.panels
+        variables = [v for v in base["templating"]["list"] if v["name"] != "zone"]
+        dashboard["templating"] = {"list": variables + [self.zone_variable()]}
+        return dashboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the Grafana dashboard of the greenhouse.")
+    parser.add_argument("--plant_amount", type=int, default=20, help="Number of plants (default: 20)")
+    parser.add_argument("--zone_size", type=int, default=5, help="Number of neighbouring plants in a zone (default: 5)")
+    parser.add_argument("--namespace", type=str, default="ba", help="Namespace of the twins (default: ba)")
+    parser.add_argument("--bucket", type=str, default="default", help="InfluxDB bucket of the twin data (default: default)")
+    parser.add_argument("--refresh", type=str, default=None, help="Auto refresh interval of the dashboard, e.g. 30s (default: off)")
+    parser.add_argument("--base", type=str, default=DASHBOARD_FILE, help="Dashboard to take the control panels from")
+    parser.add_argument("--output", type=str, default=DASHBOARD_FILE, help="File to write the dashboard to")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    unity = next(panel for panel in base["panels"] if panel["type"] == "ertis-unity-panel")
+
+    generator = DashboardGenerator(args.plant_amount, args.zone_size, args.namespace, unity["datasource"], args.bucket)
+    dashboard = generator.build(base)
+    if args.refresh is not None:
+        dashboard["refresh"] = args.refresh
+
+    with open(args.output, "w") as f:
+        json.dump(dashboard, f, indent=2)
+        f.write("\n")
+    print(f"Wrote dashboard with {generator.zone_count} zones to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
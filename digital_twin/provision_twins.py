@@ -0,0 +1,259 @@
+"""
+Provisioning tool for the digital twins of the greenhouse.
+
+Creates the plant container twin and one plant twin per plant (my_plants:plant_1..N) from the twin type templates
+in the "twin_types" directory and links the plants to the container in the OpenTwins hierarchy.
+
+The tool is idempotent: existing twins are fetched in bulk and compared with the templates. Missing twins are created,
+differing twins are patched (only the differing attributes and missing features, so measured values are kept)
+and matching twins are left alone. Requests are sent concurrently over persistent connections and retried on failure.
+
+Example:
+    python provision_twins.py --plant_amount 10000 --ditto_url http://localhost:8080
+"""
+
+import argparse
+import base64
+import copy
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse
+
+TWIN_TYPES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "twin_types")
+
+# attribute with which OpenTwins links a twin to its parent in the hierarchy
+PARENTS_ATTRIBUTE = "_parents"
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class DittoClient:
+    """
+    A minimal client for the things endpoint of the Eclipse Ditto HTTP API.
+    Each thread keeps its own persistent connection, so concurrent requests reuse their TCP connections.
+    """
+
+    def __init__(self, url: str, username: str, password: str, timeout: float = 30, retries: int = 5):
+        parsed = urlparse(url)
+        self.scheme = parsed.scheme or "http"
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip("/") + "/api/2/things"
+        self.timeout = timeout
+        self.retries = retries
+        credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {credentials}"}
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body=None, content_type="application/json", headers=None):
+        """
+        Sends a request and returns its status code and parsed JSON body (or None).
+        Connection errors and transient server errors are retried with exponential backoff.
+        """
+        all_headers = dict(self.headers, **(headers or {}))
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            all_headers["Content-Type"] = content_type
+
+        for attempt in range(self.retries + 1):
+            try:
+                connection = self._connection()
+                connection.request(method, self.base_path + path, body=payload, headers=all_headers)
+                response = connection.getresponse()
+                data = response.read()
+                if response.status in RETRY_STATUS_CODES and attempt < self.retries:
+                    time.sleep(min(0.2 * 2**attempt, 10))
+                    continue
+                return response.status, json.loads(data) if data else None
+            except (OSError, http.client.HTTPException):
+                self._local.connection = None  # reconnect on the next attempt
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(0.2 * 2**attempt, 10))
+
+    def get_things(self, thing_ids: list[str]) -> dict:
+        """
+        Retrieves several things with one request.
+        Returns the existing things by thing ID, missing things are left out.
+        """
+        ids = ",".join(quote(thing_id, safe=":") for thing_id in thing_ids)
+        status, body = self.request("GET", f"?ids={ids}")
+        if status != 200:
+            raise RuntimeError(f"Retrieving things failed with status {status}: {body}")
+        return {thing["thingId"]: thing for thing in body or []}
+
+    def create_thing(self, thing: dict) -> int:
+        # If-None-Match prevents replacing a thing that was created in the meantime
+        status, _ = self.request(
+            "PUT", "/" + quote(thing["thingId"], safe=":"), thing, headers={"If-None-Match": "*"}
+        )
+        return status
+
+    def patch_thing(self, thing_id: str, patch: dict) -> int:
+        status, _ = self.request(
+            "PATCH", "/" + quote(thing_id, safe=":"), patch, content_type="application/merge-patch+json"
+        )
+        return status
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = (
+                http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            )
+            connection = connection_class(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+
+def load_template(file_name: str) -> dict:
+    with open(os.path.join(TWIN_TYPES_DIR, file_name)) as f:
+        return json.load(f)
+
+
+def make_thing(template: dict, thing_id: str, parent_id: str = None) -> dict:
+    """
+    Creates the desired state of a twin from a twin type template.
+    """
+    thing = copy.deepcopy(template)
+    thing["thingId"] = thing_id
+    if parent_id is not None:
+        thing.setdefault("attributes", {})[PARENTS_ATTRIBUTE] = parent_id
+    return thing
+
+
+def diff_thing(desired: dict, existing: dict):
+    """
+    Computes the merge patch that brings an existing twin to the desired state.
+    Only differing attributes, the policy and missing features are patched, existing feature values are kept.
+
+    Returns:
+        dict | None: The merge patch, or None if the twin is up to date.
+    """
+    patch = {}
+    if desired.get("policyId") != existing.get("policyId"):
+        patch["policyId"] = desired.get("policyId")
+
+    existing_attributes = existing.get("attributes", {})
+    attributes = {
+        key: value
+        for key, value in desired.get("attributes", {}).items()
+        if existing_attributes.get(key) != value
+    }
+    if attributes:
+        patch["attributes"] = attributes
+
+    existing_features = existing.get("features", {})
+    features = {
+        name: feature
+        for name, feature in desired.get("features", {}).items()
+        if name not in existing_features
+    }
+    if features:
+        patch["features"] = features
+
+    return patch or None
+
+
+def provision_batch(client: DittoClient, things: list[dict]) -> dict:
+    """
+    Provisions a batch of twins: fetches the existing ones with one request, then creates or patches as needed.
+    """
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    existing = client.get_things([thing["thingId"] for thing in things])
+
+    for thing in things:
+        current = existing.get(thing["thingId"])
+        if current is None:
+            status = client.create_thing(thing)
+            if status == 412:  # created concurrently, compare again
+                current = client.get_things([thing["thingId"]]).get(thing["thingId"])
+            else:
+                counts["created" if status in (200, 201, 204) else "failed"] += 1
+                continue
+
+        patch = diff_thing(thing, current)
+        if patch is None:
+            counts["unchanged"] += 1
+            continue
+        status = client.patch_thing(thing["thingId"], patch)
+        counts["updated" if status in (200, 201, 204) else "failed"] += 1
+
+    return counts
+
+
+def generate_plants(namespace: str, container: str, plant_amount: int, container_id: str):
+    """
+    Generates the desired state of each plant twin, one at a time.
+    """
+    template = load_template("plant_type.json")
+    for i in range(1, plant_amount + 1):
+        yield make_thing(template, f"{namespace}:{container}:plant_{i}", container_id)
+
+
+def provision(client: DittoClient, namespace: str, container: str, plant_amount: int, workers: int = 16, batch_size: int = 50) -> dict:
+    """
+    Provisions the plant container and all plant twins.
+    The plants are streamed in batches to a pool of workers, with a bounded number of batches in flight.
+
+    Returns:
+        dict: The number of created, updated, unchanged and failed twins.
+    """
+    container_id = f"{namespace}:{container}"
+    totals = provision_batch(client, [make_thing(load_template("plant_container_type.json"), container_id)])
+
+    in_flight = threading.Semaphore(workers * 2)
+    lock = threading.Lock()
+
+    def run(batch):
+        try:
+            counts = provision_batch(client, batch)
+        except Exception as e:
+            print(f"Batch starting with {batch[0]['thingId']} failed: {e}")
+            counts = {"failed": len(batch)}
+        finally:
+            in_flight.release()
+        with lock:
+            for key, value in counts.items():
+                totals[key] = totals.get(key, 0) + value
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch = []
+        for thing in generate_plants(namespace, container, plant_amount, container_id):
+            batch.append(thing)
+            if len(batch) == batch_size:
+                in_flight.acquire()
+                executor.submit(run, batch)
+                batch = []
+        if batch:
+            in_flight.acquire()
+            executor.submit(run, batch)
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or update the plant twins in Eclipse Ditto.")
+    parser.add_argument("--plant_amount", type=int, required=True, help="Number of plant twins")
+    parser.add_argument("--ditto_url", type=str, default="http://localhost:8080", help="URL of the Ditto HTTP API (default: http://localhost:8080)")
+    parser.add_argument("--username", type=str, default="ditto", help="Ditto user (default: ditto)")
+    parser.add_argument("--password", type=str, default="ditto", help="Ditto password (default: ditto)")
+    parser.add_argument("--namespace", type=str, default="ba", help="Namespace of the twins (default: ba)")
+    parser.add_argument("--container", type=str, default="my_plants", help="Name of the plant container twin (default: my_plants)")
+    parser.add_argument("--workers", type=int, default=16, help="Number of concurrent connections (default: 16)")
+    parser.add_argument("--batch_size", type=int, default=50, help="Number of twins fetched per request (default: 50)")
+    args = parser.parse_args()
+
+    client = DittoClient(args.ditto_url, args.username, args.password)
+    start = time.time()
+    totals = provision(client, args.namespace, args.container, args.plant_amount, args.workers, args.batch_size)
+    print(f"Provisioned {args.plant_amount} plants in {time.time() - start:.1f}s: {totals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+This module detects anomalies in the soil moisture and nutrient levels of the plants while the simulation runs,
+e.g. sensor drift, leaking or blocked valves and sudden jumps.
+
+The detectors look at the change of a level per cycle that is not explained by the irrigation, i.e. the observed
+change minus the flow of the plant's valve. Normally this residual is the plant's consumption. Each plant keeps an
+exponentially weighted moving average and variance of its residual, and an alert is raised when a residual deviates
+from the average by more than z_threshold standard deviations (z-score), or when the level changes by more than
+max_rate in one cycle (rate of change). Cycles in which a level is at its limit (0 or 1) are skipped, as the change
+is clipped there.
+
+The state of all plants is held in flat arrays (O(1) per plant) and updated in one pass per cycle. This pass is
+plain Python and takes about 2 microseconds per plant for both levels, i.e. about 2 ms per cycle at 1,000 plants,
+20 ms at 10,000 plants and 0.2 s at 100,000 plants. The detection is therefore disabled by default
+(anomaly_detection.enabled) and supported for greenhouses of up to 10,000 plants.
+"""
+
+from array import array
+import math
+
+# detected quantities, the plant attribute holding each level and the irrigation line feeding it
+QUANTITIES = {
+    "soil_moisture": ("moisture_level", "water"),
+    "soil_nutrients": ("nutrient_level", "fertigation"),
+}
+
+
+class LevelDetector:
+    """
+    A class detecting anomalies in one level (e.g. the soil moisture) of all plants.
+
+    Attributes:
+        quantity (str): The name of the level, as the feature of the plant twins.
+        mean, variance (array[float]): The moving average and variance of each plant's residual change per cycle.
+        last (array[float]): The level of each plant in the previous cycle, NaN before the first cycle.
+        samples (array[int]): The number of residuals seen per plant.
+        active (bytearray): The current alert per plant: 0 none, 1 z-score, 2 rate of change.
+    """
+
+    DETECTORS = (None, "zscore", "rate")
+
+    def __init__(self, quantity: str, plant_count: int):
+        self.quantity = quantity
+        self.mean = array("d", bytes(8 * plant_count))
+        self.variance = array("d", bytes(8 * plant_count))
+        self.last = array("d", [math.nan]) * plant_count
+        self.samples = array("i", bytes(4 * plant_count))
+        self.active = bytearray(plant_count)
+
+    def step(self, values, inflow, detector) -> list:
+        """
+        Updates the detector with the levels of one cycle.
+
+        Parameters:
+            values (list[float]): The level of each plant.
+            inflow (list[float]): The flow of each plant's valve during the cycle.
+            detector (AnomalyDetector): The settings.
+        Returns:
+            list[tuple[int, dict | None]]: The plants whose alert changed, with the new alert or None if it cleared.
+        """
+        alpha = detector.alpha
+        z_threshold = detector.z_threshold
+        max_rate = detector.max_rate
+        min_deviation = detector.min_deviation
+        warmup = detector.warmup
+        mean, variance, last, samples, active = self.mean, self.variance, self.last, self.samples, self.active
+        changes = []
+
+        for i, (value, flow) in enumerate(zip(values, inflow)):
+            previous = last[i]
+            last[i] = value
+            if previous != previous or value <= 0.0 or value >= 1.0:  # first cycle (NaN) or clipped level
+                continue
+            change = value - previous
+            residual = change - flow
+            deviation = residual - mean[i]
+            n = samples[i]
+            if abs(change) > max_rate:
+                state, score = 2, change
+            elif n >= warmup and abs(deviation) > min_deviation and deviation * deviation > z_threshold * z_threshold * variance[i]:
+                state, score = 1, deviation / math.sqrt(variance[i]) if variance[i] > 0 else math.inf
+            else:
+                state = 0
+            # anomalous residuals are not learned, so a fault does not become the new normal
+            if state == 0 or n < warmup:
+                mean[i] += alpha * deviation
+                variance[i] = (1 - alpha) * (variance[i] + alpha * deviation * deviation)
+                samples[i] = n + 1
+            if state != active[i]:
+                active[i] = state
+                changes.append((i, None if state == 0 else {
+                    "detector": self.DETECTORS[state],
+                    "score": score if math.isfinite(score) else None,
+                    "value": value * 100,
+                    "change": change * 100,
+                    "expected_change": (flow + mean[i]) * 100,
+                }))
+        return changes
+
+
+class AnomalyDetector:
+    """
+    A class detecting anomalies in the soil moisture and nutrient levels of all plants, see the module description.
+
+    Attributes:
+        alpha (float): The weight of a new residual in the moving average and variance (0 to 1).
+        z_threshold (float): The deviation in standard deviations above which an alert is raised.
+        max_rate (float): The change of a level per cycle above which an alert is raised.
+        min_deviation (float): The deviation below which no z-score alert is raised, against alerts on tiny variances.
+        warmup (int): The number of cycles a plant is observed before z-score alerts are raised.
+        detectors (dict[str, LevelDetector]): The detector of each level, by quantity.
+        alert_count (int): The number of alerts raised.
+    """
+
+    def __init__(self, plant_count: int, alpha: float = 0.05, z_threshold: float = 5.0, max_rate: float = 0.2, min_deviation: float = 0.02, warmup: int = 20):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.max_rate = max_rate
+        self.min_deviation = min_deviation
+        self.warmup = warmup
+        self.detectors = {quantity: LevelDetector(quantity, plant_count) for quantity in QUANTITIES}
+        self.alert_count = 0
+
+    def step(self, plants, water_flow: list, fertigation_flow: list) -> list:
+        """
+        Updates the detectors with the current levels of the plants and the flow of their valves.
+
+        Parameters:
+            plants (list[Plant]): The plants.
+            water_flow, fertigation_flow (list[float]): The flows of the valves by plant ID the levels were
+                updated with in this cycle.
+        Returns:
+            list[tuple[int, str, dict | None]]: The (0-based) plant ID, quantity and new alert (None if cleared)
+            of each changed alert.
+        """
+        flows = {"water": water_flow, "fertigation": fertigation_flow}
+        changes = []
+        for quantity, (attribute, line) in QUANTITIES.items():
+            values = [getattr(plant, attribute) for plant in plants]
+            for plant_id, alert in self.detectors[quantity].step(values, flows[line], self):
+                changes.append((plant_id, quantity, alert))
+                self.alert_count += alert is not None
+        return changes
+
+    def reset(self, plant_id: int):
+        """
+        Forgets the history of a plant, e.g. after it was seeded or harvested.
+        """
+        for detector in self.detectors.values():
+            detector.mean[plant_id] = 0.0
+            detector.variance[plant_id] = 0.0
+            detector.last[plant_id] = math.nan
+            detector.samples[plant_id] = 0
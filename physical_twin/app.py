@@ -0,0 +1,315 @@
+"""
+This module provides the application factory of the physical twin.
+
+create_app() only loads the configuration. The components (plants, robot, queues, ...) are constructed on first
+access, and the simulation, MQTT client and HTTP server are only imported and started when requested, so e.g.
+benchmarks and worker processes can use a headless robot without paying for the network stack.
+
+Example:
+    app = create_app("greenhouse.json", {"http": {"enabled": False}})
+    app.run()
+"""
+
+from functools import cached_property
+from queue import Queue
+import threading
+from config import load_config
+
+
+class Application:
+    """
+    A class wiring the components of one physical twin according to its configuration.
+
+    Each application has its own simulation and irrigation system, so several applications can run in one process.
+    Components can be replaced before they are first accessed, e.g. to share the measurement queue of several
+    applications.
+
+    Attributes:
+        config (dict): The configuration, see config.DEFAULT_CONFIG.
+        threads (list[threading.Thread]): The started background threads.
+        vision_executor (Executor): Optional worker pool for the image analysis shared with other applications.
+        command_subscriber (CommandSubscriber): The receiver of the MQTT commands, once started.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.threads = []
+        self.vision_executor = None
+        self.command_subscriber = None
+
+    @cached_property
+    def plants(self) -> list:
+        from model.plant import Plant
+
+        return [
+            Plant(id=i, rng=self.random_streams.stream("plant", i, "planted"), **self.config["plant"])
+            for i in range(self.config["plant_amount"])
+        ]
+
+    @cached_property
+    def random_streams(self):
+        from util.rng import RandomStreams
+
+        return RandomStreams(self.config["simulation"]["seed"])
+
+    @cached_property
+    def environment(self):
+        from model.environment import Environment
+
+        return Environment()
+
+    @cached_property
+    def environment_field(self):
+        from model.environment_field import EnvironmentField
+
+        simulation_config = self.config["simulation"]
+        return EnvironmentField(
+            self.environment,
+            rows=simulation_config["zone_rows"],
+            cols=simulation_config["zone_cols"],
+            plant_count=self.config["plant_amount"],
+        )
+
+    @cached_property
+    def irrigation_system(self):
+        import effectors.irrigation as irrigation
+
+        return irrigation.IrrigationSystem(self.config["plant_amount"], zone_size=self.config["irrigation"]["zone_size"])
+
+    @cached_property
+    def simulation(self):
+        from simulation import Simulation
+
+        simulation = Simulation(
+            self.environment,
+            self.plants,
+            self.config["simulation"]["cycle_time"],
+            self.environment_field,
+            self.irrigation_controller,
+            self.irrigation_system,
+            self.random_streams,
+        )
+        simulation.anomaly_detector = self.anomaly_detector
+        return simulation
+
+    @cached_property
+    def anomaly_detector(self):
+        settings = dict(self.config["anomaly_detection"])
+        if not settings.pop("enabled"):
+            return None
+        from anomaly_detection import AnomalyDetector
+
+        return AnomalyDetector(self.config["plant_amount"], **settings)
+
+    @cached_property
+    def rule_engine(self):
+        from rule_engine import RuleEngine, load_rules
+
+        rules_config = self.config["decision_rules"]
+        rules = load_rules(rules_config["rules"], rules_config["file"])
+        return RuleEngine(rules) if rules else None
+
+    @cached_property
+    def measurement_queue(self) -> Queue:
+        # the robot puts measurements into this queue and the MQTT client publishes them to the broker
+        return Queue()
+
+    @cached_property
+    def action_queue(self):
+        # commands for the robot, queued by the HTTP server and tracked until they are done
+        from commands import CommandQueue, Priority, RateLimit
+
+        settings = dict(self.config["commands"])
+        rate_limits = {}
+        for lane, limit in settings.pop("rate_limits").items():
+            if limit is not None:
+                rate, burst = limit if isinstance(limit, (list, tuple)) else (limit, 1)
+                rate_limits[Priority[lane.upper()]] = RateLimit(rate, burst)
+        return CommandQueue(rate_limits=rate_limits, **settings)
+
+    @cached_property
+    def message_stream(self):
+        # live stream of the robot's messages for the Server-Sent Events endpoint of the HTTP server
+        from message_stream import MessageStream
+
+        return MessageStream()
+
+    @cached_property
+    def irrigation_controller(self):
+        if self.config["irrigation"]["control"] != "scheduled":
+            return None
+        from irrigation_controller import IrrigationController
+
+        return IrrigationController(
+            self.plants, flow_rate=self.config["irrigation"]["flow_rate"], irrigation_system=self.irrigation_system
+        )
+
+    @cached_property
+    def robot(self):
+        from robot import Robot
+        from robot_state import RobotState
+
+        robot = Robot(
+            plants=self.plants,
+            measurement_queue=self.measurement_queue,
+            action_queue=self.action_queue,
+            cycle_time=self.config["robot"]["cycle_time"],
+            irrigation_controller=self.irrigation_controller,
+            message_stream=self.message_stream,
+            simulation_instance=self.simulation,
+            irrigation_system=self.irrigation_system,
+            namespace=self.config["mqtt"]["namespace"],
+            flow_rate=self.config["irrigation"]["flow_rate"],
+            aggregates_interval=self.config["simulation"]["aggregates_interval"],
+        )
+        monitoring_config = dict(self.config["monitoring"])
+        if monitoring_config.pop("adaptive"):
+            from monitoring_scheduler import MonitoringScheduler
+
+            robot.monitoring_scheduler = MonitoringScheduler(len(self.plants), **monitoring_config)
+        vision_config = self.config["vision"]
+        robot.camera.image_directory = vision_config["image_directory"]
+        if vision_config["workers"] > 0 or self.vision_executor is not None:
+            # estimates plant health and ripeness from camera frames in background worker processes
+            from sensors.image_analysis import ImageAnalysisPipeline
+
+            robot.image_pipeline = ImageAnalysisPipeline(
+                robot.camera,
+                workers=vision_config["workers"],
+                on_estimate=robot.publish_plant_estimate,
+                executor=self.vision_executor,
+            )
+        if self.irrigation_controller is not None:
+            self.irrigation_controller.on_valves_changed = robot.publish_valves
+        # the summary of all plants for the plant container twin
+        self.simulation.add_cycle_listener(robot.publish_plant_aggregates)
+        if self.anomaly_detector is not None:
+            self.simulation.add_cycle_listener(robot.publish_anomalies)
+        if self.rule_engine is not None:
+            # the commands decided by the rules for the plant state of each cycle
+            self.simulation.add_cycle_listener(
+                lambda: self.rule_engine.run(self.plants, self.irrigation_system, self.action_queue)
+            )
+        robot.set_state(RobotState(self.config["robot"]["state"]))
+        return robot
+
+    @cached_property
+    def state_snapshot(self):
+        # cached state documents for the read-only endpoints, rebuilt after the robot or the simulation changed the state
+        from state_snapshot import StateSnapshot
+
+        state_snapshot = StateSnapshot(self.robot)
+        self.robot.on_state_changed = state_snapshot.invalidate
+        self.simulation.add_cycle_listener(state_snapshot.invalidate)
+        return state_snapshot
+
+    @property
+    def http_site(self) -> tuple:
+        """
+        The (robot, action_queue, message_stream, state_snapshot) served by the HTTP server.
+        """
+        return self.robot, self.action_queue, self.message_stream, self.state_snapshot
+
+    def start_simulation(self, scheduler=None):
+        """
+        Starts the simulation cycle in a separate thread, or adds it to the given SimulationScheduler.
+        """
+        if scheduler is not None:
+            scheduler.add(self.simulation)
+        else:
+            self._start_thread(self.simulation.run)
+
+    def start_mqtt(self):
+        """
+        Starts the MQTT client publishing the measurements in a separate thread.
+        """
+        self.threads.append(start_mqtt_client(self.config["mqtt"], self.measurement_queue))
+
+    def start_commands(self):
+        """
+        Starts receiving the commands for the robot and plant twins over MQTT.
+        """
+        import mqtt_client
+
+        mqtt_config = self.config["mqtt"]
+        self.command_subscriber = mqtt_client.CommandSubscriber(
+            self.action_queue, self.config["plant_amount"], mqtt_config["namespace"], qos=max(mqtt_config["qos"], 1)
+        )
+        self.command_subscriber.start(mqtt_config["broker"], mqtt_config["port"])
+
+    def start_http(self):
+        """
+        Starts the HTTP server in a separate thread.
+        """
+        import http_server
+
+        http_config = self.config["http"]
+        self._start_thread(
+            http_server.run_http_server,
+            self.robot,
+            self.action_queue,
+            self.message_stream,
+            self.state_snapshot,
+            http_config["static_directory"],
+            http_config["port"],
+        )
+
+    def start(self):
+        """
+        Starts the simulation and the enabled MQTT client and HTTP server.
+        """
+        self.robot  # constructed (and its initial state queued) before the threads start
+        if self.config["http"]["enabled"]:
+            self.state_snapshot
+        self.start_simulation()
+        if self.config["mqtt"]["enabled"]:
+            self.start_mqtt()
+            if self.config["mqtt"]["commands"]:
+                self.start_commands()
+        if self.config["http"]["enabled"]:
+            self.start_http()
+
+    def run(self):
+        """
+        Starts the application and runs the robot's main loop in the calling thread.
+        """
+        self.start()
+        self.robot.run()
+
+    def _start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+
+def start_mqtt_client(mqtt_config: dict, measurement_queue: Queue) -> threading.Thread:
+    """
+    Configures the MQTT client and starts it in a separate thread, publishing the messages of the measurement queue.
+    """
+    import mqtt_client
+
+    mqtt_client.set_message_queue(measurement_queue)
+    mqtt_client.set_port(mqtt_config["port"])
+    mqtt_client.set_broker(mqtt_config["broker"])
+    mqtt_client.set_namespace(mqtt_config["namespace"])
+    mqtt_client.set_publisher_options(mqtt_config["connections"], mqtt_config["qos"], mqtt_config["max_inflight"])
+    if mqtt_config["record_file"] is not None:
+        from telemetry_recording import TelemetryRecorder
+
+        mqtt_client.set_recorder(TelemetryRecorder(mqtt_config["record_file"]))
+    thread = threading.Thread(target=mqtt_client.run_mqtt_client, daemon=True)
+    thread.start()
+    return thread
+
+
+def create_app(config_path: str = None, overrides: dict = None) -> Application:
+    """
+    Creates an application from a configuration file and overrides, without constructing any component.
+
+    Parameters:
+        config_path (str): Optional path of a JSON configuration file.
+        overrides (dict): Optional settings applied on top of the file.
+    Returns:
+        Application: The application.
+    """
+    return Application(load_config(config_path, overrides))
@@ -0,0 +1,359 @@
+"""
+This module provides the commands the robot executes on request, e.g. from the HTTP server.
+
+Commands are tracked from being queued until they are done, so callers can poll their status and cancel them while
+they wait. A command submitted again with the same client request ID is not queued twice, and a command identical to
+one that is still waiting for the same plant is merged into the waiting one.
+Commands are queued in priority lanes, so urgent operator actions are not delayed by a backlog of routine work.
+"""
+
+from collections import OrderedDict, deque
+from enum import Enum
+import logging
+import queue
+import threading
+import time
+import uuid
+import tracing
+
+
+class CommandStatus(Enum):
+    """
+    Enum representing the status of a command.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# functions performing the plant actions, called with the robot and the (0-based) plant ID
+PLANT_ACTIONS = {
+    "water": lambda robot, plant_id: robot.water_plant(robot.plants[plant_id]),
+    "fertilize": lambda robot, plant_id: robot.fertilize_plant(robot.plants[plant_id]),
+    "harvest": lambda robot, plant_id: robot.harvest_plant(robot.plants[plant_id]),
+    "seed": lambda robot, plant_id: robot.seed_plant(robot.plants[plant_id]),
+    "monitor": lambda robot, plant_id: robot.monitor_plant(plant_id),
+    "move": lambda robot, plant_id: robot.move_to(plant_id),
+}
+
+
+class Command:
+    """
+    A class representing an action queued for the robot.
+
+    Attributes:
+        id (str): The ID of the command, the client's request ID if one was given.
+        action (str): The name of the action, e.g. "water", or None for an arbitrary function.
+        plant_id (int): The (0-based) ID of the plant the action is performed on, or None.
+        priority (Priority): The lane the command is queued in.
+        status (CommandStatus): The current status of the command.
+        error (str): The error message if the command failed.
+        queued_at, started_at, finished_at (float): Unix times of the status changes.
+    """
+
+    def __init__(self, command_id: str, function, action: str = None, plant_id: int = None, priority=None):
+        self.id = command_id
+        self.function = function
+        self.action = action
+        self.plant_id = plant_id
+        self.priority = priority or Priority.MANUAL
+        self.status = CommandStatus.QUEUED
+        self.error = None
+        self.queued_at = time.time()
+        self._queued_ns = time.perf_counter_ns()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (CommandStatus.DONE, CommandStatus.FAILED, CommandStatus.CANCELLED)
+
+    def __call__(self, robot):
+        """
+        Executes the command on the robot. Errors are recorded in the command instead of stopping the robot.
+        """
+        self.status = CommandStatus.RUNNING
+        self.started_at = time.time()
+        with tracing.span("robot.command", action=self.action, priority=self.priority.name.lower()):
+            tracing.record_span("robot.command_queue_wait", self._queued_ns, parent=tracing.current_context())
+            try:
+                self.function(robot)
+                self.status = CommandStatus.DONE
+            except Exception as e:
+                logging.getLogger(__name__).exception(f"Command {self.id} failed")
+                self.error = str(e)
+                self.status = CommandStatus.FAILED
+        self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        """
+        Returns the command as a JSON serializable dict, with the plant ID 1-based as in the twin.
+        """
+        return {
+            "id": self.id,
+            "action": self.action,
+            "plant_id": self.plant_id + 1 if self.plant_id is not None else None,
+            "priority": self.priority.name.lower(),
+            "status": self.status.value,
+            "error": self.error,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class Priority(Enum):
+    """
+    Enum representing the priority classes (lanes) of commands, from most to least urgent.
+    """
+
+    EMERGENCY = 0
+    MANUAL = 1
+    AUTOMATED = 2
+    MONITORING = 3
+
+
+class RateLimit:
+    """
+    A token bucket limiting how many commands of a lane are started per second.
+
+    Attributes:
+        rate (float): The number of commands per second.
+        burst (int): The number of commands that can be started at once after the lane was idle.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """
+        Returns the time in seconds until the next command can be started, 0 if one can be started now.
+        """
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+
+class CommandQueue:
+    """
+    A class that queues the commands for the robot in priority lanes and tracks their status.
+    It can be used in place of a queue.Queue of functions: put() accepts plain functions and get() returns callables.
+
+    The next command is taken from the most urgent lane. To prevent starvation, waiting commands age:
+    every aging_interval seconds of waiting count as one priority class, up to the manual class, where the command
+    that waited the longest goes first. Emergencies are never delayed by aged commands. Lanes can be rate limited, and each lane has its own capacity,
+    so a backlog of routine commands cannot block urgent ones.
+
+    Attributes:
+        max_history (int): The number of finished commands kept for status queries.
+        aging_interval (float): The waiting time in seconds after which a command is treated as one class more urgent.
+        lane_capacity (int): The maximum number of queued commands per lane.
+        rate_limits (dict[Priority, RateLimit]): Optional rate limits of the lanes.
+    """
+
+    def __init__(self, max_history: int = 1000, aging_interval: float = 300, lane_capacity: int = 1000, rate_limits: dict = None):
+        self.max_history = max_history
+        self.aging_interval = aging_interval
+        self.lane_capacity = lane_capacity
+        self.rate_limits = rate_limits or {}
+        self._lanes = {priority: deque() for priority in Priority}
+        self._commands = OrderedDict()  # all tracked commands by ID, in the order they were queued
+        self._pending = {}  # queued commands by (action, plant ID), to merge identical commands
+        self._condition = threading.Condition()
+
+    def submit(self, action: str, plant_id: int = None, request_id: str = None, function=None, priority: Priority = Priority.MANUAL, merge: bool = True):
+        """
+        Queues a command, unless the same request or an identical command for the plant is already waiting.
+        A waiting identical command is moved to the lane of the new one if that is more urgent.
+
+        Parameters:
+            action (str): The name of the action, e.g. "water".
+            plant_id (int): The (0-based) ID of the plant, or None.
+            request_id (str): Optional client request ID, used as the command ID.
+            function (callable): The function performing the action, called with the robot.
+                Defaults to the plant action of the given name.
+            priority (Priority): The lane of the command.
+            merge (bool): Whether the command may be merged with an identical waiting command.
+        Returns:
+            tuple[Command, bool]: The command, and whether it was newly queued.
+        Raises:
+            queue.Full: If the lane is full.
+        """
+        if function is None:
+            function = lambda robot: PLANT_ACTIONS[action](robot, plant_id)
+
+        with self._condition:
+            if request_id is not None and request_id in self._commands:
+                return self._commands[request_id], False
+            pending = self._pending.get((action, plant_id)) if merge else None
+            if pending is not None:
+                if request_id is not None:
+                    self._commands[request_id] = pending  # the merged request can be polled with its own ID
+                if priority.value < pending.priority.value:
+                    self._lanes[pending.priority].remove(pending)
+                    pending.priority = priority
+                    self._lanes[priority].append(pending)
+                    self._condition.notify_all()
+                return pending, False
+
+            command = Command(request_id or uuid.uuid4().hex, function, action, plant_id, priority)
+            self._enqueue(command)
+            if merge:
+                self._pending[(action, plant_id)] = command
+            return command, True
+
+    def put(self, function, block=True, timeout=None, priority: Priority = Priority.MANUAL):
+        """
+        Queues an arbitrary function, called with the robot. It is never merged with other commands.
+
+        Raises:
+            queue.Full: If the lane is full.
+        """
+        with self._condition:
+            self._enqueue(Command(uuid.uuid4().hex, function, priority=priority))
+
+    def get(self, block=True, timeout=None) -> Command:
+        """
+        Removes and returns the next command: the head of the lane with the most urgent aged priority
+        that is not rate limited.
+
+        Raises:
+            queue.Empty: If no command can be started (within the timeout, if blocking).
+        """
+        deadline = time.monotonic() + timeout if block and timeout is not None else None
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                lane, delay = self._next_lane(now)
+                if lane is not None:
+                    break
+                remaining = deadline - now if deadline is not None else None
+                if not block or (remaining is not None and remaining <= 0):
+                    raise queue.Empty
+                waits = [t for t in (delay, remaining) if t is not None]
+                self._condition.wait(min(waits) if waits else None)
+
+            command = self._lanes[lane].popleft()
+            if lane in self.rate_limits:
+                self.rate_limits[lane].take(now)
+            if self._pending.get((command.action, command.plant_id)) is command:
+                del self._pending[(command.action, command.plant_id)]
+            command.status = CommandStatus.RUNNING
+            return command
+
+    def wait(self, timeout: float, priority: Priority = Priority.MANUAL) -> bool:
+        """
+        Waits until a command of the given or a more urgent lane can be started, e.g. instead of sleeping between
+        actions. Commands of rate limited lanes count once their lane's limit allows them to start.
+
+        Returns:
+            bool: True if such a command can be started, False if the timeout expired.
+        """
+        urgent = [lane for lane in Priority if lane.value <= priority.value]
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                lane, delay = self._next_lane(now, urgent)
+                if lane is not None:
+                    return True
+                remaining = deadline - now if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                waits = [t for t in (delay, remaining) if t is not None]
+                self._condition.wait(min(waits) if waits else None)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def qsize(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def lane_sizes(self) -> dict:
+        """
+        Returns the number of queued commands per lane, by lane name.
+        """
+        return {priority.name.lower(): len(self._lanes[priority]) for priority in Priority}
+
+    def get_command(self, command_id: str):
+        """
+        Returns the command with the given ID, or None if it is unknown or was removed from the history.
+        """
+        return self._commands.get(command_id)
+
+    def cancel(self, command_id: str):
+        """
+        Cancels a queued command. Commands that are already running or finished cannot be cancelled.
+
+        Returns:
+            Command | None: The command, or None if it is unknown.
+        """
+        with self._condition:
+            command = self._commands.get(command_id)
+            if command is None or command.status != CommandStatus.QUEUED:
+                return command
+            self._lanes[command.priority].remove(command)
+            if self._pending.get((command.action, command.plant_id)) is command:
+                del self._pending[(command.action, command.plant_id)]
+            command.status = CommandStatus.CANCELLED
+            command.finished_at = time.time()
+            return command
+
+    def _next_lane(self, now: float, lanes=Priority):
+        """
+        Selects the lane of the next command among the given lanes (default: all).
+        Of lanes with the same aged priority, the one whose head command has waited the longest is selected.
+
+        Returns:
+            tuple[Priority | None, float | None]: The lane, or None and the time until a rate limited lane
+            can start its next command (None if all lanes are empty).
+        """
+        best, best_key, delay = None, None, None
+        for lane in lanes:
+            if not self._lanes[lane]:
+                continue
+            limit = self.rate_limits.get(lane)
+            lane_delay = limit.delay(now) if limit is not None else 0.0
+            if lane_delay > 0:
+                delay = lane_delay if delay is None else min(delay, lane_delay)
+                continue
+            waited = time.time() - self._lanes[lane][0].queued_at
+            rank = lane.value - waited / self.aging_interval
+            if lane != Priority.EMERGENCY:
+                rank = max(rank, Priority.MANUAL.value)
+            if best is None or (rank, -waited) < best_key:
+                best, best_key = lane, (rank, -waited)
+        return best, delay
+
+    def _enqueue(self, command: Command):
+        lane = self._lanes[command.priority]
+        if len(lane) >= self.lane_capacity:
+            raise queue.Full
+        self._commands[command.id] = command
+        lane.append(command)
+        self._condition.notify_all()
+
+        # forget the oldest finished commands
+        queued = self.qsize()
+        excess = len(self._commands) - queued - self.max_history
+        stale = []
+        for command_id, c in self._commands.items():
+            if len(stale) >= excess:
+                break
+            if c.finished:
+                stale.append(command_id)
+        for command_id in stale:
+            del self._commands[command_id]
@@ -0,0 +1,126 @@
+"""
+This module provides the configuration of the physical twin.
+
+A configuration is a nested dict of sections. Configuration files are JSON files containing only the values that
+differ from the defaults, e.g.:
+
+    {
+        "plant_amount": 100,
+        "mqtt": {"port": 1883, "namespace": "house2"},
+        "http": {"port": 8001},
+        "plant": {"min_moisture": 0.4}
+    }
+"""
+
+import copy
+import json
+
+DEFAULT_CONFIG = {
+    "plant_amount": 20,
+    "simulation": {
+        "cycle_time": 60,  # cycle time of the simulation in seconds
+        "seed": None,  # seed of the random numbers, random if None
+        "zone_rows": 2,  # number of climate zone rows in the greenhouse
+        "zone_cols": 10,  # number of climate zone columns in the greenhouse
+        "aggregates_interval": 300,  # seconds between two publications of the plant aggregates to the container twin
+    },
+    "robot": {
+        "cycle_time": 60,  # time in seconds the robot waits between two automatic actions
+        "state": "auto",  # initial state of the robot
+    },
+    "commands": {
+        "aging_interval": 300,  # waiting time in seconds after which a queued command is treated as one class more urgent
+        "lane_capacity": 1000,  # maximum number of queued commands per priority lane
+        "max_history": 1000,  # number of finished commands kept for status queries
+        # commands started per second in each priority lane, None for no limit, or [rate, burst]
+        "rate_limits": {"emergency": None, "manual": None, "automated": None, "monitoring": None},
+    },
+    "monitoring": {
+        "adaptive": True,  # schedule the monitoring visits by the plants' rates of change, see monitoring_scheduler
+        "tolerance": 0.05,  # expected error of the published levels (0 to 1) at which a plant is visited again
+        "min_interval": 60,  # minimum time in seconds between two visits of a plant
+        "max_interval": 3600,  # maximum time in seconds between two visits of a plant
+    },
+    "plant": {
+        "min_moisture": 0.3,
+        "min_nutrients": 0.3,
+        "max_moisture": 1.0,
+        "max_nutrients": 1.0,
+    },
+    "irrigation": {
+        "control": "robot",  # who switches the valves: "robot" or "scheduled"
+        "zone_size": 5,  # number of neighbouring plant valves per irrigation zone
+        "flow_rate": 0.05,  # flow rate of an open valve per simulation cycle
+    },
+    "anomaly_detection": {
+        "enabled": False,  # detect anomalies in the soil moisture and nutrient levels (up to 10,000 plants)
+        "alpha": 0.05,  # weight of a new cycle in the moving average and variance of each plant
+        "z_threshold": 5.0,  # deviation in standard deviations that raises an alert
+        "max_rate": 0.2,  # change of a level per cycle that raises an alert
+    },
+    "decision_rules": {
+        "rules": [],  # rules queueing plant actions, e.g. "soil_moisture < 0.3 and health == sick -> water, priority 1"
+        "file": None,  # text file with one rule per line, see rule_engine
+    },
+    "vision": {
+        "workers": 1,  # worker processes analysing camera frames, 0 disables the image analysis
+        "image_directory": None,  # directory with plant images (plant_<id>.ppm), frames are synthesized if None
+    },
+    "mqtt": {
+        "enabled": True,
+        "broker": "localhost",
+        "port": 59973,
+        "namespace": "ba",  # namespace of the OpenTwins (Eclipse Ditto) things
+        "connections": 4,
+        "qos": 0,
+        "max_inflight": 100,
+        "record_file": None,  # file the published messages are appended to, see telemetry_recording
+        "commands": True,  # receive commands for the twins on command/{namespace}/..., see mqtt_client.CommandSubscriber
+    },
+    "http": {
+        "enabled": True,
+        "port": 8000,
+        "static_directory": "unity",
+    },
+}
+
+
+def merge(base: dict, overrides: dict) -> dict:
+    """
+    Returns a copy of the base configuration with the overrides applied, nested sections are merged.
+
+    Raises:
+        KeyError: If an override is not a known setting, e.g. replaces a whole section or goes below a setting.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if key not in merged:
+            raise KeyError(f"Unknown configuration setting: {key}")
+        if isinstance(merged[key], dict) != isinstance(value, dict):
+            if isinstance(value, dict):
+                raise KeyError(f"Configuration setting {key} has no settings")
+            raise KeyError(f"Configuration section {key} cannot be replaced, set its settings instead (e.g. {key}.{next(iter(merged[key]))})")
+        if isinstance(merged[key], dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_config(path: str = None, overrides: dict = None) -> dict:
+    """
+    Loads the configuration.
+
+    Parameters:
+        path (str): Optional path of a JSON configuration file, applied to the defaults.
+        overrides (dict): Optional settings applied after the file, e.g. from the command line.
+    Returns:
+        dict: The complete configuration.
+    """
+    config = DEFAULT_CONFIG
+    if path is not None:
+        with open(path) as f:
+            config = merge(config, json.load(f))
+    if overrides:
+        config = merge(config, overrides)
+    return copy.deepcopy(config)
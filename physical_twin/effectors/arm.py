@@ -1,15 +1,9 @@
-import sys
-import os
+import math
 import random
 from model.plant import Plant
-
-
-current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-sys.path.append(parent_dir)
-
 from sensors.sensor_interface import SensorInterface
 from util.overrides_annotation import overrides
+from effectors.motion_model import move_time
 
 
 class Arm(SensorInterface):
@@ -17,10 +11,23 @@ class Arm(SensorInterface):
 
     Attributes:
         position (list): The current position of the arm in 3D space, represented as [x, y, z].
+        plant_id (int): The ID of the plant the arm is positioned at, None before the arm was first positioned.
+        max_speed (float): The maximum speed of the arm's tool in meters per second.
+        max_acceleration (float): The maximum acceleration of the arm's tool in meters per second squared.
+        settle_time (float): The time in seconds the arm needs to settle at a target before working.
+        rng (random.Random): The random number generator of the plant position offsets.
     """
 
-    def __init__(self, position=[0.0, 0.0, 0.0]):
-        self.position = position
+    # position of a plant relative to the chassis, without the random offset of the actual plant
+    NOMINAL_PLANT_POSITION = [0.0, 1.0, 0.4]
+
+    def __init__(self, position=None, max_speed=0.3, max_acceleration=0.6, settle_time=0.5, rng: random.Random = None):
+        self.position = position if position is not None else [0.0, 0.0, 0.0]
+        self.plant_id = None
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
+        self.settle_time = settle_time
+        self.rng = rng if rng is not None else random.Random()
 
     @overrides(SensorInterface)
     def read_data(self):
@@ -40,9 +47,34 @@ class Arm(SensorInterface):
 
         Parameters:
             plant (Plant): The plant object for which the arm's position is to be determined.
+        Returns:
+            float: The time the move took in seconds.
         """
         plant_position = [
-            random.uniform(-0.2, 0.2),
-            (-1 if plant.id % 2 == 0 else 1) * random.uniform(0.5, 1.5),
-            random.uniform(0, 0.8),
+            self.rng.uniform(-0.2, 0.2),
+            (-1 if plant.id % 2 == 0 else 1) * self.rng.uniform(0.5, 1.5),
+            self.rng.uniform(0, 0.8),
         ]
+        duration = self.reach_time(plant_position)
+        self.position = plant_position
+        self.plant_id = plant.id
+        return duration
+
+    def reach_time(self, target: list, start: list = None) -> float:
+        """
+        Returns the time in seconds the arm needs to move its tool in a straight line to the target and settle there.
+
+        Parameters:
+            target (list): The target position [x, y, z].
+            start (list, optional): The start position, the current position if not given.
+        """
+        start = start if start is not None else self.position
+        return move_time(math.dist(start, target), self.max_speed, self.max_acceleration) + self.settle_time
+
+    def expected_reach_time(self, plant: Plant, start: list = None) -> float:
+        """
+        Returns the expected time in seconds to reach the specified plant, using its nominal position.
+        """
+        target = list(self.NOMINAL_PLANT_POSITION)
+        target[1] *= -1 if plant.id % 2 == 0 else 1
+        return self.reach_time(target, start)
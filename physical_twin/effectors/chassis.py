@@ -1,30 +1,32 @@
-import sys
-import os
 from model.plant import Plant
-
-current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-sys.path.append(parent_dir)
-
 from sensors.sensor_interface import SensorInterface
 from util.overrides_annotation import overrides
+from effectors.motion_model import move_time
 
 
 class Chassis(SensorInterface):
     """
     This class represents a chassis in the digital twin system.
+    The chassis drives along the aisle between two rows of plants:
+    even positions are on one side and odd positions on the other, so two positions share one stop on the aisle.
     """
 
-    def __init__(self, position=0, plant_count=5):
+    def __init__(self, position=0, plant_count=5, row_spacing=1.0, max_speed=0.5, max_acceleration=0.25):
         """
         Initializes the chassis with a given position and the number of plants it can interact with.
 
         Parameters:
             position (int): The initial position of the chassis.
             plant_count (int): The number of plants the chassis can interact with.
+            row_spacing (float): The distance between two neighbouring stops on the aisle in meters.
+            max_speed (float): The maximum driving speed in meters per second.
+            max_acceleration (float): The maximum acceleration and deceleration in meters per second squared.
         """
         self.position = position
         self.plant_count = plant_count  # Number of plants the chassis can interact with
+        self.row_spacing = row_spacing
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
 
     @overrides(SensorInterface)
     def read_data(self):
@@ -40,12 +42,38 @@ class Chassis(SensorInterface):
         Moves the chassis to the position of the specified plant.
         Parameters:
             plant (Plant): The plant object for which the chassis's position is to be set.
+        Returns:
+            float: The time the move took in seconds.
         """
+        duration = self.travel_time(self.position, plant.id)
         self.position = plant.id
+        return duration
 
     def move_to_next(self):
         """
         Moves the chassis to the next position.
         This method cycles through the positions based on the number of plants.
+        Returns:
+            float: The time the move took in seconds.
+        """
+        next_position = (self.position + 1) % self.plant_count
+        duration = self.travel_time(self.position, next_position)
+        self.position = next_position
+        return duration
+
+    def travel_distance(self, from_position: int, to_position: int) -> float:
+        """
+        Returns the distance in meters the chassis drives between two positions.
+        """
+        return abs(to_position // 2 - from_position // 2) * self.row_spacing
+
+    def travel_time(self, from_position: int, to_position: int) -> float:
+        """
+        Returns the time in seconds the chassis needs to drive between two positions,
+        starting and stopping at rest.
         """
-        self.position = (self.position + 1) % self.plant_count
+        return move_time(
+            self.travel_distance(from_position, to_position),
+            self.max_speed,
+            self.max_acceleration,
+        )
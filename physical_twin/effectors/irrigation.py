@@ -1,19 +1,207 @@
 """
-This module simulates an irrigation system
+This module simulates the irrigation system of the greenhouse.
+
+Every plant position has its own valve on the water line and its own valve on the fertigation line.
+Neighbouring valves are grouped into irrigation zones that can be switched together.
+The flow rates of all valves are held in flat lists (indexed by plant id),
+so the simulation can apply the flow of the whole greenhouse in one step.
+Flow rates are given as the fraction of soil moisture/nutrient saturation added per simulation cycle.
+
+Each greenhouse has its own IrrigationSystem, the module functions operate on the default system of the process.
 """
 
-_flow_rate = 0.0  # Flow rate in liters per minute
+WATER = "water"
+FERTIGATION = "fertigation"
 
 
-def read_data():
+class IrrigationSystem:
+    """
+    A class representing the water and fertigation lines of one greenhouse.
+
+    Attributes:
+        water_flow (list[float]): Flow rate of each valve on the water line.
+        fertigation_flow (list[float]): Flow rate of each valve on the fertigation line.
+        zone_size (int): Number of neighbouring valves per irrigation zone.
+    """
+
+    def __init__(self, valve_count: int = 1, zone_size: int = 1):
+        self.initialize(valve_count, zone_size)
+
+    def initialize(self, valve_count: int, zone_size: int = 1):
+        """
+        Initializes the irrigation system with one closed valve per plant on each line.
+
+        Parameters:
+            valve_count (int): Number of valves per line (one per plant position).
+            zone_size (int): Number of neighbouring valves that form one irrigation zone.
+        """
+        self.water_flow = [0.0] * valve_count
+        self.fertigation_flow = [0.0] * valve_count
+        self.zone_size = max(zone_size, 1)
+        # running totals, kept up to date by the setters so reading them is O(1)
+        self.water_total = 0.0
+        self.fertigation_total = 0.0
+        # total amount delivered by each line since initialization
+        self.water_used = 0.0
+        self.fertigation_used = 0.0
+
+    def read_data(self):
+        """
+        Reads data from the irrigation system.
+        Returns:
+            float: The current total flow rate of both lines of the irrigation system.
+        """
+        return self.water_total + self.fertigation_total
+
+    def read_valve(self, valve: int):
+        """
+        Reads the flow rates of a single valve.
+        Returns:
+            tuple[float, float]: The flow rate of the valve on the water line and on the fertigation line.
+        """
+        return self.water_flow[valve], self.fertigation_flow[valve]
+
+    def get_water_flow(self) -> list[float]:
+        """
+        Returns the flow rates of all valves on the water line, indexed by plant id.
+        """
+        return self.water_flow
+
+    def get_fertigation_flow(self) -> list[float]:
+        """
+        Returns the flow rates of all valves on the fertigation line, indexed by plant id.
+        """
+        return self.fertigation_flow
+
+    def zone_of(self, valve: int) -> int:
+        """
+        Returns the index of the irrigation zone the given valve belongs to.
+        """
+        return valve // self.zone_size
+
+    def set_water_flow(self, valve: int, flow_rate: float):
+        """
+        Sets the flow rate of a single valve on the water line.
+        """
+        self.water_total += flow_rate - self.water_flow[valve]
+        self.water_flow[valve] = flow_rate
+
+    def set_fertigation_flow(self, valve: int, flow_rate: float):
+        """
+        Sets the flow rate of a single valve on the fertigation line.
+        """
+        self.fertigation_total += flow_rate - self.fertigation_flow[valve]
+        self.fertigation_flow[valve] = flow_rate
+
+    def set_zone_flow(self, line: str, zone: int, flow_rate: float):
+        """
+        Sets the flow rate of all valves of an irrigation zone on the given line.
+
+        Parameters:
+            line (str): The line to set, either WATER or FERTIGATION.
+            zone (int): The index of the irrigation zone.
+            flow_rate (float): The new flow rate of each valve in the zone.
+        Returns:
+            range: The valves that were set.
+        """
+        setter = self.set_water_flow if line == WATER else self.set_fertigation_flow
+        valves = range(zone * self.zone_size, min((zone + 1) * self.zone_size, len(self.water_flow)))
+        for valve in valves:
+            setter(valve, flow_rate)
+        return valves
+
+    def record_cycle(self):
+        """
+        Adds the flow of the current cycle to the amount delivered by each line.
+        Called by the simulation once per cycle after the flow has been applied.
+        """
+        self.water_used += self.water_total
+        self.fertigation_used += self.fertigation_total
+
+    def get_twin_data(self, *valves: int):
+        """
+        Returns the data of the irrigation system in the format of the irrigation twin features.
+        Flow rates are given in percent.
+
+        Parameters:
+            valves (int): The valves whose individual flow rates should be included.
+        Returns:
+            dict: The total flow rates and delivered amounts of both lines, and the flow rates of the given valves.
+        """
+        data = {
+            "flow_rate": self.read_data() * 100,
+            "water_flow_rate": self.water_total * 100,
+            "fertigation_flow_rate": self.fertigation_total * 100,
+            "water_used": self.water_used * 100,
+            "fertigation_used": self.fertigation_used * 100,
+        }
+        if valves:
+            # the valves feature is merged into the twin, so only the given valves are updated
+            data["valves"] = {
+                f"plant_{valve + 1}": {
+                    "zone": self.zone_of(valve) + 1,
+                    WATER: self.water_flow[valve] * 100,
+                    FERTIGATION: self.fertigation_flow[valve] * 100,
+                }
+                for valve in valves
+            }
+        return data
+
+
+# the irrigation system used by the module functions
+_system = IrrigationSystem()
+
+
+def initialize(valve_count: int, zone_size: int = 1):
+    """
+    Initializes the default irrigation system with one closed valve per plant on each line.
+    This function should be called once before using other functions.
+    """
+    _system.initialize(valve_count, zone_size)
+
+
+def get_system() -> IrrigationSystem:
     """
-    Reads data from the irrigation system.
-    Returns:
-        float: The current flow rate of the irrigation system in liters per minute.
+    Returns the default irrigation system.
     """
-    return _flow_rate
+    return _system
+
+
+def read_data():
+    return _system.read_data()
+
+
+def read_valve(valve: int):
+    return _system.read_valve(valve)
+
+
+def get_water_flow() -> list[float]:
+    return _system.get_water_flow()
+
+
+def get_fertigation_flow() -> list[float]:
+    return _system.get_fertigation_flow()
+
+
+def zone_of(valve: int) -> int:
+    return _system.zone_of(valve)
+
+
+def set_water_flow(valve: int, flow_rate: float):
+    _system.set_water_flow(valve, flow_rate)
+
+
+def set_fertigation_flow(valve: int, flow_rate: float):
+    _system.set_fertigation_flow(valve, flow_rate)
+
+
+def set_zone_flow(line: str, zone: int, flow_rate: float):
+    return _system.set_zone_flow(line, zone, flow_rate)
+
+
+def record_cycle():
+    _system.record_cycle()
 
 
-def set_flow_rate(flow_rate):
-    global _flow_rate
-    _flow_rate = flow_rate
+def get_twin_data(*valves: int):
+    return _system.get_twin_data(*valves)
@@ -0,0 +1,46 @@
+"""
+This module provides the kinematic cost model of the robot's effectors.
+Used to estimate how long the chassis, the arm and the robot's actions take.
+"""
+
+import math
+
+# Time in seconds the arm works at a plant for each action, in addition to moving there
+ACTION_TIMES = {
+    "seed": 8.0,
+    "harvest": 15.0,
+    "water": 2.0,
+    "fertilize": 2.0,
+    "monitor": 3.0,
+}
+
+
+def move_time(distance: float, max_speed: float, max_acceleration: float) -> float:
+    """
+    Calculates the duration of a point-to-point move that starts and ends at rest,
+    using a trapezoidal velocity profile (accelerate, cruise at maximum speed, decelerate).
+    Short moves that never reach the maximum speed use a triangular profile.
+
+    Parameters:
+        distance (float): The distance to move.
+        max_speed (float): The maximum speed.
+        max_acceleration (float): The maximum acceleration (and deceleration).
+    Returns:
+        float: The duration of the move in seconds.
+    """
+    distance = abs(distance)
+    if distance == 0:
+        return 0.0
+
+    # distance needed to accelerate to the maximum speed and to decelerate again
+    ramp_distance = max_speed**2 / max_acceleration
+    if distance <= ramp_distance:
+        return 2 * math.sqrt(distance / max_acceleration)
+    return 2 * max_speed / max_acceleration + (distance - ramp_distance) / max_speed
+
+
+def action_time(action: str) -> float:
+    """
+    Returns the time in seconds the arm works at a plant for the given action.
+    """
+    return ACTION_TIMES.get(action, 0.0)
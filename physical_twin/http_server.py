@@ -1,22 +1,44 @@
-import socketserver
 import http.server
+import json
+import os
+import queue
 from robot import Robot
+from commands import CommandQueue, CommandStatus, Priority
+from message_stream import MessageStream
+from state_snapshot import StateSnapshot
+from static_assets import StaticAssets
+import tracing
 from urllib.parse import parse_qs, urlparse
 import re
 from robot import RobotState
 
 PORT = 8000
 
+# seconds after which an idle event stream sends a comment to keep the connection open
+STREAM_KEEPALIVE_INTERVAL = 15
+# maximum number of messages buffered per stream client before the oldest are dropped
+STREAM_BUFFER_SIZE = 256
+
+# directory of the Unity WebGL build files (relative to the working directory) and the URL path they are served under
+STATIC_DIRECTORY = "unity"
+STATIC_URL_PREFIX = "/unity/"
+# prefix of the routes of a site when serving several sites (/sites/{name}/...)
+SITE_PATH = re.compile(r"^/sites/([^/?]+)(/[^?]*)?(\?.*)?$")
+
 
 class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
     """
     Custom request handler that adds CORS headers and handles specific robot and plant actions.
-    Also serves the Unity WebGL build files for the grafana panel.
+    Also serves the Unity WebGL build files for the grafana panel,
+    a live stream of the robot's messages as Server-Sent Events and read-only state queries.
     """
 
-    def __init__(self, robot: Robot,action_queue, *args, **kwargs):
+    def __init__(self, robot: Robot,action_queue: CommandQueue, message_stream: MessageStream, state_snapshot: StateSnapshot, static_assets: StaticAssets, *args, **kwargs):
         self.robot = robot
-        self.action_queue = action_queue # queue for actions to be performed by the robot
+        self.action_queue = action_queue # queue for commands to be performed by the robot
+        self.message_stream = message_stream # live stream of the messages sent by the robot
+        self.state_snapshot = state_snapshot # cached state documents for the read-only endpoints
+        self.static_assets = static_assets # precompressed Unity WebGL build files
         super().__init__(*args, **kwargs)
 
     def end_headers(self):
@@ -35,194 +57,327 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_response(204)
         self.end_headers()
 
+    def do_GET(self):
+        """
+        Handle GET requests for the live message stream and the state queries, all other paths serve files.
+        The prepared Unity WebGL build files are served from memory, other files from disk.
+        """
+        path = urlparse(self.path).path
+        if path == "/stream":
+            self.handle_get_stream()
+        # Debug Path: recorded spans as a Chrome trace and the current stacks of all threads
+        elif path == "/debug/tracing":
+            self.respond_json(200, tracing.to_chrome_trace(tracing.get_spans()))
+        elif path == "/debug/stacks":
+            self.respond(200, tracing.dump_stacks())
+        # Command Path: depth of the command queue (/commands) and status of a queued command (/commands/{id})
+        elif path == "/commands":
+            self.respond_json(200, {"queued": self.action_queue.qsize(), "lanes": self.action_queue.lane_sizes()})
+        elif re.match(r"^/commands/[^/]+$", path):
+            self.handle_get_command(path.split("/")[2])
+        # State Path: read-only snapshots of the current state (/robot, /plants, /plants/{id}, /environment)
+        elif path in ("/robot", "/plants", "/environment") or re.match(r"^/plants/\d+$", path):
+            self.handle_get_state(path)
+        elif self.static_assets is None or not self.static_assets.serve(self):
+            super().do_GET()
+
+    def do_HEAD(self):
+        """
+        Handle HEAD requests for files.
+        """
+        if self.static_assets is None or not self.static_assets.serve(self, head_only=True):
+            super().do_HEAD()
+
+    def do_DELETE(self):
+        """
+        Handle DELETE requests to cancel queued commands (/commands/{id}).
+        """
+        path = urlparse(self.path).path
+        if re.match(r"^/commands/[^/]+$", path):
+            self.handle_cancel_command(path.split("/")[2])
+        else:
+            self.respond(404, "Not Found")
+
+    def handle_get_state(self, path: str):
+        """
+        Serves a snapshot of the robot, plant or environment state as JSON.
+        The plant list can be paged with the query parameters 'offset' and 'limit',
+        and plant features can be selected with 'fields', e.g. /plants?fields=soil_moisture,health&limit=100.
+        Supports conditional requests (If-None-Match) and gzip compression.
+        """
+        if self.state_snapshot is None:
+            self.respond(404, "Not Found")
+            return
+
+        params = parse_qs(urlparse(self.path).query)
+        fields = [f for value in params.get("fields", []) for f in value.split(",") if f]
+        try:
+            offset = int(params.get("offset", [0])[0])
+            limit = params.get("limit", [None])[0]
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            self.respond(400, "Invalid offset or limit")
+            return
+        if offset < 0 or (limit is not None and limit < 0):
+            self.respond(400, "Invalid offset or limit")
+            return
+
+        resource = path.strip("/")
+        plant_id = None
+        if resource.startswith("plants/"):
+            resource, plant_id = "plant", int(resource.split("/")[1])
+
+        compressed = "gzip" in self.headers.get("Accept-Encoding", "")
+        body, etag = self.state_snapshot.get(resource, plant_id, fields, offset, limit, compressed)
+        if body is None:
+            self.respond(404, "Plant not found")
+            return
+
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None and (
+            if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        ):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_get_stream(self):
+        """
+        Streams the messages sent by the robot to the client as Server-Sent Events.
+        The messages can be filtered by twin component and plant ID with the query parameters
+        'component' and 'plant_id', e.g. /stream?component=my_plants&plant_id=3,4.
+        If the client cannot keep up, its oldest messages are dropped and a 'dropped' event is sent.
+        """
+        if self.message_stream is None:
+            self.respond(404, "Not Found")
+            return
+
+        params = parse_qs(urlparse(self.path).query)
+        components = [c for value in params.get("component", []) for c in value.split(",") if c]
+        try:
+            plant_ids = [int(i) for value in params.get("plant_id", []) for i in value.split(",") if i]
+        except ValueError:
+            self.respond(400, "Invalid plant_id")
+            return
+
+        subscription = self.message_stream.subscribe(components, plant_ids, STREAM_BUFFER_SIZE)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+
+        dropped = 0
+        try:
+            while True:
+                messages = subscription.get(timeout=STREAM_KEEPALIVE_INTERVAL)
+                if not messages:
+                    self.wfile.write(b": keepalive\n\n")
+                if subscription.dropped != dropped:
+                    self.wfile.write(f"event: dropped\ndata: {subscription.dropped - dropped}\n\n".encode())
+                    dropped = subscription.dropped
+                if messages:
+                    self.wfile.write("".join(f"data: {message}\n\n" for message in messages).encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client disconnected
+        finally:
+            self.message_stream.unsubscribe(subscription)
+            self.close_connection = True
+
     def do_POST(self):
         """
         Handle POST requests for robot and plant actions.
         """
-        # Robot Path: Endpoints to move the robot or set its state for continuous actions (/robot/{state})
-        if self.path.startswith("/robot/move"):
+        path = urlparse(self.path).path
+        # Robot Path: Endpoints to move the robot or set its state for continuous actions (/robot/{state}), queued as commands
+        if path == "/robot/move":
             self.handle_post_robot_move()
-        elif self.path == "/robot/harvest":
+        elif path == "/robot/harvest":
             self.handle_post_robot_harvest()
-        elif self.path == "/robot/seed":
+        elif path == "/robot/seed":
             self.handle_post_robot_seed()
-        elif self.path == "/robot/water":
+        elif path == "/robot/water":
             self.handle_post_robot_water()
-        elif self.path == "/robot/fertilize":
+        elif path == "/robot/fertilize":
             self.handle_post_robot_fertilize()
-        elif self.path == "/robot/idle":
+        elif path == "/robot/idle":
             self.handle_post_robot_idle()
-        elif self.path == "/robot/monitor":
+        elif path == "/robot/monitor":
             self.handle_post_robot_monitor()
-        elif self.path == "/robot/auto":
+        elif path == "/robot/auto":
             self.handle_post_robot_auto()
-        # Plant Path: Endpoints to perform one-time actions on a plant specified by its ID path parameter (/plant/{id}/{action})
-        elif self.path.startswith("/plant/") and self.path.endswith("/water"):
-            self.handle_post_plant_water()
-        elif self.path.startswith("/plant/") and self.path.endswith("/fertilize"):
-            self.handle_post_plant_fertilize()
-        elif self.path.startswith("/plant/") and self.path.endswith("/harvest"):
-            self.handle_post_plant_harvest()
-        elif self.path.startswith("/plant/") and self.path.endswith("/seed"):
-            self.handle_post_plant_seed()
-        elif self.path.startswith("/plant/") and self.path.endswith("/monitor"):
-            self.handle_post_plant_monitor()
+        # Plant Path: Endpoints to queue one-time actions on a plant specified by its ID path parameter (/plant/{id}/{action})
+        elif re.match(r"^/plant/\d+/(water|fertilize|harvest|seed|monitor)$", path):
+            self.handle_post_plant_action(path.rsplit("/", 1)[1])
+        # Debug Path: Endpoints to switch tracing and profiling on and off (/debug/{tracing|profiling}/{start|stop})
+        elif re.match(r"^/debug/(tracing|profiling)/(start|stop)$", path):
+            self.handle_post_debug(*path.split("/")[2:])
+        # Command Path: Endpoint to cancel a queued command (/commands/{id}/cancel)
+        elif re.match(r"^/commands/[^/]+/cancel$", path):
+            self.handle_cancel_command(path.split("/")[2])
         else:
             self.respond(404, "Not Found")
 
+    def handle_post_debug(self, tool: str, command: str):
+        """
+        Starts or stops tracing or profiling.
+        Tracing takes the query parameters 'sample_rate' and 'max_spans', profiling the stack sampling 'interval' in seconds.
+        Stopping exports the results to files in the trace directory of the server and responds with their paths.
+        """
+        params = parse_qs(urlparse(self.path).query)
+        try:
+            if tool == "tracing" and command == "start":
+                tracing.start_tracing(
+                    float(params.get("sample_rate", [1.0])[0]), int(params.get("max_spans", [100_000])[0])
+                )
+                self.respond_json(200, {"tracing": True})
+            elif tool == "tracing":
+                spans = tracing.stop_tracing()
+                self.respond_json(200, {"tracing": False, "spans": len(spans), "file": tracing.export_trace(spans)})
+            elif command == "start":
+                tracing.start_profiling(float(params.get("interval", [0.01])[0]))
+                self.respond_json(200, {"profiling": True})
+            else:
+                self.respond_json(200, dict(tracing.stop_profiling(), profiling=False))
+        except ValueError:
+            self.respond(400, "Invalid parameter")
+
     def handle_post_robot_move(self):
         """
-        Handles the robot move request by extracting the position from the query parameters and sets the robot's position.
+        Handles the robot move request by extracting the position from the query parameters and queues the move.
         """
         query = urlparse(self.path).query
         params = parse_qs(query)
         i = params.get("i", [None])[0]
-        if i is not None:
-            #self.robot.move_to(int(i) - 1)
-            self.action_queue.put(
-                lambda robot: robot.move_to(int(i) - 1)
-            )
-
-        self.respond_ok("moved to plant " + str(i))
+        if i is None or not i.isdigit() or not 1 <= int(i) <= len(self.robot.plants):
+            self.respond(400, "Invalid position")
+            return
+        self.submit_command("move", int(i) - 1)
 
     def handle_post_robot_harvest(self):
         """
         Sets the robot's state to harvesting.
         """
-        self.robot.set_state(RobotState.HARVESTING)
-
-        self.respond_ok("Robot is harvesting")
+        self.submit_state(RobotState.HARVESTING)
 
     def handle_post_robot_seed(self):
         """
         Sets the robot's state to seeding.
         """
-        self.robot.set_state(RobotState.SEEDING)
-
-        self.respond_ok("Robot is seeding")
+        self.submit_state(RobotState.SEEDING)
 
     def handle_post_robot_water(self):
         """
         Sets the robot's state to watering.
         """
-        self.robot.set_state(RobotState.WATERING)
-
-        self.respond_ok("Robot is watering")
+        self.submit_state(RobotState.WATERING)
 
     def handle_post_robot_fertilize(self):
         """
         Sets the robot's state to fertilizing.
         """
-        self.robot.set_state(RobotState.FERTILIZING)
-
-        self.respond_ok("Robot is fertilizing")
+        self.submit_state(RobotState.FERTILIZING)
 
     def handle_post_robot_idle(self):
         """
         Sets the robot's state to idle.
         """
-        self.robot.set_state(RobotState.IDLE)
-
-        self.respond_ok("Robot is idle")
+        self.submit_state(RobotState.IDLE)
 
     def handle_post_robot_monitor(self):
         """
         Sets the robot's state to monitoring.
         """
-        self.robot.set_state(RobotState.MONITORING)
-
-        self.respond_ok("Robot is monitoring")
+        self.submit_state(RobotState.MONITORING)
 
     def handle_post_robot_auto(self):
         """
         Sets the robot's state to auto mode.
         """
-        self.robot.set_state(RobotState.AUTO)
-
-        self.respond_ok("Robot is in auto mode")
+        self.submit_state(RobotState.AUTO)
 
-    def handle_post_plant_water(self):
+    def handle_post_plant_action(self, action: str):
         """
-        Handles the plant watering request by extracting the plant ID from the path and watering the specified plant.
+        Handles the plant action requests by extracting the plant ID from the path and queueing the action for the specified plant.
         """
         plant_id = self.plant_id_from_path()
         if plant_id is None:
             self.respond(400, "Invalid request path")
             return
-        self.action_queue.put(
-            lambda robot: robot.water_plant(robot.plants[plant_id - 1])
-        )
-        print("CALLED FOR PLANT ID:", plant_id)
-        #self.robot.water_plant(self.robot.plants[plant_id - 1])
-
-        self.respond_ok(f"Watered plant {plant_id}")
+        if not 1 <= plant_id <= len(self.robot.plants):
+            self.respond(404, "Plant not found")
+            return
+        self.submit_command(action, plant_id - 1)
 
-    def handle_post_plant_fertilize(self):
+    def submit_command(self, action: str, plant_id: int = None, function=None, merge: bool = True):
         """
-        Handles the plant fertilizing request by extracting the plant ID from the path and fertilizing the specified plant.
+        Queues a command for the robot and responds with its status.
+        A client request ID can be given in the 'X-Request-ID' header or the 'request_id' query parameter,
+        a request that was already received or that is identical to a waiting command is not queued again.
+        The lane of the command can be chosen with the 'priority' query parameter (emergency, manual, automated
+        or monitoring), operator requests are manual by default.
         """
-        plant_id = self.plant_id_from_path()
-        if plant_id is None:
-            self.respond(400, "Invalid request path")
+        params = parse_qs(urlparse(self.path).query)
+        request_id = self.headers.get("X-Request-ID") or params.get("request_id", [None])[0]
+        priority = params.get("priority", ["manual"])[0]
+        if priority.upper() not in Priority.__members__:
+            self.respond(400, "Invalid priority")
             return
-        #self.robot.fertilize_plant(self.robot.plants[plant_id - 1])
-        self.action_queue.put(
-            lambda robot: robot.fertilize_plant(robot.plants[plant_id - 1])
-        )
-
-        self.respond_ok(f"Fertilized plant {plant_id}")
+        try:
+            command, queued = self.action_queue.submit(
+                action, plant_id, request_id, function, Priority[priority.upper()], merge
+            )
+        except queue.Full:
+            self.respond(503, "Command queue is full")
+            return
+        self.respond_json(202 if queued else 200, command.to_dict(), {"Location": f"/commands/{command.id}"})
 
-    def handle_post_plant_harvest(self):
+    def submit_state(self, state: RobotState):
         """
-        Handles the plant harvesting request by extracting the plant ID from the path and harvesting the specified plant.
+        Queues a change of the robot's state, so it takes effect between two actions of the robot's loop.
+        State changes are never merged, so the last requested state always wins.
         """
-        plant_id = self.plant_id_from_path()
-        if plant_id is None:
-            self.respond(400, "Invalid request path")
-            return
-        #self.robot.harvest_plant(self.robot.plants[plant_id - 1])
-        self.action_queue.put(
-            lambda robot: robot.harvest_plant(robot.plants[plant_id - 1])
-        )
+        self.submit_command(state.value, function=lambda robot: robot.set_state(state), merge=False)
 
-        self.respond_ok(f"Harvested plant {plant_id}")
-
-    def handle_post_plant_seed(self):
+    def handle_get_command(self, command_id: str):
         """
-        Handles the plant seeding request by extracting the plant ID from the path and seeding the specified plant.
+        Responds with the status of a command (queued, running, done, failed or cancelled).
         """
-        plant_id = self.plant_id_from_path()
-        if plant_id is None:
-            self.respond(400, "Invalid request path")
+        command = self.action_queue.get_command(command_id)
+        if command is None:
+            self.respond(404, "Command not found")
             return
-        #self.robot.seed_plant(self.robot.plants[plant_id - 1])
-        self.action_queue.put(
-            lambda robot: robot.seed_plant(robot.plants[plant_id - 1])
-        )
-
-        self.respond_ok(f"Seeded plant {plant_id}")
+        self.respond_json(200, command.to_dict())
 
-    def handle_post_plant_monitor(self):
+    def handle_cancel_command(self, command_id: str):
         """
-        Handles the plant monitoring request by extracting the plant ID from the path and monitoring the specified plant.
+        Cancels a queued command. Running or finished commands cannot be cancelled anymore.
         """
-        plant_id = self.plant_id_from_path()
-        if plant_id is None:
-            self.respond(400, "Invalid request path")
+        command = self.action_queue.cancel(command_id)
+        if command is None:
+            self.respond(404, "Command not found")
             return
-        #self.robot.monitor_plant(plant_id - 1)
-        self.action_queue.put(
-            lambda robot: robot.monitor_plant(plant_id - 1)
-        )
-
-        self.respond_ok(f"Monitored plant {plant_id}")
+        self.respond_json(200 if command.status == CommandStatus.CANCELLED else 409, command.to_dict())
 
     def plant_id_from_path(self):
         """
         Extracts the plant ID from the request path using regex.
         """
         match = re.match(
-            r"^/plant/(\d+)/(water|fertilize|harvest|seed|monitor)$", self.path
+            r"^/plant/(\d+)/(water|fertilize|harvest|seed|monitor)$", urlparse(self.path).path
         )
         if match:
             return int(match.group(1))
@@ -235,6 +390,19 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         """
         self.respond(200, message)
 
+    def respond_json(self, status_code: int, data, headers=None):
+        """
+        Sends a response with the given status code and JSON data.
+        """
+        body = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
     def respond(self, status_code: int, message: str):
         """
         Sends a response with the given status code and message.
@@ -244,32 +412,117 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.wfile.write(message.encode())
 
 
-def make_handler(robot,action_queue):
+def make_handler(robot,action_queue, message_stream=None, state_snapshot=None, static_assets=None):
     """
     Factory function to create a custom request handler for the HTTP server.
     Args:
         robot (Robot): The Robot instance to handle requests for.
+        action_queue (CommandQueue): The queue for commands to be performed by the robot.
+        message_stream (MessageStream, optional): The live stream of the robot's messages.
+        state_snapshot (StateSnapshot, optional): The cached state documents for the read-only endpoints.
+        static_assets (StaticAssets, optional): The prepared Unity WebGL build files.
     Returns:
         CustomHandler: A custom request handler class that extends CORSRequestHandler.
     """
 
     class CustomHandler(CORSRequestHandler):
         def __init__(self, *args, **kwargs):
-            super().__init__(robot,action_queue, *args, **kwargs)
+            super().__init__(robot,action_queue, message_stream, state_snapshot, static_assets, *args, **kwargs)
 
     return CustomHandler
 
 
-def run_http_server(robot: Robot,action_queue):
+class SiteRequestHandler(CORSRequestHandler):
     """
-    Starts the HTTP server.
+    Request handler serving the twins of several greenhouses (sites).
+    Requests to /sites/{name}/... are handled by the site of that name with the rest of the path,
+    e.g. POST /sites/house2/plant/3/water, requests without the prefix by the first site.
+    GET /sites lists the names of the sites.
+    """
+
+    def __init__(self, sites: dict, static_assets: StaticAssets, *args, **kwargs):
+        self.sites = sites
+        super().__init__(*next(iter(sites.values())), static_assets, *args, **kwargs)
+
+    def parse_request(self):
+        """
+        Selects the site of the request and removes the site prefix from its path.
+        """
+        if not super().parse_request():
+            return False
+        site = next(iter(self.sites.values()))
+        match = SITE_PATH.match(self.path)
+        if match:
+            site = self.sites.get(match.group(1))
+            if site is None:
+                self.respond(404, "Unknown site")
+                return False
+            self.path = (match.group(2) or "/") + (match.group(3) or "")
+        self.robot, self.action_queue, self.message_stream, self.state_snapshot = site
+        return True
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/sites":
+            self.respond_json(200, list(self.sites))
+        else:
+            super().do_GET()
+
+
+def make_site_handler(sites: dict, static_assets=None):
+    """
+    Factory function to create a request handler serving several sites.
+    Args:
+        sites (dict[str, tuple]): The (robot, action_queue, message_stream, state_snapshot) of each site, by name.
+        static_assets (StaticAssets, optional): The prepared Unity WebGL build files, shared by all sites.
+    Returns:
+        CustomHandler: A custom request handler class that extends SiteRequestHandler.
+    """
+
+    class CustomHandler(SiteRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(sites, static_assets, *args, **kwargs)
+
+    return CustomHandler
+
+
+def prepare_static_assets(static_directory):
+    """
+    Prepares (precompresses) the Unity WebGL build files in the static directory, None if there is no such directory.
     """
-    Handler = make_handler(robot, action_queue)
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
-        print(f"Serving at http://localhost:{PORT}")
+    if static_directory is None or not os.path.isdir(static_directory):
+        return None
+    static_assets = StaticAssets(static_directory, url_prefix=STATIC_URL_PREFIX)
+    print(f"Prepared {len(static_assets.assets)} static files from {static_directory}")
+    return static_assets
+
+
+def serve(handler, port=PORT):
+    with http.server.ThreadingHTTPServer(("", port), handler) as httpd:
+        print(f"Serving at http://localhost:{port}")
         httpd.serve_forever()
 
 
+def run_http_server(robot: Robot,action_queue, message_stream=None, state_snapshot=None, static_directory=STATIC_DIRECTORY, port=PORT):
+    """
+    Starts the HTTP server.
+    Each request is handled in its own thread, so open event streams and file downloads do not block the robot commands.
+    The Unity WebGL build files in the static directory are prepared (precompressed) once before the server starts.
+    """
+    static_assets = prepare_static_assets(static_directory)
+    serve(make_handler(robot, action_queue, message_stream, state_snapshot, static_assets), port)
+
+
+def run_multi_site_http_server(sites: dict, static_directory=STATIC_DIRECTORY, port=PORT):
+    """
+    Starts one HTTP server for several sites, see SiteRequestHandler.
+
+    Parameters:
+        sites (dict[str, tuple]): The (robot, action_queue, message_stream, state_snapshot) of each site, by name.
+    """
+    static_assets = prepare_static_assets(static_directory)
+    serve(make_site_handler(sites, static_assets), port)
+
+
 if __name__ == "__main__":
     """
     Main entry point to start the HTTP server.
@@ -0,0 +1,208 @@
+"""
+Closed-loop scheduling of the irrigation valves.
+Used to keep the soil moisture and nutrient level of every plant within its band
+without the robot having to visit a plant to switch its valves.
+"""
+
+import heapq
+import math
+import threading
+from model.plant import Plant
+import effectors.irrigation as irrigation
+
+
+class IrrigationController:
+    """
+    A class that schedules the water and fertigation valves of all plants.
+
+    The moisture and nutrient level of each plant is forecast linearly from its consumption rate and
+    the flow of its valve. A closed valve is opened when the level is forecast to reach the lower end of
+    the band and an open valve is closed when the level is forecast to reach the fill level.
+    Switching only at the ends of the band keeps the number of valve switches per plant minimal, and
+    filling only up to the fill level avoids the water lost when the soil is saturated.
+
+    Forecasts are made with the worst-case consumption, so a scheduled switch is never late. When a
+    scheduled switch is due, the plant is checked again and, if the level is not at the threshold yet,
+    re-forecast from its current level. This way each cycle only touches the plants with a due event
+    or a new observation, and all valve switches of a cycle are applied and reported as one batch.
+
+    Attributes:
+        plants (list[Plant]): The plants whose valves are controlled, indexed by plant id.
+        flow_rate (float): Flow rate of an open valve per simulation cycle.
+        low_margin (float): Margin above the minimum level at which a closed valve is opened.
+        fill_level (float): Level at which an open valve is closed.
+        consumption_spread (float): Relative deviation of the actual consumption from the base consumption.
+        max_horizon (int): Maximum number of cycles until a plant is checked again.
+        cycle (int): Number of simulation cycles the controller has run.
+        on_valves_changed (callable): Called with the list of switched valves after each cycle with switches.
+        irrigation (IrrigationSystem): The irrigation system whose valves are switched.
+    """
+
+    def __init__(
+        self,
+        plants: list[Plant],
+        flow_rate: float = 0.05,
+        low_margin: float = 0.05,
+        fill_level: float = 0.9,
+        consumption_spread: float = 0.2,
+        max_horizon: int = 100,
+        on_valves_changed=None,
+        irrigation_system: irrigation.IrrigationSystem = None,
+    ):
+        self.plants = plants
+        self.irrigation = irrigation_system if irrigation_system is not None else irrigation.get_system()
+        self.flow_rate = flow_rate
+        self.low_margin = low_margin
+        self.fill_level = fill_level
+        self.consumption_spread = consumption_spread
+        self.max_horizon = max_horizon
+        self.on_valves_changed = on_valves_changed
+        self.cycle = 0
+
+        # heap of scheduled checks (cycle, version, valve, line), outdated entries are skipped
+        self._events = []
+        self._versions = {
+            irrigation.WATER: [0] * len(plants),
+            irrigation.FERTIGATION: [0] * len(plants),
+        }
+        # plants with new observations that are re-forecast in the next cycle
+        self._pending = set(range(len(plants)))
+        self._pending_lock = threading.Lock()  # observations come from the robot thread
+
+    def observe(self, plant_id: int):
+        """
+        Marks a plant for re-forecasting in the next cycle,
+        e.g. after it was measured, seeded, harvested or its valves were switched manually.
+        """
+        with self._pending_lock:
+            self._pending.add(plant_id)
+
+    def step(self):
+        """
+        Runs one control cycle. Called by the simulation once per cycle before the flow is applied.
+        Re-forecasts the observed plants and the plants with a due check and switches their valves.
+
+        Returns:
+            list[int]: The valves that were switched in this cycle.
+        """
+        changed = set()
+
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        for plant_id in pending:
+            for line in (irrigation.WATER, irrigation.FERTIGATION):
+                if self._reschedule(plant_id, line):
+                    changed.add(plant_id)
+
+        while self._events and self._events[0][0] <= self.cycle:
+            _, version, valve, line = heapq.heappop(self._events)
+            if version != self._versions[line][valve]:
+                continue  # the plant was re-forecast since this check was scheduled
+            if self._reschedule(valve, line):
+                changed.add(valve)
+
+        self.cycle += 1
+
+        changed = sorted(changed)
+        if changed and self.on_valves_changed is not None:
+            self.on_valves_changed(changed)
+        return changed
+
+    def forecast(self, plant_id: int, line: str, cycles: int) -> list[float]:
+        """
+        Forecasts the level of a plant for the next cycles with the current valve state and mean consumption.
+
+        Parameters:
+            plant_id (int): The ID of the plant.
+            line (str): The irrigation line, either irrigation.WATER or irrigation.FERTIGATION.
+            cycles (int): The number of cycles to forecast.
+        Returns:
+            list[float]: The forecast level after each of the next cycles.
+        """
+        level, consumption, flow = self._state(plant_id, line)
+        return [
+            min(max(level + (flow - consumption) * t, 0.0), 1.0)
+            for t in range(1, cycles + 1)
+        ]
+
+    def get_schedule(self) -> list[tuple[int, int, str]]:
+        """
+        Returns the upcoming checks as (cycle, valve, line), ordered by cycle.
+        """
+        return sorted(
+            (cycle, valve, line)
+            for cycle, version, valve, line in self._events
+            if version == self._versions[line][valve]
+        )
+
+    def _state(self, plant_id: int, line: str):
+        """
+        Returns the current level, base consumption and valve flow of a plant on the given line.
+        """
+        plant = self.plants[plant_id]
+        if line == irrigation.WATER:
+            return (
+                plant.moisture_level,
+                plant.base_water_consumption,
+                self.irrigation.get_water_flow()[plant_id],
+            )
+        return (
+            plant.nutrient_level,
+            plant.base_nutrient_consumption,
+            self.irrigation.get_fertigation_flow()[plant_id],
+        )
+
+    def _reschedule(self, valve: int, line: str) -> bool:
+        """
+        Switches the valve if its plant has reached the end of the band and schedules the next check.
+
+        Returns:
+            bool: True if the valve was switched.
+        """
+        plant = self.plants[valve]
+        level, consumption, flow = self._state(valve, line)
+        minimum = plant.MIN_MOISTURE if line == irrigation.WATER else plant.MIN_NUTRIENTS
+        low_level = minimum + self.low_margin
+        setter = (
+            self.irrigation.set_water_flow
+            if line == irrigation.WATER
+            else self.irrigation.set_fertigation_flow
+        )
+
+        self._versions[line][valve] += 1
+
+        if not plant.has_plant:
+            # empty pots are not irrigated, they are observed again when seeded
+            if flow > 0.0:
+                setter(valve, 0.0)
+                return True
+            return False
+
+        is_open = flow > 0.0
+        switched = False
+        if is_open and level >= self.fill_level:
+            setter(valve, 0.0)
+            is_open, switched = False, True
+        elif not is_open and level <= low_level:
+            setter(valve, self.flow_rate)
+            is_open, switched = True, True
+
+        if is_open:
+            # earliest cycle the fill level can be reached, i.e. with the lowest consumption
+            rate = self.flow_rate - consumption * (1 - self.consumption_spread)
+            cycles = (
+                math.ceil((self.fill_level - level) / rate) if rate > 0 else self.max_horizon
+            )
+        else:
+            # earliest cycle the lower end of the band can be reached, i.e. with the highest consumption
+            rate = consumption * (1 + self.consumption_spread)
+            cycles = (
+                math.floor((level - low_level) / rate) if rate > 0 else self.max_horizon
+            )
+
+        cycles = min(max(cycles, 1), self.max_horizon)
+        heapq.heappush(
+            self._events,
+            (self.cycle + cycles, self._versions[line][valve], valve, line),
+        )
+        return switched
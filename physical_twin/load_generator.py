@@ -0,0 +1,258 @@
+"""
+Load generator for the HTTP control API of a running twin.
+
+Sends a configurable mix of robot state changes (/robot/{state}), moves (/robot/move) and plant actions
+(/plant/{id}/{action}) at a fixed rate from several concurrent clients, the way Grafana buttons and automation
+scripts do together. Some requests can be repeated with the same request ID to simulate double clicks and retries.
+
+The load is open-loop: requests are scheduled at the configured rate regardless of how fast the server answers, and
+latencies are measured from the scheduled time, so a stalled server shows up in the latencies instead of lowering the
+load. While running, the depth of the command queue is sampled from GET /commands.
+
+Example:
+    python load_generator.py --rate 50 --concurrency 16 --duration 60 --mix water=40,monitor=30,auto=5,move=10
+"""
+
+import argparse
+from collections import Counter, defaultdict
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+ROBOT_STATES = ("idle", "seed", "water", "fertilize", "harvest", "monitor", "auto")
+PLANT_ACTIONS = ("water", "fertilize", "harvest", "seed", "monitor")
+
+DEFAULT_MIX = "water=30,fertilize=20,monitor=20,harvest=5,seed=5,move=10,auto=5,idle=5"
+
+
+def parse_mix(mix: str) -> list:
+    """
+    Parses a request mix like "water=30,move=10,auto=5" into (kind, weight) pairs.
+    Plant actions (water, fertilize, harvest, seed, monitor) are sent to /plant/{id}/{action} and "move" to /robot/move.
+    Robot states are sent to /robot/{state}, states named like a plant action are prefixed with "robot_" (e.g. robot_water).
+    """
+    weights = []
+    for item in mix.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in PLANT_ACTIONS and kind != "move" and kind.removeprefix("robot_") not in ROBOT_STATES:
+            raise ValueError(f"Unknown request kind: {kind}")
+        weights.append((kind, float(weight or 1)))
+    return weights
+
+
+def percentile(values: list, share: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+class LoadGenerator:
+    """
+    A class that sends the requests and records the results.
+
+    Attributes:
+        latencies (dict[str, list[float]]): Latencies in seconds by request kind.
+        statuses (Counter): Number of responses by request kind and status code (0 for connection errors).
+        depths (list[tuple]): Sampled (time, queued commands, lanes) of the command queue.
+    """
+
+    def __init__(self, url: str, plant_amount: int, mix: list, priority: str = None, duplicate_share: float = 0.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.plant_amount = plant_amount
+        self.kinds = [kind for kind, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.priority = priority
+        self.duplicate_share = duplicate_share
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.depths = []
+        self.late = 0  # requests that could not be sent at their scheduled time because all clients were busy
+        self._lock = threading.Lock()
+        self._recent = []  # recently sent requests, repeated to simulate double clicks and retries
+
+    def make_request(self, rng: random.Random):
+        """
+        Returns the kind, path and request ID of a random request of the mix.
+        """
+        with self._lock:
+            if self._recent and rng.random() < self.duplicate_share:
+                return rng.choice(self._recent)
+
+        kind = rng.choices(self.kinds, self.weights)[0]
+        plant_id = rng.randint(1, self.plant_amount)
+        if kind in PLANT_ACTIONS:
+            path = f"/plant/{plant_id}/{kind}"
+        elif kind == "move":
+            path = f"/robot/move?i={plant_id}"
+        else:
+            path = f"/robot/{kind.removeprefix('robot_')}"
+        if self.priority is not None:
+            path += ("&" if "?" in path else "?") + f"priority={self.priority}"
+        request = (kind, path, uuid.uuid4().hex)
+
+        with self._lock:
+            self._recent = (self._recent + [request])[-50:]
+        return request
+
+    def run(self, rate: float, duration: float, concurrency: int, depth_interval: float = 1.0, seed: int = None):
+        """
+        Sends requests at the given rate for the given duration.
+        """
+        schedule = queue.Queue(maxsize=concurrency * 4)
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self._client, args=(schedule, random.Random(None if seed is None else seed + i)), daemon=True)
+            for i in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        sampler = threading.Thread(target=self._sample_depth, args=(stop, depth_interval), daemon=True)
+        sampler.start()
+
+        start = time.perf_counter()
+        count = int(rate * duration)
+        for i in range(count):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                schedule.put_nowait(scheduled)
+            except queue.Full:
+                self.late += 1
+                schedule.put(scheduled)  # latency is still measured from the scheduled time
+
+        for _ in workers:
+            schedule.put(None)
+        for worker in workers:
+            worker.join()
+        stop.set()
+        sampler.join()
+        return time.perf_counter() - start
+
+    def _client(self, schedule: queue.Queue, rng: random.Random):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while True:
+            scheduled = schedule.get()
+            if scheduled is None:
+                break
+            kind, path, request_id = self.make_request(rng)
+            try:
+                connection.request("POST", path, headers={"X-Request-ID": request_id, "Content-Length": "0"})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = 0
+            latency = time.perf_counter() - scheduled
+            with self._lock:
+                self.latencies[kind].append(latency)
+                self.statuses[(kind, status)] += 1
+
+    def _sample_depth(self, stop: threading.Event, interval: float):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        start = time.perf_counter()
+        while not stop.wait(interval):
+            try:
+                connection.request("GET", "/commands")
+                response = connection.getresponse()
+                body = response.read()
+                if response.status == 200:
+                    depth = json.loads(body)
+                    self.depths.append((time.perf_counter() - start, depth["queued"], depth["lanes"]))
+            except (OSError, http.client.HTTPException, ValueError):
+                connection.close()
+
+    def report(self, elapsed: float) -> dict:
+        """
+        Returns the latency distribution, error rate and command queue depth of the run.
+        """
+        results = {"elapsed": elapsed, "late": self.late, "kinds": {}}
+        all_latencies = []
+        total = errors = 0
+        for kind, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            all_latencies.extend(latencies)
+            statuses = {status: n for (k, status), n in self.statuses.items() if k == kind}
+            kind_errors = sum(n for status, n in statuses.items() if status == 0 or status >= 500)
+            total += len(latencies)
+            errors += kind_errors
+            results["kinds"][kind] = {
+                "requests": len(latencies),
+                "statuses": statuses,
+                "error_rate": kind_errors / len(latencies),
+                "p50": percentile(latencies, 0.5),
+                "p90": percentile(latencies, 0.9),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1],
+            }
+        all_latencies.sort()
+        results.update(
+            requests=total,
+            throughput=total / elapsed if elapsed else 0.0,
+            error_rate=errors / total if total else 0.0,
+            p50=percentile(all_latencies, 0.5),
+            p90=percentile(all_latencies, 0.9),
+            p99=percentile(all_latencies, 0.99),
+            max=all_latencies[-1] if all_latencies else 0.0,
+            queue_depth={
+                "max": max((d[1] for d in self.depths), default=None),
+                "final": self.depths[-1][1] if self.depths else None,
+                "final_lanes": self.depths[-1][2] if self.depths else None,
+                "samples": [d[:2] for d in self.depths],
+            },
+        )
+        return results
+
+
+def print_report(results: dict):
+    print(f"{'request':<12}{'count':>8}{'errors':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+    for kind, r in results["kinds"].items():
+        print(
+            f"{kind:<12}{r['requests']:>8}{r['error_rate']:>9.1%}{r['p50'] * 1000:>10.1f}{r['p90'] * 1000:>10.1f}"
+            f"{r['p99'] * 1000:>10.1f}{r['max'] * 1000:>10.1f}  {r['statuses']}"
+        )
+    print(
+        f"{'total':<12}{results['requests']:>8}{results['error_rate']:>9.1%}{results['p50'] * 1000:>10.1f}"
+        f"{results['p90'] * 1000:>10.1f}{results['p99'] * 1000:>10.1f}{results['max'] * 1000:>10.1f}"
+    )
+    print(f"Throughput: {results['throughput']:.1f} requests/s, sent late: {results['late']}")
+    depth = results["queue_depth"]
+    print(f"Command queue depth: max {depth['max']}, final {depth['final']} {depth['final_lanes'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load on the HTTP control API of a running twin.")
+    parser.add_argument("--url", type=str, default="http://localhost:8000", help="URL of the twin's HTTP server (default: http://localhost:8000)")
+    parser.add_argument("--plant_amount", type=int, default=20, help="Number of plants of the twin (default: 20)")
+    parser.add_argument("--rate", type=float, default=20, help="Requests per second (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients (default: 8)")
+    parser.add_argument("--duration", type=float, default=30, help="Duration in seconds (default: 30)")
+    parser.add_argument("--mix", type=str, default=DEFAULT_MIX, help=f"Weighted request mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--priority", type=str, default=None, help="Priority lane of the commands (default: the server's default)")
+    parser.add_argument("--duplicate_share", type=float, default=0.05, help="Share of requests repeating a recent request ID (default: 0.05)")
+    parser.add_argument("--depth_interval", type=float, default=1.0, help="Seconds between two queue depth samples (default: 1)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the request mix")
+    parser.add_argument("--output", type=str, default=None, help="File to write the results to as JSON")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.url, args.plant_amount, parse_mix(args.mix), args.priority, args.duplicate_share)
+    elapsed = generator.run(args.rate, args.duration, args.concurrency, args.depth_interval, args.seed)
+    results = generator.report(elapsed)
+    print_report(results)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,100 @@
-from robot import Robot
-import simulation
-from model.environment import Environment
-from model.plant import Plant
-import http_server as http_server
-import mqtt_client as mqtt_client
-from queue import Queue
-import threading
-from robot_state import RobotState
+
+from app import create_app
 import argparse
 
+# command line options and the configuration settings (section, key) they override
+OPTIONS = {
+    "mqtt_port": ("mqtt", "port"),
+    "mqtt_broker": ("mqtt", "broker"),
+    "mqtt_namespace": ("mqtt", "namespace"),
+    "mqtt_connections": ("mqtt", "connections"),
+    "mqtt_qos": ("mqtt", "qos"),
+    "mqtt_max_inflight": ("mqtt", "max_inflight"),
+    "record_file": ("mqtt", "record_file"),
+    "http_port": ("http", "port"),
+    "plant_amount": (None, "plant_amount"),
+    "simulation_cycle_time": ("simulation", "cycle_time"),
+    "seed": ("simulation", "seed"),
+    "robot_cycle_time": ("robot", "cycle_time"),
+    "zone_rows": ("simulation", "zone_rows"),
+    "zone_cols": ("simulation", "zone_cols"),
+    "irrigation_control": ("irrigation", "control"),
+    "irrigation_zone_size": ("irrigation", "zone_size"),
+    "vision_workers": ("vision", "workers"),
+    "image_directory": ("vision", "image_directory"),
+    "rules_file": ("decision_rules", "file"),
+    "command_aging_interval": ("commands", "aging_interval"),
+    "command_lane_capacity": ("commands", "lane_capacity"),
+}
+
+
+def get_overrides(args) -> dict:
+    """
+    Returns the configuration settings of the command line options that were given.
+    """
+    overrides = {}
+    for option, (section, key) in OPTIONS.items():
+        value = getattr(args, option)
+        if value is None:
+            continue
+        if section is None:
+            overrides[key] = value
+        else:
+            overrides.setdefault(section, {})[key] = value
+    for lane, rate in args.command_rate_limit or []:
+        overrides.setdefault("commands", {}).setdefault("rate_limits", {})[lane] = rate
+    return overrides
+
+
+def rate_limit(value: str) -> tuple:
+    """
+    Parses a command line rate limit LANE=RATE, e.g. monitoring=0.5.
+    """
+    lane, _, rate = value.partition("=")
+    if lane not in ("emergency", "manual", "automated", "monitoring"):
+        raise argparse.ArgumentTypeError(f"unknown lane '{lane}', expected emergency, manual, automated or monitoring")
+    try:
+        return lane, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate '{rate}', expected commands per second")
+
 
 def main():
     """
     Main function to initialize and run the digital twin simulation.
-    This function sets up the environment, plants, robot, MQTT client, and HTTP server,
-    and starts the simulation cycle.
+    This function sets up the environment, plants, robot, MQTT client, and HTTP server from the configuration file
+    and the command line options, and starts the simulation cycle.
     The simulation, mqtt client, and HTTP server run in separate threads to allow for concurrent operations.
     """
 
     parser = argparse.ArgumentParser(description="Run the digital twin simulation.")
-    parser.add_argument("--mqtt_port", type=int, required=True, help="Port for the MQTT client")
-    parser.add_argument("--plant_amount", type=int, default=20, help="Number of plants (default: 20)")
-    parser.add_argument("--simulation_cycle_time", type=int, default=60, help="Cycle time in seconds (default: 60)")
-    parser.add_argument("--robot_cycle_time", type=int, default=60, help="Robot cycle time in seconds (default: 60)")
+    parser.add_argument("--config", type=str, default=None, help="JSON configuration file, the options below override its settings")
+    parser.add_argument("--mqtt_port", type=int, default=None, help="Port for the MQTT client (default: 59973)")
+    parser.add_argument("--mqtt_broker", type=str, default=None, help="Address of the MQTT broker (default: localhost)")
+    parser.add_argument("--mqtt_namespace", type=str, default=None, help="Namespace of the Ditto things (default: ba)")
+    parser.add_argument("--mqtt_connections", type=int, default=None, help="Number of MQTT connections the twin topics are sharded across (default: 4)")
+    parser.add_argument("--mqtt_qos", type=int, choices=[0, 1, 2], default=None, help="QoS level of the published messages (default: 0)")
+    parser.add_argument("--mqtt_max_inflight", type=int, default=None, help="Maximum number of unacknowledged messages per MQTT connection (default: 100)")
+    parser.add_argument("--record_file", type=str, default=None, help="File the published messages are appended to, for replay with telemetry_recording.py")
+    parser.add_argument("--http_port", type=int, default=None, help="Port of the HTTP server (default: 8000)")
+    parser.add_argument("--plant_amount", type=int, default=None, help="Number of plants (default: 20)")
+    parser.add_argument("--simulation_cycle_time", type=int, default=None, help="Cycle time in seconds (default: 60)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the simulation's random numbers, for reproducible runs (default: random)")
+    parser.add_argument("--robot_cycle_time", type=int, default=None, help="Robot cycle time in seconds (default: 60)")
+    parser.add_argument("--zone_rows", type=int, default=None, help="Number of climate zone rows in the greenhouse (default: 2)")
+    parser.add_argument("--zone_cols", type=int, default=None, help="Number of climate zone columns in the greenhouse (default: 10)")
+    parser.add_argument("--irrigation_control", choices=["robot", "scheduled"], default=None, help="Who switches the irrigation valves: the robot when visiting a plant, or the scheduling controller each simulation cycle (default: robot)")
+    parser.add_argument("--irrigation_zone_size", type=int, default=None, help="Number of neighbouring plant valves per irrigation zone (default: 5)")
+    parser.add_argument("--vision_workers", type=int, default=None, help="Number of worker processes analysing camera frames, 0 disables the image analysis (default: 1)")
+    parser.add_argument("--image_directory", type=str, default=None, help="Directory with plant images (plant_<id>.ppm), frames are synthesized if not given")
+    parser.add_argument("--rules_file", type=str, default=None, help="Text file with rules deciding the robot's plant actions, one per line, e.g. 'soil_moisture < 0.3 and health == sick -> water, priority 1'")
+    parser.add_argument("--command_aging_interval", type=float, default=None, help="Waiting time in seconds after which a queued command is treated as one priority class more urgent (default: 300)")
+    parser.add_argument("--command_lane_capacity", type=int, default=None, help="Maximum number of queued commands per priority lane (default: 1000)")
+    parser.add_argument("--command_rate_limit", type=rate_limit, action="append", default=None, metavar="LANE=RATE", help="Commands started per second in a priority lane, e.g. monitoring=0.5, can be repeated (default: no limit)")
     args = parser.parse_args()
 
-    mqtt_port = args.mqtt_port
-    plant_amount = args.plant_amount
-    simulation_cycle_time = args.simulation_cycle_time
-    robot_cycle_time = args.robot_cycle_time
-    
-    environment = Environment()
-
-    plants = [
-        Plant(id=i) for i in range(0, plant_amount)
-    ]  
-
-    # message queue for measurements, the robot puts measurements into this queue
-    # and the MQTT client reads from it to publish to the MQTT broker
-    measurement_queue = Queue()
-    action_queue = Queue()
-
-    robot = Robot(plants=plants, measurement_queue=measurement_queue,action_queue=action_queue,cycle_time=robot_cycle_time)
-
-    robot.set_state(RobotState.AUTO)  # Set the robot to auto mode
-
-    simulation.initialize(environment, plants, simulation_cycle_time)
-    threading.Thread(
-        target=simulation.run_simulation, daemon=True
-    ).start()  # Start the simulation cycle in a separate thread
-
-    mqtt_client.set_message_queue(measurement_queue)
-    mqtt_client.set_port(mqtt_port)  # Set the MQTT port
-    threading.Thread(target=mqtt_client.run_mqtt_client, daemon=True).start()
-
-    threading.Thread(
-        target=http_server.run_http_server, args=(robot,action_queue), daemon=True
-    ).start()
-
-    robot.run()  # Start the robot's main loop
+    app = create_app(args.config, get_overrides(args))
+    app.run()  # Start the simulation, MQTT client and HTTP server threads and the robot's main loop
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+"""
+This module fans out the messages of the robot to live subscribers, e.g. the Server-Sent Events endpoint of the HTTP server.
+Each subscriber has a bounded buffer, so a slow consumer only loses its own oldest messages and never blocks the robot.
+"""
+
+from collections import deque
+import json
+import threading
+import time
+from twin_component import TwinComponent
+
+
+class Subscription:
+    """
+    A class representing a subscriber of the message stream.
+
+    Attributes:
+        components (set[str] | None): Twin components to receive (e.g. "my_plants"), or None for all.
+        plant_ids (set[int] | None): Plant IDs to receive plant messages for, or None for all.
+        dropped (int): Number of messages dropped because the buffer was full.
+    """
+
+    def __init__(self, components=None, plant_ids=None, buffer_size: int = 256):
+        self.components = set(components) if components else None
+        self.plant_ids = set(plant_ids) if plant_ids else None
+        self.dropped = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+
+    def matches(self, component: str, plant_id) -> bool:
+        """
+        Checks if a message of the given component and plant passes the subscriber's filter.
+        The plant filter only applies to plant messages.
+        """
+        if self.components is not None and component not in self.components:
+            return False
+        if self.plant_ids is not None and plant_id is not None and plant_id not in self.plant_ids:
+            return False
+        return True
+
+    def put(self, message: str):
+        """
+        Adds a serialized message to the buffer, dropping the oldest message if the buffer is full.
+        """
+        with self._condition:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(message)
+            self._condition.notify()
+
+    def get(self, timeout: float = None) -> list[str]:
+        """
+        Waits for messages and returns all buffered messages at once.
+        Returns an empty list if no message arrived within the timeout.
+        """
+        with self._condition:
+            if not self._buffer:
+                self._condition.wait(timeout)
+            messages = list(self._buffer)
+            self._buffer.clear()
+            return messages
+
+
+class MessageStream:
+    """
+    A class that distributes the messages sent by the robot to all matching subscriptions.
+    Each message is serialized once, no matter how many subscribers receive it.
+    """
+
+    def __init__(self):
+        self._subscriptions = ()  # replaced on change, so publishing needs no lock
+        self._lock = threading.Lock()
+
+    def subscribe(self, components=None, plant_ids=None, buffer_size: int = 256) -> Subscription:
+        """
+        Creates and registers a new subscription.
+
+        Parameters:
+            components (Iterable[str], optional): Twin components to receive, e.g. ["my_plants"].
+            plant_ids (Iterable[int], optional): Plant IDs (1-based, as in the twin) to receive plant messages for.
+            buffer_size (int): Maximum number of messages buffered for the subscriber.
+        """
+        subscription = Subscription(components, plant_ids, buffer_size)
+        with self._lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = tuple(
+                s for s in self._subscriptions if s is not subscription
+            )
+
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, msg: dict):
+        """
+        Publishes a message in the format of the measurement queue
+        ('component', 'plant_id' and 'data') to all matching subscriptions.
+        """
+        subscriptions = self._subscriptions
+        if not subscriptions:
+            return
+
+        component = msg["component"]
+        if isinstance(component, TwinComponent):
+            component = component.value
+        plant_id = msg["plant_id"]
+
+        message = None
+        for subscription in subscriptions:
+            if subscription.matches(component, plant_id):
+                if message is None:
+                    message = json.dumps(
+                        {
+                            "component": component,
+                            "plant_id": plant_id,
+                            "data": msg["data"],
+                            "time": round(time.time() * 1000),
+                        }
+                    )
+                subscription.put(message)
@@ -0,0 +1,148 @@
+import random
+from model.environment import Environment
+
+
+class EnvironmentField:
+    """
+    A class representing the spatial distribution of the greenhouse climate.
+    The greenhouse floor is divided into a grid of zones (row-major order), each zone holding its own
+    temperature, humidity and light value. The zones exchange heat and moisture with their neighbours
+    (diffusion), are carried along the rows by the ventilation air flow (advection) and relax towards
+    the global ambient values of the Environment.
+
+    The values of each quantity are stored in flat lists so that a simulation step is a handful of
+    whole-grid passes instead of per-zone object updates.
+
+    Attributes:
+        rows (int): Number of zone rows in the greenhouse.
+        cols (int): Number of zone columns in the greenhouse.
+        plant_count (int): Number of plant positions, used to map a robot position to a zone.
+        temperature (list[float]): Temperature of each zone in degrees Celsius.
+        humidity (list[float]): Humidity of each zone in percent.
+        light (list[float]): Light intensity of each zone in arbitrary units.
+        aggregates (dict): Mean, minimum and maximum of each quantity over all zones, updated each step.
+    """
+
+    QUANTITIES = ("temperature", "humidity", "light")
+
+    # quantities that are carried by the air flow, light is not
+    ADVECTED_QUANTITIES = ("temperature", "humidity")
+
+    # amplitude of the local random fluctuations per step
+    NOISE = {"temperature": 0.1, "humidity": 0.1, "light": 20}
+
+    def __init__(
+        self,
+        environment: Environment,
+        rows: int = 1,
+        cols: int = 1,
+        plant_count: int = 1,
+        diffusion: float = 0.1,
+        advection: float = 0.05,
+        relaxation: float = 0.05,
+    ):
+        """
+        Initializes all zones with the ambient values of the given environment.
+
+        Parameters:
+            environment (Environment): The global environment providing the ambient values.
+            rows (int): Number of zone rows.
+            cols (int): Number of zone columns.
+            plant_count (int): Number of plant positions along the robot's path.
+            diffusion (float): Diffusion coefficient per step, must not exceed 0.25 to keep the step stable.
+            advection (float): Fraction of the upwind neighbour's value carried into a zone per step (0 to 1).
+            relaxation (float): Fraction of the difference to the ambient value recovered per step (0 to 1).
+        """
+        if rows < 1 or cols < 1:
+            raise ValueError("The environment field needs at least one zone.")
+        if not 0.0 <= diffusion <= 0.25:
+            raise ValueError("The diffusion coefficient must be between 0 and 0.25.")
+
+        self.rows = rows
+        self.cols = cols
+        self.plant_count = max(plant_count, 1)
+        self.diffusion = diffusion
+        self.advection = advection
+        self.relaxation = relaxation
+
+        zone_count = rows * cols
+        self.temperature = [float(environment.temperature)] * zone_count
+        self.humidity = [float(environment.humidity)] * zone_count
+        self.light = [float(environment.light)] * zone_count
+
+        # neighbour indices of each zone, boundary zones use themselves (no flux over the walls)
+        self._north = [i - cols if i >= cols else i for i in range(zone_count)]
+        self._south = [i + cols if i + cols < zone_count else i for i in range(zone_count)]
+        self._west = [i - 1 if i % cols != 0 else i for i in range(zone_count)]
+        self._east = [i + 1 if (i + 1) % cols != 0 else i for i in range(zone_count)]
+
+        self.aggregates = {}
+        self._update_aggregates()
+
+    @property
+    def zone_count(self) -> int:
+        return self.rows * self.cols
+
+    def zone_at_position(self, position: int) -> int:
+        """
+        Maps a robot/plant position to the index of the zone it lies in.
+        The plant positions are spread evenly over the zones in row-major order.
+        """
+        position = min(max(position, 0), self.plant_count - 1)
+        return position * self.zone_count // self.plant_count
+
+    def sample(self, quantity: str, position: int) -> float:
+        """
+        Returns the value of the given quantity in the zone of the given position.
+        """
+        return getattr(self, quantity)[self.zone_at_position(position)]
+
+    def step(self, environment: Environment, rng: random.Random = None):
+        """
+        Advances the field by one simulation step.
+        Each quantity is updated for all zones at once:
+        diffusion between neighbouring zones, upwind advection along the rows,
+        relaxation towards the ambient value of the environment and a small random fluctuation.
+        The fluctuations are drawn from the given random number generator (default: the random module).
+        """
+        uniform = (rng or random).uniform
+        d = self.diffusion
+        c = self.advection
+        k = self.relaxation
+
+        for quantity in self.QUANTITIES:
+            values = getattr(self, quantity)
+            ambient = getattr(environment, quantity)
+            noise = self.NOISE[quantity]
+            a = c if quantity in self.ADVECTED_QUANTITIES else 0.0
+
+            north = [values[j] for j in self._north]
+            south = [values[j] for j in self._south]
+            west = [values[j] for j in self._west]
+            east = [values[j] for j in self._east]
+
+            setattr(
+                self,
+                quantity,
+                [
+                    v
+                    + d * (n + s + w + e - 4.0 * v)
+                    - a * (v - w)
+                    + k * (ambient - v)
+                    + uniform(-noise, noise)
+                    for v, n, s, w, e in zip(values, north, south, west, east)
+                ],
+            )
+
+        self._update_aggregates()
+
+    def _update_aggregates(self):
+        """
+        Recomputes the greenhouse-wide aggregates of each quantity.
+        """
+        zone_count = self.zone_count
+        for quantity in self.QUANTITIES:
+            values = getattr(self, quantity)
+            self.aggregates[f"{quantity}_mean"] = sum(values) / zone_count
+            self.aggregates[f"{quantity}_min"] = min(values)
+            self.aggregates[f"{quantity}_max"] = max(values)
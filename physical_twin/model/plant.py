@@ -1,6 +1,7 @@
 from datetime import datetime
 import random
 from datetime import timedelta
+from util import clock
 
 class Plant:
     """
@@ -14,7 +15,9 @@ class Plant:
         moisture_level (float): Current moisture level of the plant's soil.
         nutrient_level (float): Current nutrient level of the plant's soil.
         healthy (bool): Indicates if the plant is healthy.
-        i
+        MIN_MOISTURE, MIN_NUTRIENTS (float): Levels below which the plant is watered or fertilized.
+        MAX_MOISTURE, MAX_NUTRIENTS (float): Levels at which watering or fertilization is stopped.
+            The class attributes are the defaults, each plant can be given its own thresholds.
     """
 
     MIN_MOISTURE = 0.3
@@ -29,8 +32,13 @@ class Plant:
     
     datetime_planted: datetime
 
-    def __init__(self, id: int, has_plant: bool = True, base_water_consumption: float = 0.03, base_nutrient_consumption: float = 0.03, date_time_planted: datetime = None):
+    def __init__(self, id: int, has_plant: bool = True, base_water_consumption: float = 0.03, base_nutrient_consumption: float = 0.03, date_time_planted: datetime = None,
+                 min_moisture: float = MIN_MOISTURE, min_nutrients: float = MIN_NUTRIENTS, max_moisture: float = MAX_MOISTURE, max_nutrients: float = MAX_NUTRIENTS, rng: random.Random = None):
         self.id = id
+        self.MIN_MOISTURE = min_moisture
+        self.MIN_NUTRIENTS = min_nutrients
+        self.MAX_MOISTURE = max_moisture
+        self.MAX_NUTRIENTS = max_nutrients
         self.has_plant = has_plant
         self.base_water_consumption = base_water_consumption
         self.base_nutrient_consumption = base_nutrient_consumption
@@ -38,25 +46,30 @@ class Plant:
         if date_time_planted is not None:
             self.datetime_planted = date_time_planted
         else:
-            self.set_random_datetime_planted()
+            self.set_random_datetime_planted(rng)
         
-    def set_random_datetime_planted(self):
+    def set_random_datetime_planted(self, rng: random.Random = None):
         """
         Sets a random datetime for when the plant was planted, within the last 16 weeks.
+        The time is drawn from the given random number generator (default: the random module).
         """
-        now = datetime.now()
+        now = clock.now()
         sixteen_weeks_ago = now - timedelta(weeks=16)
-        random_seconds = random.randint(0, int((now - sixteen_weeks_ago).total_seconds()))
+        random_seconds = (rng or random).randint(0, int((now - sixteen_weeks_ago).total_seconds()))
         self.datetime_planted = sixteen_weeks_ago + timedelta(seconds=random_seconds)
 
-    def is_harvestable(self) -> bool:
+    def is_harvestable(self, now: datetime = None) -> bool:
         """
         Checks if the plant is harvestable based on its age.
         
+        Parameters:
+            now (datetime): The current time, e.g. read once for many plants (default: now).
         Returns:
             bool: True if the plant is harvestable, False otherwise.
         """
-        return self.has_plant and self.datetime_planted is not None and (datetime.now() - self.datetime_planted).days >= 15 * 7
+        if not self.has_plant or self.datetime_planted is None:
+            return False
+        return ((now or clock.now()) - self.datetime_planted).days >= 15 * 7
     
     def is_plantable(self) -> bool:
         """
@@ -0,0 +1,132 @@
+from datetime import datetime
+import threading
+from model.plant import Plant
+
+# contribution of a plant that was not counted yet
+UNCOUNTED = object()
+
+
+class PlantAggregates:
+    """
+    A class maintaining greenhouse-wide aggregates of the plants for the plant container twin:
+    the number of pots per state and the mean and percentiles of the soil moisture and nutrients of the planted pots.
+
+    The aggregates are maintained incrementally: each plant's last contribution is kept, and an update replaces it
+    in the counts, sums and histograms in O(1), regardless of the number of plants. Percentiles are read from the
+    histograms, with a resolution of one bin. Updates are thread-safe, so the simulation and the robot can both update.
+
+    Attributes:
+        bins (int): Number of histogram bins over the level range 0 to 1.
+        counts (dict[str, int]): Number of pots per state (planted, empty, healthy, sick, ripe, not_ripe,
+            dry and low_nutrients), dry and low nutrient pots are planted pots below the plant's thresholds.
+        moisture_sum, nutrient_sum (float): Sum of the levels of the planted pots.
+        moisture_histogram, nutrient_histogram (list[int]): Number of planted pots per level bin.
+    """
+
+    STATES = ("planted", "empty", "healthy", "sick", "ripe", "not_ripe", "dry", "low_nutrients")
+
+    # percentiles published to the twin
+    PERCENTILES = (10, 50, 90)
+
+    def __init__(self, plants: list[Plant], bins: int = 100):
+        self.bins = bins
+        self.counts = dict.fromkeys(self.STATES, 0)
+        self.moisture_sum = 0.0
+        self.nutrient_sum = 0.0
+        self.moisture_histogram = [0] * bins
+        self.nutrient_histogram = [0] * bins
+        self._lock = threading.Lock()
+        self._contributions = [UNCOUNTED] * len(plants)  # last contribution of each plant (None if empty), by plant id
+        for plant in plants:
+            self.update(plant)
+
+    def update(self, plant: Plant, now: datetime = None):
+        """
+        Replaces the contribution of a plant with its current state.
+
+        Parameters:
+            plant (Plant): The plant, identified by its ID.
+            now (datetime): The current time, for the ripeness (default: now).
+        """
+        if plant.has_plant:
+            moisture = plant.moisture_level
+            nutrients = plant.nutrient_level
+            contribution = (
+                "healthy" if plant.healthy else "sick",
+                "ripe" if plant.is_harvestable(now) else "not_ripe",
+                moisture < plant.MIN_MOISTURE,
+                nutrients < plant.MIN_NUTRIENTS,
+                moisture,
+                nutrients,
+                self._bin(moisture),
+                self._bin(nutrients),
+            )
+        else:
+            contribution = None
+        with self._lock:
+            previous = self._contributions[plant.id]
+            if contribution == previous:
+                return
+            self._apply(previous, -1)
+            self._apply(contribution, 1)
+            self._contributions[plant.id] = contribution
+
+    def _apply(self, contribution, sign: int):
+        counts = self.counts
+        if contribution is UNCOUNTED:
+            return
+        if contribution is None:
+            counts["empty"] += sign
+            return
+        health, ripeness, dry, low_nutrients, moisture, nutrients, moisture_bin, nutrient_bin = contribution
+        counts["planted"] += sign
+        counts[health] += sign
+        counts[ripeness] += sign
+        counts["dry"] += sign * dry
+        counts["low_nutrients"] += sign * low_nutrients
+        self.moisture_sum += sign * moisture
+        self.nutrient_sum += sign * nutrients
+        self.moisture_histogram[moisture_bin] += sign
+        self.nutrient_histogram[nutrient_bin] += sign
+
+    def _bin(self, level: float) -> int:
+        return min(max(int(level * self.bins), 0), self.bins - 1)
+
+    def percentile(self, histogram: list[int], q: float):
+        """
+        Returns the q-th percentile (0 to 100) of the levels counted in a histogram, the center of its bin,
+        or None if the histogram is empty.
+        """
+        total = sum(histogram)
+        if total == 0:
+            return None
+        rank = q / 100 * (total - 1)
+        seen = 0
+        for i, count in enumerate(histogram):
+            seen += count
+            if seen > rank:
+                return (i + 0.5) / self.bins
+        return (self.bins - 0.5) / self.bins
+
+    def get_twin_data(self, water_used: float = None, fertigation_used: float = None) -> dict:
+        """
+        Returns the aggregates as features of the plant container twin, levels in percent as the plant twins.
+
+        Parameters:
+            water_used, fertigation_used (float): Optional totals delivered by the irrigation lines.
+        """
+        planted = self.counts["planted"]
+        data = {f"{state}_count": count for state, count in self.counts.items()}
+        for name, total, histogram in (
+            ("soil_moisture", self.moisture_sum, self.moisture_histogram),
+            ("soil_nutrients", self.nutrient_sum, self.nutrient_histogram),
+        ):
+            data[f"{name}_mean"] = total / planted * 100 if planted else None
+            for q in self.PERCENTILES:
+                value = self.percentile(histogram, q)
+                data[f"{name}_p{q}"] = value * 100 if value is not None else None
+        if water_used is not None:
+            data["water_used"] = water_used
+        if fertigation_used is not None:
+            data["fertigation_used"] = fertigation_used
+        return data
@@ -0,0 +1,113 @@
+"""
+This module schedules the robot's monitoring visits per plant, adapted to how fast each plant's levels change.
+
+The published soil moisture and nutrient levels of a plant are only as current as its last visit. Between two visits
+the twin's value drifts from the real level by about the plant's rate of change times the time since the visit.
+The scheduler estimates each plant's rate of change from its last readings and schedules the next visit when this
+expected error reaches the tolerance, within a minimum and maximum interval. Plants whose levels change fast are
+visited often, stable plants (e.g. saturated, dry or empty pots) rarely.
+"""
+
+from array import array
+import heapq
+import math
+import threading
+from util import clock
+
+
+class MonitoringScheduler:
+    """
+    A class scheduling the monitoring visits of the plants by their estimated rate of change.
+
+    Attributes:
+        tolerance (float): The expected error of a level (0 to 1) at which a plant is due again.
+        min_interval (float): The minimum time in seconds between two visits of a plant.
+        max_interval (float): The maximum time in seconds between two visits of a plant.
+        alpha (float): The weight of a new rate estimate in the moving average of a plant's rate (0 to 1).
+        rate (array[float]): The estimated rate of change of each plant in levels per second, NaN if unknown.
+        due (array[float]): The unix time each plant is due, 0 if it is due now.
+        visits (int): The number of observed visits.
+    """
+
+    def __init__(self, plant_count: int, tolerance: float = 0.05, min_interval: float = 60, max_interval: float = 3600, alpha: float = 0.5):
+        self.tolerance = tolerance
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.rate = array("d", [math.nan]) * plant_count
+        self.due = array("d", bytes(8 * plant_count))
+        self.visits = 0
+        self._last_time = array("d", [math.nan]) * plant_count
+        self._last_levels = [None] * plant_count
+        self._heap = [(0.0, plant_id) for plant_id in range(plant_count)]  # (due, plant ID), stale entries are skipped
+        self._lock = threading.Lock()
+
+    def interval(self, plant_id: int) -> float:
+        """
+        Returns the time in seconds after a visit until the plant's expected error reaches the tolerance.
+        """
+        rate = self.rate[plant_id]
+        if rate != rate:  # unknown, visit again soon to estimate it
+            return self.min_interval
+        if rate <= 0:
+            return self.max_interval
+        return min(max(self.tolerance / rate, self.min_interval), self.max_interval)
+
+    def observe(self, plant_id: int, levels: tuple, now: float = None):
+        """
+        Records the levels measured at a visit of a plant and schedules its next visit.
+
+        Parameters:
+            plant_id (int): The (0-based) ID of the plant.
+            levels (tuple[float, ...]): The measured levels, e.g. (soil moisture, soil nutrients).
+            now (float): The unix time of the visit (default: now).
+        """
+        now = clock.now().timestamp() if now is None else now
+        with self._lock:
+            last_time = self._last_time[plant_id]
+            last_levels = self._last_levels[plant_id]
+            if last_levels is not None and now > last_time:
+                rate = max(abs(level - last) for level, last in zip(levels, last_levels)) / (now - last_time)
+                previous = self.rate[plant_id]
+                self.rate[plant_id] = rate if previous != previous else previous + self.alpha * (rate - previous)
+            self._last_time[plant_id] = now
+            self._last_levels[plant_id] = tuple(levels)
+            self._schedule(plant_id, now + self.interval(plant_id))
+            self.visits += 1
+
+    def reset(self, plant_id: int, now: float = None):
+        """
+        Forgets the estimated rate of a plant whose levels will change differently, e.g. after it was seeded
+        or harvested or its valves were switched, and schedules a visit after the minimum interval at the latest,
+        whose reading replaces the estimate.
+        """
+        now = clock.now().timestamp() if now is None else now
+        with self._lock:
+            self.rate[plant_id] = math.nan
+            self._schedule(plant_id, min(self.due[plant_id], now + self.min_interval))
+
+    def is_due(self, plant_id: int, now: float = None) -> bool:
+        return self.due[plant_id] <= (clock.now().timestamp() if now is None else now)
+
+    def next_due(self, now: float = None):
+        """
+        Returns the ID of the plant that has been due the longest, or None if no plant is due.
+        """
+        now = clock.now().timestamp() if now is None else now
+        with self._lock:
+            heap = self._heap
+            while heap:
+                due, plant_id = heap[0]
+                if due != self.due[plant_id]:
+                    heapq.heappop(heap)  # rescheduled since
+                    continue
+                return plant_id if due <= now else None
+            return None
+
+    def _schedule(self, plant_id: int, due: float):
+        self.due[plant_id] = due
+        heapq.heappush(self._heap, (due, plant_id))
+        if len(self._heap) > 4 * len(self.due) + 64:
+            # drop the stale entries, so the heap stays proportional to the number of plants
+            self._heap = [(due, plant_id) for plant_id, due in enumerate(self.due)]
+            heapq.heapify(self._heap)
@@ -1,12 +1,21 @@
 """
 This module provides functionality to connect to and send messages to an MQTT broker in the Ditto protocol format.
+The messages are published over a pool of connections, sharded by topic.
+Commands for the robot and plant twins can be received over MQTT as well, see CommandSubscriber.
 """
 
+import queue
 from queue import Queue
-import paho.mqtt.client as mqtt
 import time
 import json
+import logging
+import os
+import threading
+import zlib
+from commands import Priority
+from robot_state import RobotState
 from twin_component import TwinComponent
+import tracing
 
 # Namespace of the OpenTwins (Eclipse Ditto) Digital Twin
 namespace = "ba"
@@ -18,20 +27,317 @@ message_queue: Queue = None
 broker = "localhost"  # MQTT broker address
 port = 59973  # MQTT port
 topic = "telemetry/"  # Topic where data will be published
+command_topic = "command/"  # Topic prefix of the commands for the twins, e.g. command/ba/my_plants:plant_3
 
+# Ditto live message subjects accepted by the plant twins, as the plant routes of the HTTP server
+PLANT_COMMANDS = ("water", "fertilize", "harvest", "seed", "monitor")
 
-def on_connect(client, userdata, flags, rc):
+
+# Publisher pool configuration
+connections = 4  # number of broker connections the topics are sharded across
+qos = 0  # quality of service level of the published messages
+max_inflight = 100  # maximum number of unacknowledged messages per connection
+
+# Pool of broker connections, created when the client is started
+publisher_pool = None
+
+# Optional recorder of all published messages (telemetry_recording.TelemetryRecorder)
+recorder = None
+
+logger = logging.getLogger(__name__)
+
+# paho.mqtt.client, imported when the first connection is created so importing this module stays cheap
+mqtt = None
+
+
+def _import_paho():
+    global mqtt
+    if mqtt is None:
+        import paho.mqtt.client as paho_client
+
+        mqtt = paho_client
+    return mqtt
+
+
+class Publisher:
+    """
+    A class representing one connection to the MQTT broker with its own network loop thread.
+    Messages are published from a sender thread, at most max_inflight of them are unacknowledged at a time,
+    so a slow connection only delays its own topics. The connection is re-established with exponential backoff.
+    """
+
+    def __init__(self, client_id: str, qos: int = 0, max_inflight: int = 100, max_queued: int = 0):
+        self.qos = qos
+        self.max_inflight = max_inflight
+        self.outbox = Queue(maxsize=max_queued)
+        self._inflight = 0
+        self._condition = threading.Condition()
+        _import_paho()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, userdata=client_id)
+        self.client.on_connect = on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+
+    def start(self, broker: str, port: int):
+        """
+        Connects to the broker in the background and starts the network loop and sender threads.
+        """
+        self.client.connect_async(broker, port, 60)
+        self.client.loop_start()
+        threading.Thread(target=self._send, daemon=True).start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _send(self):
+        while True:
+            topic, payload, trace = self.outbox.get()
+            if trace is not None:
+                tracing.record_span("mqtt.outbox_wait", trace["time"], parent=trace)
+            with tracing.span("mqtt.publish", parent=trace, topic=topic):
+                with self._condition:  # wait until there is room in the in-flight window
+                    self._condition.wait_for(lambda: self._inflight < self.max_inflight)
+                    self._inflight += 1
+                info = self.client.publish(topic, payload, qos=self.qos)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS and self.qos == 0:
+                # not sent (e.g. while reconnecting), QoS 0 messages are not acknowledged or retried
+                self._on_publish(self.client, None, info.mid)
+                logger.warning(f"Dropped message to {topic}: {mqtt.error_string(info.rc)}")
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        with self._condition:
+            self._inflight = max(self._inflight - 1, 0)
+            self._condition.notify()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        on_disconnect(client, userdata, flags, reason_code, properties)
+        if self.qos == 0:
+            # unsent QoS 0 messages are discarded with the connection, QoS 1 and 2 messages are resent after reconnecting
+            with self._condition:
+                self._inflight = 0
+                self._condition.notify_all()
+
+
+class PublisherPool:
+    """
+    A class that distributes the published messages across several broker connections.
+    Topics are sharded by hash, so the messages of one twin always use the same connection and stay in order.
+    If max_queued is set, publishing blocks while that many messages wait for a connection, otherwise it never blocks.
+    """
+
+    def __init__(self, broker: str, port: int, connections: int = 4, qos: int = 0, max_inflight: int = 100, max_queued: int = 0):
+        self.broker = broker
+        self.port = port
+        self.publishers = [
+            Publisher(f"{namespace}-physical-twin-{os.getpid()}-{i}", qos, max_inflight, max_queued)
+            for i in range(connections)
+        ]
+
+    def start(self):
+        for publisher in self.publishers:
+            publisher.start(self.broker, self.port)
+
+    def stop(self):
+        for publisher in self.publishers:
+            publisher.stop()
+
+    def wait_connected(self, timeout: float) -> bool:
+        """
+        Waits until all connections are established.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        deadline = time.monotonic() + timeout
+        while not all(publisher.client.is_connected() for publisher in self.publishers):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def publish(self, topic: str, payload: str, trace: dict = None):
+        """
+        Queues a message for the connection of its topic.
+        The optional trace context links the publishing to the stage that sent the message.
+        """
+        shard = zlib.crc32(topic.encode()) % len(self.publishers)
+        self.publishers[shard].outbox.put((topic, payload, trace))
+
+
+class CommandSubscriber:
+    """
+    A class receiving commands for the robot and plant twins from the MQTT broker and queueing them for the robot,
+    as the HTTP routes do, over one persistent connection.
+
+    The commands are Ditto protocol messages (a JSON object or a list of them) published to
+    command/{namespace}/{twin}, e.g. by a Ditto connection forwarding the live messages and desired state changes:
+        - live messages to the robot with a robot state as subject (e.g. ".../things/live/messages/watering"),
+          or the subject "move" with the 1-based position as value,
+        - changes of the robot's desired state (the desiredProperties of the "state" feature),
+        - live messages to a plant with an action as subject (water, fertilize, harvest, seed or monitor).
+    The 'correlation-id' header is used as the request ID and the 'priority' header selects the lane
+    (automated by default). If a 'reply-to' header is given, the command status is published to that topic.
+
+    Received messages are handed from the network loop to a dispatcher thread, which decodes them in batches.
+    One subscriber can receive the commands of several sites (e.g. in the multi-site runner) over one connection:
+    each command is routed by the namespace of its twin to the action queue of that site.
+
+    Attributes:
+        sites (dict[str, tuple[CommandQueue, int]]): The action queue and the number of plants of each site,
+            by the namespace of its twins.
+        batch_size (int): The maximum number of messages decoded at a time.
+        received (int): The number of received commands.
+        rejected (int): The number of commands that could not be decoded or queued.
+    """
+
+    def __init__(
+        self, action_queue=None, plant_count: int = 0, twin_namespace: str = None, qos: int = 1, batch_size: int = 500
+    ):
+        """
+        Parameters:
+            action_queue (CommandQueue): Optional queue of a single site, further sites are added with add_site().
+            plant_count (int): The number of plants of the single site, to validate the plant IDs.
+            twin_namespace (str): The namespace of the single site's twins (default: the namespace of the client).
+            qos (int): The QoS level of the subscription and the replies.
+            batch_size (int): The maximum number of messages decoded at a time.
+        """
+        self.sites = {}
+        if action_queue is not None:
+            self.add_site(twin_namespace or namespace, action_queue, plant_count)
+        self.qos = qos
+        self.batch_size = batch_size
+        self.received = 0
+        self.rejected = 0
+        self.inbox = Queue()
+        _import_paho()
+        client_name = (twin_namespace or namespace) if action_queue is not None else "sites"
+        client_id = f"{client_name}-physical-twin-{os.getpid()}-commands"
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, userdata=client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = on_disconnect
+        self.client.on_message = self._on_message
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+
+    def add_site(self, twin_namespace: str, action_queue, plant_count: int):
+        """
+        Receives the commands for the twins of a namespace, sites are added before the subscriber is started.
+        """
+        self.sites[twin_namespace] = (action_queue, plant_count)
+
+    def topic(self) -> str:
+        """
+        Returns the topic filter of the commands: the namespace of a single site, or all namespaces.
+        """
+        if len(self.sites) == 1:
+            return f"{command_topic}{next(iter(self.sites))}/#"
+        return f"{command_topic}+/#"
+
+    def start(self, broker: str, port: int):
+        """
+        Connects to the broker in the background and starts the network loop and dispatcher threads.
+        """
+        self.client.connect_async(broker, port, 60)
+        self.client.loop_start()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def handle(self, payload) -> list:
+        """
+        Decodes the commands of a message and submits them to the action queue of their site.
+
+        Parameters:
+            payload (str | bytes): A Ditto protocol message or a JSON list of them.
+        Returns:
+            list[tuple[int, Command | str]]: The status (as the HTTP routes respond) and the command
+            or error message of each command.
+        """
+        try:
+            envelopes = json.loads(payload)
+        except ValueError:
+            self.rejected += 1
+            logger.warning("Ignored command that is not JSON")
+            return [(400, "Invalid JSON")]
+        if not isinstance(envelopes, list):
+            envelopes = [envelopes]
+
+        results = []
+        for envelope in envelopes:
+            self.received += 1
+            try:
+                twin_namespace = envelope["topic"].split("/", 1)[0]
+                if twin_namespace not in self.sites:
+                    raise ValueError(f"Unknown namespace {twin_namespace}")
+                action_queue, plant_count = self.sites[twin_namespace]
+                command, queued = action_queue.submit(**decode_command(envelope, plant_count, twin_namespace))
+                result = (202 if queued else 200, command)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                result = (400, f"Invalid command: {e}")
+            except queue.Full:
+                result = (503, "Command queue is full")
+            if result[0] >= 400:
+                self.rejected += 1
+                logger.warning("Rejected command %s: %s", envelope, result[1])
+            self._reply(envelope, *result)
+            results.append(result)
+        return results
+
+    def _reply(self, envelope, status: int, result):
+        headers = envelope.get("headers") if isinstance(envelope, dict) else None
+        if not isinstance(headers, dict) or not headers.get("reply-to"):
+            return
+        response = {
+            "topic": envelope.get("topic"),
+            "headers": {"correlation-id": headers.get("correlation-id"), "content-type": "application/json"},
+            "path": envelope.get("path", "/"),
+            "value": result if isinstance(result, str) else result.to_dict(),
+            "status": status,
+        }
+        self.client.publish(headers["reply-to"], json.dumps(response), qos=self.qos)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        on_connect(client, userdata, flags, reason_code, properties)
+        if reason_code == 0:
+            # subscribed on every connect, the subscription is lost with the session when reconnecting
+            client.subscribe(self.topic(), qos=self.qos)
+
+    def _on_message(self, client, userdata, message):
+        self.inbox.put(message.payload)
+
+    def _dispatch(self):
+        while True:
+            batch = [self.inbox.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.inbox.get_nowait())
+            except queue.Empty:
+                pass
+            with tracing.span("mqtt.commands", messages=len(batch)):
+                for payload in batch:
+                    self.handle(payload)
+
+
+def on_connect(client, userdata, flags, reason_code, properties=None):
     """
     Prints if the MQTT client successfully connected to the broker.
     """
-    if rc == 0:
-        print("Successful connection")
+    if reason_code == 0:
+        print(f"Successful connection ({userdata})")
     else:
-        print(f"Connection failed with code {rc}")
+        print(f"Connection failed with code {reason_code}")
 
 
-client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-client.on_connect = on_connect
+def on_disconnect(client, userdata, flags, reason_code, properties=None):
+    """
+    Prints if the MQTT client lost its connection, it reconnects automatically.
+    """
+    if reason_code != 0:
+        print(f"Connection lost with code {reason_code}, reconnecting")
 
 
 def set_message_queue(queue):
@@ -43,25 +349,63 @@ def set_port(mqtt_port):
     port = mqtt_port
 
 
-def send_message(msg):
+def set_broker(mqtt_broker):
+    global broker
+    broker = mqtt_broker
+
+
+def set_recorder(telemetry_recorder):
+    global recorder
+    recorder = telemetry_recorder
+
+
+def set_namespace(twin_namespace):
+    global namespace
+    namespace = twin_namespace
+
+
+def set_publisher_options(mqtt_connections: int, mqtt_qos: int, mqtt_max_inflight: int):
     """
-    Sends a message to the MQTT broker in the Ditto protocol format.
-    :param msg: The message to be sent, containing 'component', 'plant_id'(only for plant data), and 'data'.
+    Sets the number of broker connections, the QoS level and the in-flight window of each connection.
     """
+    global connections, qos, max_inflight
+    connections = mqtt_connections
+    qos = mqtt_qos
+    max_inflight = mqtt_max_inflight
+
 
+def format_message(msg):
+    """
+    Converts a message into its topic and payload in the Ditto protocol format.
+    :param msg: The message, containing 'component', 'plant_id'(only for plant data), 'data'
+        and optionally the 'namespace' of the greenhouse (default: the namespace of the client).
+    :return: A tuple of the topic and the JSON payload.
+    """
     twin_name = get_twin_name_for_twin_component(msg["component"])
     if msg["plant_id"] is not None:
         twin_name += f":plant_{msg['plant_id']}"
+    twin_namespace = msg.get("namespace") or namespace
     formatted_features = features_to_ditto_protocol(msg["data"])
-    ditto_msg = to_ditto_protocol(twin_name, formatted_features)
+    ditto_msg = to_ditto_protocol(twin_name, formatted_features, twin_namespace)
+    return topic + twin_namespace + "/" + twin_name, json.dumps(ditto_msg)
 
-    # Uncomment the following line to print the message being published
-    print(
-        f"Publishing message to {topic + namespace + '/' + twin_name}: {json.dumps(ditto_msg)}"
-    )
-    
-    # Publish the message to the MQTT broker
-    client.publish(topic + namespace + "/" + twin_name, json.dumps(ditto_msg))
+
+def send_message(msg):
+    """
+    Sends a message to the MQTT broker in the Ditto protocol format.
+    :param msg: The message to be sent, containing 'component', 'plant_id'(only for plant data), and 'data'.
+    """
+    trace = msg.get("trace")
+    if trace is not None:
+        tracing.record_span("mqtt.queue_wait", trace["time"], parent=trace)
+    with tracing.span("mqtt.format_message", parent=trace):
+        message_topic, payload = format_message(msg)
+        logger.debug(f"Publishing message to {message_topic}: {payload}")
+        if recorder is not None:
+            recorder.record(message_topic, payload)
+
+        # Publish the message via the connection of its topic
+        publisher_pool.publish(message_topic, payload, tracing.current_context())
 
 
 def features_to_ditto_protocol(features):
@@ -88,36 +432,109 @@ def get_twin_name_for_twin_component(twin_component: TwinComponent):
     return twin_component.value
 
 
-def to_ditto_protocol(twin_name, features):
+def to_ditto_protocol(twin_name, features, twin_namespace=None):
     """
     Converts the features into the Ditto protocol format for a specific twin.
     :param twin_name: The name of the twin.
     :param features: A dictionary of features to be included in the message.
+    :param twin_namespace: The namespace of the twin (default: the namespace of the client).
     :return: A dictionary formatted for the Ditto protocol.
     """
     return {
-        "topic": f"{namespace}/{twin_name}/things/twin/commands/merge",
+        "topic": f"{twin_namespace or namespace}/{twin_name}/things/twin/commands/merge",
         "headers": {"content-type": "application/merge-patch+json"},
         "path": "/features",
         "value": features,
     }
 
 
+def desired_value(path: str, value, feature: str):
+    """
+    Returns the desired value of a feature from a Ditto modify or merge of the given path and value,
+    e.g. the path "/features/state/desiredProperties" with the value {"value": "idle"}.
+
+    Raises:
+        ValueError: If the change does not set the desired value of the feature.
+    """
+    target = ["features", feature, "desiredProperties", "value"]
+    pointer = [key for key in path.split("/") if key]
+    if pointer != target[: len(pointer)]:
+        raise ValueError(f"{path} is not the desired {feature}")
+    for key in target[len(pointer) :]:
+        if not isinstance(value, dict) or key not in value:
+            raise ValueError(f"No desired {feature} in the change of {path}")
+        value = value[key]
+    return value
+
+
+def decode_command(envelope: dict, plant_count: int, twin_namespace: str = None) -> dict:
+    """
+    Decodes a command in the Ditto protocol format, see CommandSubscriber.
+
+    Parameters:
+        envelope (dict): The Ditto protocol message.
+        plant_count (int): The number of plants, to validate the plant IDs.
+        twin_namespace (str): The namespace of the twins (default: the namespace of the client).
+    Returns:
+        dict: The arguments of CommandQueue.submit(), with the plant ID 0-based.
+    Raises:
+        ValueError: If the message is not a valid command.
+    """
+    parts = envelope["topic"].split("/")
+    if len(parts) < 6 or parts[2] != "things":
+        raise ValueError(f"Invalid Ditto topic {envelope['topic']}")
+    thing_namespace, thing, _, _, criterion = parts[:5]
+    action = "/".join(parts[5:])
+    if thing_namespace != (twin_namespace or namespace):
+        raise ValueError(f"Unknown namespace {thing_namespace}")
+
+    headers = envelope.get("headers") or {}
+    priority = str(headers.get("priority", "automated")).upper()
+    if priority not in Priority.__members__:
+        raise ValueError(f"Invalid priority {priority.lower()}")
+    command = {"request_id": headers.get("correlation-id"), "priority": Priority[priority]}
+    value = envelope.get("value")
+
+    def to_plant_id(position) -> int:
+        if isinstance(position, bool) or not isinstance(position, int) or not 1 <= position <= plant_count:
+            raise ValueError(f"Invalid plant {position}")
+        return position - 1
+
+    twin_name, _, plant = thing.partition(":")
+    if twin_name == TwinComponent.ROBOT.value and not plant:
+        if criterion == "messages" and action == "move":
+            position = value.get("i") if isinstance(value, dict) else value
+            return dict(command, action="move", plant_id=to_plant_id(position))
+        if criterion == "messages":
+            state = RobotState(action)
+        elif criterion in ("commands", "events") and action in ("modify", "merge", "modified", "merged"):
+            state = RobotState(desired_value(envelope.get("path", "/"), value, "state"))
+        else:
+            raise ValueError(f"Unsupported robot command {criterion}/{action}")
+        # state changes are never merged, so the last requested state always wins
+        return dict(command, action=state.value, function=lambda robot: robot.set_state(state), merge=False)
+    if twin_name == TwinComponent.PLANT.value and plant.startswith("plant_") and plant[6:].isdigit():
+        if criterion != "messages" or action not in PLANT_COMMANDS:
+            raise ValueError(f"Unsupported plant command {criterion}/{action}")
+        return dict(command, action=action, plant_id=to_plant_id(int(plant[6:])))
+    raise ValueError(f"Unknown twin {thing}")
+
+
 def run_mqtt_client():
     """
-    Starts the MQTT client and connects to the broker.
-    This function runs in a loop, checking the message queue for new messages to send.
-    If a message is available, it sends the message to the MQTT broker.
+    Starts the pool of MQTT connections to the broker.
+    This function waits for new messages in the message queue and hands them to the connection of their topic.
     """
+    global publisher_pool
     # client.username_pw_set(username, password)
-    client.connect(broker, port, 60)
+    publisher_pool = PublisherPool(broker, port, connections, qos, max_inflight)
+    publisher_pool.start()
 
     try:
         while True:
-            if message_queue is not None and not message_queue.empty():
-                msg = message_queue.get(block=True)
-                send_message(msg)
+            msg = message_queue.get(block=True)
+            send_message(msg)
 
     except KeyboardInterrupt:
         print("Disconnecting MQTT client...")
-        client.disconnect()
+        publisher_pool.stop()
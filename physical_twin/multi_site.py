@@ -0,0 +1,151 @@
+"""
+Runs the twins of several greenhouses (sites) in one process.
+
+All sites share one MQTT publisher pool, one MQTT command subscriber, one HTTP server, one simulation scheduler
+thread and one image analysis worker pool. Each site has its own plants, simulation, irrigation system, robot and Ditto namespace.
+The HTTP routes of a site are served under /sites/{name}/..., e.g. POST /sites/house2/plant/3/water.
+
+The configuration file contains the settings shared by all sites and a list of sites with their own settings,
+applied on top of the shared ones:
+
+    {
+        "mqtt": {"port": 1883},
+        "sites": [
+            {"name": "house1", "mqtt": {"namespace": "house1"}},
+            {"name": "house2", "mqtt": {"namespace": "house2"}, "plant_amount": 40}
+        ]
+    }
+
+Example:
+    python multi_site.py --config sites.json
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+from queue import Queue
+import threading
+from app import Application, start_mqtt_client
+from config import DEFAULT_CONFIG, merge
+from simulation import SimulationScheduler
+
+
+class MultiSiteRunner:
+    """
+    A class running the applications of several sites on shared threads and connections.
+
+    Attributes:
+        config (dict): The shared configuration, its mqtt, http and vision settings are used for the shared resources.
+        apps (dict[str, Application]): The application of each site, by name.
+        measurement_queue (Queue): The measurements of all sites, published by the shared MQTT client.
+        scheduler (SimulationScheduler): Runs the simulation cycles of all sites.
+        command_subscriber (CommandSubscriber): Receives the MQTT commands of all sites, once started.
+    """
+
+    def __init__(self, config: dict, sites: list):
+        """
+        Parameters:
+            config (dict): The shared configuration.
+            sites (list[dict]): The settings of each site, including its "name".
+        """
+        self.config = config
+        self.measurement_queue = Queue()
+        self.scheduler = SimulationScheduler()
+        workers = config["vision"]["workers"]
+        self.vision_executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.apps = {}
+        for site in sites:
+            site = dict(site)
+            name = site.pop("name")
+            if name in self.apps:
+                raise ValueError(f"Duplicate site name: {name}")
+            app = Application(merge(config, site))
+            app.measurement_queue = self.measurement_queue
+            app.vision_executor = self.vision_executor
+            self.apps[name] = app
+        self.threads = []
+        self.command_subscriber = None
+
+    def start(self):
+        """
+        Starts the robots, the simulation scheduler and the enabled MQTT client and HTTP server.
+        """
+        for name, app in self.apps.items():
+            app.robot
+            if self.config["http"]["enabled"]:
+                app.state_snapshot
+            app.start_simulation(self.scheduler)
+            self._start_thread(app.robot.run, f"robot-{name}")
+        self._start_thread(self.scheduler.run, "simulation")
+        if self.config["mqtt"]["enabled"]:
+            self.threads.append(start_mqtt_client(self.config["mqtt"], self.measurement_queue))
+            self.start_commands()
+        if self.config["http"]["enabled"]:
+            import http_server
+
+            http_config = self.config["http"]
+            self._start_thread(
+                http_server.run_multi_site_http_server,
+                "http",
+                {name: app.http_site for name, app in self.apps.items()},
+                http_config["static_directory"],
+                http_config["port"],
+            )
+
+    def start_commands(self):
+        """
+        Starts receiving the MQTT commands of all sites that accept them over one shared connection,
+        routed to the site by the namespace of the twin.
+        """
+        sites = [app for app in self.apps.values() if app.config["mqtt"]["commands"]]
+        if not sites:
+            return
+        import mqtt_client
+
+        mqtt_config = self.config["mqtt"]
+        self.command_subscriber = mqtt_client.CommandSubscriber(qos=max(mqtt_config["qos"], 1))
+        for app in sites:
+            self.command_subscriber.add_site(
+                app.config["mqtt"]["namespace"], app.action_queue, app.config["plant_amount"]
+            )
+        self.command_subscriber.start(mqtt_config["broker"], mqtt_config["port"])
+
+    def run(self):
+        """
+        Starts the sites and waits until the process is interrupted.
+        """
+        self.start()
+        threading.Event().wait()
+
+    def _start_thread(self, target, name, *args):
+        thread = threading.Thread(target=target, name=name, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+
+def load_sites(path: str):
+    """
+    Loads a multi-site configuration file.
+
+    Returns:
+        tuple[dict, list[dict]]: The shared configuration and the settings of each site.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    sites = data.pop("sites", [])
+    if not sites:
+        raise ValueError(f"No sites configured in {path}")
+    return merge(DEFAULT_CONFIG, data), sites
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the digital twins of several greenhouses in one process.")
+    parser.add_argument("--config", type=str, required=True, help="JSON configuration file with the shared settings and the list of sites")
+    args = parser.parse_args()
+
+    config, sites = load_sites(args.config)
+    MultiSiteRunner(config, sites).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-import time
+import queue
+from collections import Counter
 from effectors.chassis import Chassis
 from effectors.arm import Arm
 from sensors.camera import Camera
@@ -10,10 +11,13 @@ from sensors.soil_moisture_sensor import SoilMoistureSensor
 from sensors.soil_nutrient_sensor import SoilNutrientSensor
 from robot_state import RobotState
 from model.plant import Plant
+from effectors.motion_model import action_time
 from twin_component import TwinComponent
 import effectors.irrigation as irrigation
+import simulation
+import tracing
 import logging
-from datetime import datetime
+from util import clock
 
 
 class Robot:
@@ -34,7 +38,24 @@ class Robot:
         position (int): The current position of the robot in the greenhouse.
         state (RobotState): The current state of the robot, indicating what action it is performing.
         measurement_queue (Queue): A queue for sending measurements via MQTT.
+        action_queue (CommandQueue): The prioritized queue of commands to be performed by the robot.
         cycle_time (int): The time interval for the robot's actions.
+        irrigation_controller (IrrigationController): Optional controller that schedules the irrigation valves.
+            If set, the robot does not switch valves in autonomous mode and reports its observations to the controller.
+        message_stream (MessageStream): Optional stream that receives every message sent via MQTT for live subscribers.
+        on_state_changed (callable): Optional function called without arguments whenever the robot changed its or a plant's state.
+        image_pipeline (ImageAnalysisPipeline): Optional pipeline that estimates plant health and ripeness from camera frames.
+            If set, monitoring a plant submits a frame and the latest estimates replace the simulated health and ripeness.
+        busy_time (float): Total time in seconds the robot spent driving, moving its arm and working at plants,
+            according to the kinematic cost model of its effectors.
+        simulation (Simulation): The simulation of the robot's greenhouse, read by its sensors.
+        irrigation (IrrigationSystem): The irrigation system of the robot's greenhouse.
+        namespace (str): Optional Ditto namespace of the greenhouse's twins, the MQTT client's namespace if None.
+        flow_rate (float): Flow rate the robot opens a plant's water or fertigation valve with.
+        actions (Counter): Number of actions performed at plants, by action name.
+        aggregates_interval (float): Minimum time in seconds between two publications of the plant aggregates.
+        monitoring_scheduler (MonitoringScheduler): Optional scheduler of the monitoring visits by the plants' rates of
+            change. If set, monitoring visits the plant that is due next and autonomous mode only monitors due plants.
     """
 
     state = RobotState.IDLE
@@ -47,15 +68,26 @@ class Robot:
         action_queue,
         position=0,
         cycle_time: int = 10,  # Time interval for the robot's actions
+        irrigation_controller=None,
+        message_stream=None,
+        image_pipeline=None,
+        simulation_instance: simulation.Simulation = None,
+        irrigation_system: irrigation.IrrigationSystem = None,
+        namespace: str = None,
+        flow_rate: float = 0.05,
+        aggregates_interval: float = 300,
     ):
+        self.simulation = simulation_instance if simulation_instance is not None else simulation.get_simulation()
+        self.irrigation = irrigation_system if irrigation_system is not None else irrigation.get_system()
+        self.namespace = namespace
         self.chassis = Chassis(plant_count=len(plants), position=position)
-        self.arm = Arm()
+        self.arm = Arm(rng=self.simulation.random_streams.stream("arm"))
         self.camera = Camera()
-        self.humidity_sensor = HumiditySensor()
-        self.temperature_sensor = TemperatureSensor()
-        self.light_sensor = LightSensor()
-        self.soil_moisture_sensor = SoilMoistureSensor()
-        self.soil_nutrient_sensor = SoilNutrientSensor()
+        self.humidity_sensor = HumiditySensor(self.simulation)
+        self.temperature_sensor = TemperatureSensor(self.simulation)
+        self.light_sensor = LightSensor(self.simulation)
+        self.soil_moisture_sensor = SoilMoistureSensor(self.simulation)
+        self.soil_nutrient_sensor = SoilNutrientSensor(self.simulation)
         self.plants = plants
         self.position = position  # Initial position of the robot
         self.cycle_time = cycle_time  # Time interval for the robot's actions
@@ -65,6 +97,16 @@ class Robot:
         self.action_queue = (
             action_queue  # Queue for actions (to be processed by the robot)
         )
+        self.irrigation_controller = irrigation_controller
+        self.message_stream = message_stream
+        self.image_pipeline = image_pipeline
+        self.on_state_changed = None
+        self.busy_time = 0.0
+        self.actions = Counter()
+        self.flow_rate = flow_rate
+        self.aggregates_interval = aggregates_interval
+        self.monitoring_scheduler = None
+        self._aggregates_published = None
         self.logger = logging.getLogger(__name__)
 
     def set_state(self, state: RobotState):
@@ -102,7 +144,10 @@ class Robot:
         else:
             raise ValueError(f"Unknown state: {self.state}")
 
-        if self.state is not RobotState.IDLE:
+        # scheduled monitoring drives to the due plants instead of along the row
+        if self.state is not RobotState.IDLE and not (
+            self.state is RobotState.MONITORING and self.monitoring_scheduler is not None
+        ):
             self.move_to_next()  # Move to the next plant
 
     def do_idle(self):
@@ -146,36 +191,47 @@ class Robot:
         if plant.is_harvestable():
             self.harvest_plant(plant, send_mqtt_msg=send_mqtt_msg)
 
-    def do_monitoring(self):
+    def do_monitoring(self, plant_id=None):
         """
-        Send environmental data and plant data for the current position.
+        Send environmental data and plant data for the given plant, the current position if not given.
+        With a monitoring scheduler and no plant given, the plant that is due next is monitored, none if no plant is due.
         """
         self.logger.info("Robot is monitoring.")
 
+        if plant_id is None and self.monitoring_scheduler is not None:
+            plant_id = self.monitoring_scheduler.next_due()
+            if plant_id is None:
+                return
+        elif plant_id is None:
+            plant_id = self.chassis.position
+
         self.send_mqtt_msg(TwinComponent.ENVIRONMENT, self.get_environmental_data())
 
-        self.monitor_plant(self.chassis.position)
+        self.monitor_plant(plant_id)
 
     def do_auto(self):
         """
         Performs all actions in autonomous mode: seeding, watering, fertilizing, harvesting, and monitoring.
+        Watering and fertilizing are left to the irrigation controller if one is set.
         """
         self.logger.info("Robot is in autonomous mode.")
 
         self.do_seeding(send_mqtt_msg=False)
-        self.do_watering(send_mqtt_msg=False)
-        self.do_fertilizing(send_mqtt_msg=False)
+        if self.irrigation_controller is None:
+            self.do_watering(send_mqtt_msg=False)
+            self.do_fertilizing(send_mqtt_msg=False)
         self.do_harvesting(send_mqtt_msg=False)
-        self.do_monitoring()
+        if self.monitoring_scheduler is None or self.monitoring_scheduler.is_due(self.chassis.position):
+            self.do_monitoring(self.chassis.position)
 
     def get_temperature_data(self):
-        return self.temperature_sensor.read_data()
+        return self.temperature_sensor.read_data_at_plant(self.chassis.position)
 
     def get_humidity_data(self):
-        return self.humidity_sensor.read_data()
+        return self.humidity_sensor.read_data_at_plant(self.chassis.position)
 
     def get_light_data(self):
-        return self.light_sensor.read_data()
+        return self.light_sensor.read_data_at_plant(self.chassis.position)
 
     def get_soil_moisture_data(self, plant_id):
         return self.soil_moisture_sensor.read_data_at_plant(plant_id)
@@ -184,16 +240,48 @@ class Robot:
         return self.soil_nutrient_sensor.read_data_at_plant(plant_id)
 
     def get_plant_health_data(self, plant: Plant):
+        estimate = self.get_plant_estimate(plant)
+        if estimate is not None:
+            return estimate.health
         return "healthy" if plant.healthy else "sick"
 
     def get_plant_ripeness_data(self, plant: Plant):
+        estimate = self.get_plant_estimate(plant)
+        if estimate is not None:
+            return estimate.ripeness
         return "ripe" if plant.is_harvestable() else "not ripe"
 
+    def get_plant_estimate(self, plant: Plant):
+        """
+        Returns the latest camera based estimate of the plant, or None if there is none.
+        """
+        if self.image_pipeline is None:
+            return None
+        return self.image_pipeline.get_estimate(plant.id)
+
+    def publish_plant_estimate(self, estimate):
+        """
+        Sends the health and ripeness of a new camera based estimate via MQTT.
+        Used as callback of the image analysis pipeline.
+        """
+        self.send_mqtt_msg(
+            TwinComponent.PLANT,
+            {"health": estimate.health, "ripeness": estimate.ripeness},
+            estimate.plant_id + 1,
+        )
+
     def get_environmental_data(self):
+        """
+        Returns the environmental data measured in the zone at the robot's position,
+        together with the greenhouse-wide zone aggregates (mean, min and max of each quantity).
+        """
+        environment_field = self.simulation.get_environment_field()
         return {
             "temperature": self.get_temperature_data(),
             "humidity": self.get_humidity_data(),
             "light": self.get_light_data(),
+            "zone": environment_field.zone_at_position(self.chassis.position) + 1,
+            **environment_field.aggregates,
         }
 
     def get_plant_data(self, plant_id):
@@ -208,29 +296,30 @@ class Robot:
     def get_robot_data(self):
         return {
             "position": self.chassis.position + 1,
-            "arm_position": str(self.arm.position),
+            "arm_position": str(self.arm.plant_id) if self.arm.plant_id is not None else None,
             "state": self.state.value,
         }
 
     def monitor_plant(self, plant_id):
         """
         Moves to the specified plant's position and sends its data via MQTT.
-        Also sends the current irrigation flow rate.
+        Also sends the current irrigation flow rates, including the flow of the plant's valves.
         """
 
         self.move_to(plant_id)
         self.set_arm_position(self.plants[plant_id])
+        self.notify_irrigation_controller(plant_id)
+        if self.image_pipeline is not None:
+            self.image_pipeline.submit(self.plants[plant_id])
+        plant_data = self.get_plant_data(plant_id)
+        if self.monitoring_scheduler is not None:
+            self.monitoring_scheduler.observe(
+                plant_id, (plant_data["soil_moisture"] / 100, plant_data["soil_nutrients"] / 100)
+            )
+        self.send_mqtt_msg(TwinComponent.PLANT, plant_data, plant_id + 1)
+        self.perform_action("monitor")
         self.send_mqtt_msg(
-            TwinComponent.PLANT, self.get_plant_data(plant_id), plant_id + 1
-        )
-        self.send_mqtt_msg(
-            TwinComponent.ROBOT,
-            {
-                "action": "monitor",
-            },
-        )
-        self.send_mqtt_msg(
-            TwinComponent.IRRIGATION, {"flow_rate": irrigation.read_data() * 100}
+            TwinComponent.IRRIGATION, self.irrigation.get_twin_data(plant_id)
         )
 
     def seed_plant(self, plant: Plant, send_mqtt_msg=True):
@@ -246,15 +335,20 @@ class Robot:
         self.move_to(plant.id, send_mqtt_msg=send_mqtt_msg)
         self.set_arm_position(plant, send_mqtt_msg=send_mqtt_msg)
         self.plants[plant.id] = Plant(
-            id=plant.id, date_time_planted=datetime.now()
-        )  # Create a seedling plant
-
-        self.send_mqtt_msg(
-            TwinComponent.ROBOT,
-            {
-                "action": "seed",
-            },
-        )
+            id=plant.id,
+            date_time_planted=clock.now(),
+            min_moisture=plant.MIN_MOISTURE,
+            min_nutrients=plant.MIN_NUTRIENTS,
+            max_moisture=plant.MAX_MOISTURE,
+            max_nutrients=plant.MAX_NUTRIENTS,
+        )  # Create a seedling plant with the thresholds of the pot
+        self.simulation.aggregates.update(self.plants[plant.id])
+        self.reset_anomaly_detection(plant.id)
+        self.reschedule_monitoring(plant.id)
+        self.notify_irrigation_controller(plant.id)
+        self.discard_plant_estimate(plant.id)
+
+        self.perform_action("seed")
 
         if send_mqtt_msg:
             self.send_mqtt_msg(
@@ -278,13 +372,13 @@ class Robot:
         self.set_arm_position(plant, send_mqtt_msg=send_mqtt_msg)
         self.plants[plant.id].has_plant = False  # Remove the plant from the pot
         self.plants[plant.id].datetime_planted = None  # Set datetime_planted to None
+        self.simulation.aggregates.update(self.plants[plant.id])
+        self.reset_anomaly_detection(plant.id)
+        self.reschedule_monitoring(plant.id)
+        self.notify_irrigation_controller(plant.id)
+        self.discard_plant_estimate(plant.id)
 
-        self.send_mqtt_msg(
-            TwinComponent.ROBOT,
-            {
-                "action": "harvest",
-            },
-        )
+        self.perform_action("harvest")
 
         if send_mqtt_msg:
             self.send_mqtt_msg(
@@ -296,9 +390,10 @@ class Robot:
     def water_plant(self, plant: Plant, send_mqtt_msg=True):
         """
         Moves to the plant's position and positions the arm to measure soil moisture.
-        If the soil moisture is below the minimum threshold, it sets the irrigation flow rate to 0.5.
-        If the soil moisture is above the maximum threshold, it stops watering by setting the flow rate to 0.0.
-        Sends messages via MQTT with the current soil moisture and irrigation flow rate.
+        If the soil moisture is below the minimum threshold, it opens the plant's water valve with the robot's flow rate.
+        If the soil moisture is above the maximum threshold, it stops watering by closing the plant's water valve.
+        A valve that is already closed is left as it is, without rescheduling the plant's monitoring.
+        Sends messages via MQTT with the current soil moisture and irrigation flow rates.
         """
         self.move_to(plant.id, send_mqtt_msg=send_mqtt_msg)
         print(f"Watering plant with ID: {plant.id}")
@@ -310,31 +405,29 @@ class Robot:
                 TwinComponent.PLANT, {"soil_moisture": moisture * 100}, plant.id + 1
             )
 
-        if moisture < Plant.MIN_MOISTURE:
-            self.logger.info(f"Watering with flow rate 0.5.")
-            irrigation.set_flow_rate(0.05)
-            self.send_mqtt_msg(
-                TwinComponent.ROBOT,
-                {
-                    "action": "water",
-                },
-            )
-        elif moisture >= Plant.MAX_MOISTURE:
+        if moisture < plant.MIN_MOISTURE:
+            self.logger.info(f"Watering with flow rate {self.flow_rate}.")
+            self.irrigation.set_water_flow(plant.id, self.flow_rate)
+            self.perform_action("water")
+        elif moisture >= plant.MAX_MOISTURE and self.irrigation.get_water_flow()[plant.id] > 0.0:
             self.logger.info(f"Stopping watering as moisture is too high: {moisture}.")
-            irrigation.set_flow_rate(0.0)
+            self.irrigation.set_water_flow(plant.id, 0.0)
         else:
             return
+        self.reschedule_monitoring(plant.id)
+        self.notify_irrigation_controller(plant.id)
         if send_mqtt_msg:
             self.send_mqtt_msg(
-                TwinComponent.IRRIGATION, {"flow_rate": irrigation.read_data() * 100}
+                TwinComponent.IRRIGATION, self.irrigation.get_twin_data(plant.id)
             )
 
     def fertilize_plant(self, plant: Plant, send_mqtt_msg=True):
         """
         Moves to the plant's position and positions the arm to measure soil nutrients.
-        If the soil nutrient level is below the minimum threshold, it sets the irrigation flow rate to 0.5.
-        If the soil nutrient level is above the maximum threshold, it stops fertilization by setting the flow rate to 0.0.
-        Sends messages via MQTT with the current soil nutrient level and irrigation flow rate.
+        If the soil nutrient level is below the minimum threshold, it opens the plant's fertigation valve with the robot's flow rate.
+        If the soil nutrient level is above the maximum threshold, it stops fertilization by closing the plant's fertigation valve.
+        A valve that is already closed is left as it is, without rescheduling the plant's monitoring.
+        Sends messages via MQTT with the current soil nutrient level and irrigation flow rates.
         """
         self.move_to(plant.id, send_mqtt_msg=send_mqtt_msg)
         self.set_arm_position(plant, send_mqtt_msg=send_mqtt_msg)
@@ -345,33 +438,94 @@ class Robot:
                 TwinComponent.PLANT, {"soil_nutrients": nutrient * 100}, plant.id + 1
             )
 
-        if nutrient < Plant.MIN_NUTRIENTS:
-            self.logger.info(f"Fertilizing with flow rate 0.5.")
-            irrigation.set_flow_rate(0.05)
-            self.send_mqtt_msg(
-                TwinComponent.ROBOT,
-                {
-                    "action": "fertilize",
-                },
-            )
-        elif nutrient >= Plant.MAX_NUTRIENTS:
+        if nutrient < plant.MIN_NUTRIENTS:
+            self.logger.info(f"Fertilizing with flow rate {self.flow_rate}.")
+            self.irrigation.set_fertigation_flow(plant.id, self.flow_rate)
+            self.perform_action("fertilize")
+        elif nutrient >= plant.MAX_NUTRIENTS and self.irrigation.get_fertigation_flow()[plant.id] > 0.0:
             self.logger.info(
                 f"Stopping fertilization as nutrient level is too high: {nutrient}."
             )
-            irrigation.set_flow_rate(0.0)
+            self.irrigation.set_fertigation_flow(plant.id, 0.0)
         else:
             return
+        self.reschedule_monitoring(plant.id)
+        self.notify_irrigation_controller(plant.id)
         if send_mqtt_msg:
             self.send_mqtt_msg(
-                TwinComponent.IRRIGATION, {"flow_rate": irrigation.read_data() * 100}
+                TwinComponent.IRRIGATION, self.irrigation.get_twin_data(plant.id)
             )
 
+    def notify_irrigation_controller(self, plant_id):
+        """
+        Lets the irrigation controller re-forecast a plant after it was measured or changed by the robot.
+        """
+        if self.irrigation_controller is not None:
+            self.irrigation_controller.observe(plant_id)
+
+    def discard_plant_estimate(self, plant_id):
+        """
+        Discards the camera based estimate of a plant that was seeded or harvested, as it shows the old plant.
+        """
+        if self.image_pipeline is not None:
+            self.image_pipeline.discard(plant_id)
+
+    def publish_plant_aggregates(self):
+        """
+        Sends the greenhouse-wide plant aggregates and the irrigation totals to the plant container twin via MQTT,
+        at most once per aggregates interval. Used as cycle listener of the simulation.
+        """
+        now = clock.now()
+        if self._aggregates_published is not None and (now - self._aggregates_published).total_seconds() < self.aggregates_interval:
+            return
+        self._aggregates_published = now
+        self.send_mqtt_msg(
+            TwinComponent.PLANT,
+            self.simulation.aggregates.get_twin_data(self.irrigation.water_used, self.irrigation.fertigation_used),
+        )
+
+    def reschedule_monitoring(self, *plant_ids):
+        """
+        Lets the monitoring scheduler re-estimate the rates of plants that were seeded or harvested or whose valves
+        were switched, as their levels will change differently.
+        """
+        if self.monitoring_scheduler is not None:
+            for plant_id in plant_ids:
+                self.monitoring_scheduler.reset(plant_id)
+
+    def reset_anomaly_detection(self, plant_id):
+        """
+        Lets the anomaly detector forget the history of a plant that was seeded or harvested, as its levels jump.
+        """
+        if self.simulation.anomaly_detector is not None:
+            self.simulation.anomaly_detector.reset(plant_id)
+
+    def publish_anomalies(self):
+        """
+        Sends the alerts of the anomaly detector that were raised or cleared in the last simulation cycle via MQTT,
+        as the soil_moisture_anomaly and soil_nutrients_anomaly features of the plants (None when cleared).
+        Used as cycle listener of the simulation.
+        """
+        for plant_id, quantity, alert in self.simulation.anomalies:
+            if alert is not None:
+                self.logger.warning("Anomaly in %s of plant %d: %s", quantity, plant_id + 1, alert)
+            self.send_mqtt_msg(TwinComponent.PLANT, {f"{quantity}_anomaly": alert}, plant_id + 1)
+
+    def publish_valves(self, valves):
+        """
+        Sends the flow rates of the given valves via MQTT.
+        Used as callback for the valve switches of the irrigation controller.
+        """
+        self.reschedule_monitoring(*valves)
+        self.send_mqtt_msg(TwinComponent.IRRIGATION, self.irrigation.get_twin_data(*valves))
+
     def move_to(self, position, send_mqtt_msg=True):
         """
         Moves the robot to a specified position.
         Sends a message via MQTT with the new position.
         """
         self.logger.info(f"Moving robot to position: {position}")
+        self.busy_time += self.chassis.travel_time(self.chassis.position, position)
         self.chassis.position = position
         if send_mqtt_msg:
             self.send_mqtt_msg(
@@ -388,11 +542,11 @@ class Robot:
 
     def set_arm_position(self, plant, send_mqtt_msg=True):
         """
-        Sets the arm's position.
-        Sends a message via MQTT with the new arm position.
+        Moves the arm to the plant's position.
+        Sends a message via MQTT with the ID of the plant the arm is positioned at.
         """
         self.logger.info(f"Setting arm position to: {plant.id}")
-        self.arm.position = plant.id
+        self.busy_time += self.arm.position_at_plant(plant)
         if send_mqtt_msg:
             self.send_mqtt_msg(
                 TwinComponent.ROBOT,
@@ -401,19 +555,88 @@ class Robot:
                 },
             )
 
+    def perform_action(self, action: str):
+        """
+        Performs an action at the plant the arm is positioned at, taking the action's working time.
+        Sends a message via MQTT with the action.
+        """
+        self.busy_time += action_time(action)
+        self.actions[action] += 1
+        self.send_mqtt_msg(TwinComponent.ROBOT, {"action": action})
+
+    def estimate_action_time(self, action: str, plant_id: int, from_position: int = None) -> float:
+        """
+        Estimates how long the robot needs to drive to a plant, reach it with the arm and perform an action there.
+
+        Parameters:
+            action (str): The action, e.g. "water" or "harvest".
+            plant_id (int): The ID of the plant.
+            from_position (int, optional): The start position of the chassis, the current position if not given.
+        Returns:
+            float: The estimated duration in seconds.
+        """
+        from_position = self.chassis.position if from_position is None else from_position
+        return (
+            self.chassis.travel_time(from_position, plant_id)
+            + self.arm.expected_reach_time(self.plants[plant_id])
+            + action_time(action)
+        )
+
+    def estimate_route_time(self, tasks, from_position: int = None) -> float:
+        """
+        Estimates how long the robot needs to perform a sequence of actions.
+
+        Parameters:
+            tasks (Iterable[tuple[str, int]]): The (action, plant_id) pairs in the order they are performed.
+            from_position (int, optional): The start position of the chassis, the current position if not given.
+        Returns:
+            float: The estimated duration in seconds.
+        """
+        position = self.chassis.position if from_position is None else from_position
+        total = 0.0
+        for action, plant_id in tasks:
+            total += self.estimate_action_time(action, plant_id, position)
+            position = plant_id
+        return total
+
     def send_mqtt_msg(self, twin_component: TwinComponent, msg, plant_id=None):
         """
-        Adds a message to the measurement queue to be sent via MQTT.
+        Adds a message to the measurement queue to be sent via MQTT
+        and publishes it to the live message stream, if one is set.
 
         Parameters:
             twin_component (TwinComponent): The component of the twin to which the message belongs.
             msg (dict): The message data to be sent.
             plant_id (int, optional): The ID of the plant if the message is related to a specific plant.
         """
-        self.logger.info(f"Sending MQTT message: {msg}")
-        self.measurement_queue.put(
-            {"component": twin_component, "plant_id": plant_id, "data": msg}
-        )
+        self.logger.info("Sending MQTT message: %s", msg)  # formatted only if logged
+        message = {"component": twin_component, "plant_id": plant_id, "data": msg}
+        if self.namespace is not None:
+            message["namespace"] = self.namespace
+        trace = tracing.current_context()
+        if trace is not None:
+            message["trace"] = trace  # links the publishing of the message to the stage that sent it
+        self.measurement_queue.put(message)
+        if self.message_stream is not None:
+            self.message_stream.publish(message)
+        self.notify_state_changed()
+
+    def notify_state_changed(self):
+        if self.on_state_changed is not None:
+            self.on_state_changed()
+
+    def step(self):
+        """
+        Performs the next queued command, or the action of the robot's state if no command can be started.
+        """
+        try:
+            action = self.action_queue.get(block=False)
+        except queue.Empty:  # nothing queued, or only rate limited commands
+            with tracing.span("robot.handle_state", state=self.state.value):
+                self.handle_state()
+        else:
+            action(self)
+        self.notify_state_changed()
 
     def run(self):
         """
@@ -427,12 +650,7 @@ class Robot:
             )
 
         while True:
-            if not self.action_queue.empty():
-                action = self.action_queue.get()
-                action(self)
-            else:
-                self.handle_state()
+            self.step()
 
-            time.sleep(
-                self.cycle_time
-            )  # Sleep for a while to simulate time between actions
+            # Wait for a while to simulate time between actions, operator commands end the wait early
+            self.action_queue.wait(self.cycle_time)
@@ -0,0 +1,337 @@
+"""
+This module provides a rule engine deciding which plant actions the robot should perform, configured without code.
+
+A rule is a condition on the state of a plant and the action the robot performs at the plants that fulfil it,
+optionally with the priority lane of the commands (0 emergency, 1 manual, 2 automated, 3 monitoring; default 2):
+
+    soil_moisture < 0.3 and health == sick -> water, priority 1
+    ripeness == ripe -> harvest
+    not planted -> seed, priority 3
+    soil_nutrients < min_nutrients or (age_days > 100 and soil_nutrients < 0.5) -> fertilize
+
+Conditions compare a column (see COLUMNS) with a number, a word (e.g. sick, ripe, true) or another column of the same
+type, and are combined with and, or, not and parentheses. The actions are the plant actions of the command queue (water, fertilize,
+harvest, seed, monitor), performed by the robot as if they were requested over HTTP.
+
+Each evaluation reads the columns used by the rules once for all plants and evaluates each comparison over the whole
+column at once. The result of a comparison is a mask holding one byte per plant in a Python integer, so combining
+conditions with and, or and not are single integer operations regardless of the number of plants.
+"""
+
+from datetime import datetime
+from itertools import repeat
+import operator
+import queue
+import re
+from commands import PLANT_ACTIONS, Priority
+from util import clock
+
+# plant columns available to the rules, by name: the type of the values (float, bool, or the tuple of words a word
+# column holds) and the function reading the column of all plants (plants, irrigation, now)
+COLUMNS = {
+    "soil_moisture": (float, lambda plants, irrigation, now: list(map(operator.attrgetter("moisture_level"), plants))),
+    "soil_nutrients": (float, lambda plants, irrigation, now: list(map(operator.attrgetter("nutrient_level"), plants))),
+    "health": (("healthy", "sick"), lambda plants, irrigation, now: [
+        "healthy" if plant.healthy else "sick" for plant in plants
+    ]),
+    "ripeness": (("ripe", "not_ripe"), lambda plants, irrigation, now: [
+        "ripe" if plant.is_harvestable(now) else "not_ripe" for plant in plants
+    ]),
+    "planted": (bool, lambda plants, irrigation, now: list(map(operator.attrgetter("has_plant"), plants))),
+    "age_days": (float, lambda plants, irrigation, now: [
+        (now - plant.datetime_planted).total_seconds() / 86400
+        if plant.has_plant and plant.datetime_planted is not None
+        else -1.0
+        for plant in plants
+    ]),
+    "min_moisture": (float, lambda plants, irrigation, now: list(map(operator.attrgetter("MIN_MOISTURE"), plants))),
+    "min_nutrients": (float, lambda plants, irrigation, now: list(map(operator.attrgetter("MIN_NUTRIENTS"), plants))),
+    "max_moisture": (float, lambda plants, irrigation, now: list(map(operator.attrgetter("MAX_MOISTURE"), plants))),
+    "max_nutrients": (float, lambda plants, irrigation, now: list(map(operator.attrgetter("MAX_NUTRIENTS"), plants))),
+    "water_flow": (float, lambda plants, irrigation, now: irrigation.get_water_flow()),
+    "fertigation_flow": (float, lambda plants, irrigation, now: irrigation.get_fertigation_flow()),
+}
+
+COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# words standing for values in conditions, other words are strings (e.g. sick) or column names
+CONSTANTS = {"true": True, "false": False}
+
+TOKEN = re.compile(r"\s*(?:(<=|>=|==|!=|<|>|\(|\))|(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)|([A-Za-z_][A-Za-z0-9_]*))")
+RULE = re.compile(r"^(?P<condition>.+?)\s*->\s*(?P<action>\w+)\s*(?:,\s*priority\s+(?P<priority>\d+))?\s*$")
+
+
+class Rule:
+    """
+    A class representing a compiled rule.
+
+    Attributes:
+        source (str): The rule as written.
+        action (str): The plant action performed at the plants fulfilling the condition.
+        priority (Priority): The lane of the commands.
+        columns (set[str]): The columns the condition reads.
+    """
+
+    def __init__(self, source: str):
+        """
+        Compiles a rule.
+
+        Raises:
+            ValueError: If the rule is not valid.
+        """
+        self.source = source
+        match = RULE.match(source.strip())
+        if match is None:
+            raise ValueError(f"Invalid rule, expected '<condition> -> <action>[, priority <n>]': {source}")
+        self.action = match.group("action")
+        if self.action not in PLANT_ACTIONS or self.action == "move":
+            raise ValueError(f"Unknown action {self.action} in rule: {source}")
+        priority = int(match.group("priority") or Priority.AUTOMATED.value)
+        if priority not in [p.value for p in Priority]:
+            raise ValueError(f"Invalid priority {priority} in rule: {source}")
+        self.priority = Priority(priority)
+        self.columns = set()
+        self._tokens = tokenize(match.group("condition"), source)
+        self._position = 0
+        self.predicate = self._parse_or()
+        if self._position != len(self._tokens):
+            raise ValueError(f"Unexpected '{self._tokens[self._position]}' in rule: {source}")
+        del self._tokens
+
+    def evaluate(self, columns: dict, ones: int) -> int:
+        """
+        Evaluates the condition for all plants.
+
+        Parameters:
+            columns (dict[str, list]): The columns used by the rule, one value per plant.
+            ones (int): The mask of all plants.
+        Returns:
+            int: The mask of the plants fulfilling the condition, one byte (0 or 1) per plant.
+        """
+        return self.predicate(columns, ones)
+
+    # recursive descent parser: or -> and ("or" and)*, and -> not ("and" not)*, not -> "not" not | atom,
+    # atom -> "(" or ")" | operand comparison operand
+
+    def _peek(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of the condition in rule: {self.source}")
+        self._position += 1
+        return token
+
+    def _parse_or(self):
+        predicates = [self._parse_and()]
+        while self._peek() == "or":
+            self._next()
+            predicates.append(self._parse_and())
+        if len(predicates) == 1:
+            return predicates[0]
+
+        def predicate(columns, ones):
+            mask = 0
+            for p in predicates:
+                mask |= p(columns, ones)
+            return mask
+
+        return predicate
+
+    def _parse_and(self):
+        predicates = [self._parse_not()]
+        while self._peek() == "and":
+            self._next()
+            predicates.append(self._parse_not())
+        if len(predicates) == 1:
+            return predicates[0]
+
+        def predicate(columns, ones):
+            mask = ones
+            for p in predicates:
+                mask &= p(columns, ones)
+                if not mask:
+                    break
+            return mask
+
+        return predicate
+
+    def _parse_not(self):
+        if self._peek() == "not":
+            self._next()
+            inner = self._parse_not()
+            return lambda columns, ones: inner(columns, ones) ^ ones
+        return self._parse_atom()
+
+    def _parse_atom(self):
+        if self._peek() == "(":
+            self._next()
+            predicate = self._parse_or()
+            if self._next() != ")":
+                raise ValueError(f"Missing ')' in rule: {self.source}")
+            return predicate
+        left = self._parse_operand()
+        if self._peek() not in COMPARISONS:
+            if isinstance(left, Column) and COLUMNS[left][0] is bool:  # a column alone, e.g. "planted"
+                return comparison(left, operator.eq, True)
+            raise ValueError(f"Expected a comparison after {left!r} in rule: {self.source}")
+        symbol = self._next()
+        right = self._parse_operand()
+        if not isinstance(left, Column) and not isinstance(right, Column):
+            raise ValueError(f"A comparison needs a column in rule: {self.source}")
+        self._check_types(left, symbol, right)
+        return comparison(left, COMPARISONS[symbol], right)
+
+    def _check_types(self, left, symbol: str, right):
+        """
+        Rejects comparisons that could only fail while the rule is evaluated or never hold, e.g. a number with a word.
+        """
+        types = [COLUMNS[operand][0] if isinstance(operand, Column) else type(operand) for operand in (left, right)]
+        kinds = ["word" if isinstance(t, tuple) or t is str else t.__name__ for t in types]
+        if kinds[0] != kinds[1] or (isinstance(left, Column) and isinstance(right, Column) and types[0] != types[1]):
+            raise ValueError(f"Cannot compare {left} ({kinds[0]}) with {right} ({kinds[1]}) in rule: {self.source}")
+        if symbol not in ("==", "!=") and kinds[0] != "float":
+            raise ValueError(f"Only numbers can be compared with {symbol}, not {left} and {right} in rule: {self.source}")
+        for column_type, operand in ((types[0], right), (types[1], left)):
+            if isinstance(column_type, tuple) and not isinstance(operand, Column) and operand not in column_type:
+                raise ValueError(
+                    f"Unknown value {operand}, expected one of {', '.join(column_type)} in rule: {self.source}"
+                )
+
+    def _parse_operand(self):
+        token = self._next()
+        if isinstance(token, float):
+            return token
+        if token in COLUMNS:
+            self.columns.add(token)
+            return Column(token)
+        if token in ("and", "or", "not", "(", ")") or token in COMPARISONS:
+            raise ValueError(f"Unexpected '{token}' in rule: {self.source}")
+        return CONSTANTS.get(token, token)
+
+    def __repr__(self):
+        return f"Rule({self.source!r})"
+
+
+class Column(str):
+    """
+    The name of a column in a condition, as opposed to a string value.
+    """
+
+
+def tokenize(condition: str, source: str) -> list:
+    tokens = []
+    position = 0
+    condition = condition.rstrip()
+    while position < len(condition):
+        match = TOKEN.match(condition, position)
+        if match is None:
+            raise ValueError(f"Invalid character '{condition[position:].strip()[:1]}' in rule: {source}")
+        symbol, number, word = match.groups()
+        tokens.append(symbol or (float(number) if number is not None else word))
+        position = match.end()
+    return tokens
+
+
+def comparison(left, compare, right):
+    """
+    Returns a predicate comparing a column with a value or another column for all plants at once.
+    """
+
+    def predicate(columns, ones):
+        left_values = columns[left] if isinstance(left, Column) else repeat(left)
+        right_values = columns[right] if isinstance(right, Column) else repeat(right)
+        # map runs the comparisons in C, the booleans become one byte per plant
+        return int.from_bytes(bytes(map(compare, left_values, right_values)), "little")
+
+    return predicate
+
+
+def mask_to_ids(mask: int, count: int):
+    """
+    Yields the indices of the set bytes of a mask, in ascending order.
+    """
+    data = mask.to_bytes(count, "little")
+    position = data.find(1)
+    while position != -1:
+        yield position
+        position = data.find(1, position + 1)
+
+
+class RuleEngine:
+    """
+    A class evaluating the rules for all plants and queueing the resulting commands for the robot.
+
+    Attributes:
+        rules (list[Rule]): The compiled rules, in the order they were given.
+        submitted (int): The number of queued commands.
+        dropped (int): The number of commands that were not queued because their lane was full.
+    """
+
+    def __init__(self, rules: list):
+        """
+        Parameters:
+            rules (list[str]): The rules.
+        Raises:
+            ValueError: If a rule is not valid.
+        """
+        self.rules = [Rule(rule) for rule in rules]
+        self.columns = set().union(*(rule.columns for rule in self.rules))
+        self.submitted = 0
+        self.dropped = 0
+
+    def evaluate(self, plants, irrigation_system, now: datetime = None) -> list:
+        """
+        Evaluates the rules for all plants.
+
+        Returns:
+            list[tuple[str, int, Priority]]: The work items (action, 0-based plant ID, priority), by rule and plant ID.
+        """
+        now = clock.now() if now is None else now
+        count = len(plants)
+        columns = {name: COLUMNS[name][1](plants, irrigation_system, now) for name in self.columns}
+        ones = int.from_bytes(b"\x01" * count, "little")
+        items = []
+        for rule in self.rules:
+            mask = rule.evaluate(columns, ones)
+            items.extend((rule.action, plant_id, rule.priority) for plant_id in mask_to_ids(mask, count))
+        return items
+
+    def submit(self, items: list, action_queue):
+        """
+        Queues the work items as commands. Identical commands that are still waiting are merged,
+        so a condition that holds for several evaluations queues one command until the robot performed it.
+        """
+        for action, plant_id, priority in items:
+            try:
+                command, queued = action_queue.submit(action, plant_id, priority=priority)
+            except queue.Full:
+                self.dropped += 1
+                continue
+            self.submitted += queued
+
+    def run(self, plants, irrigation_system, action_queue):
+        """
+        Evaluates the rules and queues the resulting commands. Used as cycle listener of the simulation.
+        """
+        self.submit(self.evaluate(plants, irrigation_system), action_queue)
+
+
+def load_rules(rules: list = None, path: str = None) -> list:
+    """
+    Returns the given rules followed by the rules of a text file with one rule per line,
+    empty lines and lines starting with # are skipped.
+    """
+    rules = list(rules or [])
+    if path is not None:
+        with open(path) as f:
+            rules.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+    return rules
@@ -0,0 +1,270 @@
+"""
+Runs seeded, headless season simulations of the greenhouse with varying settings, to choose e.g. the cycle times,
+the moisture and nutrient thresholds of the plants and the valve flow rate.
+
+Each run simulates the plants and the robot (without MQTT, HTTP or image analysis) on a simulated clock for a whole
+season, as fast as possible. The runs are spread across a process pool, over a grid of settings or randomly sampled
+settings, and several seeds per setting. The results (yield, water and fertigation use, share of sick plants and
+robot utilisation) are written as one table row per run and summarized per setting.
+
+Settings are given as configuration paths (see config.DEFAULT_CONFIG) with a list of values, or a range "low:high"
+for random search, e.g.:
+    python scenario_runner.py --param simulation.cycle_time=300,600,1200 --param plant.min_moisture=0.2,0.3,0.4 --seeds 5
+    python scenario_runner.py --search random --samples 200 --param plant.min_moisture=0.1:0.5 --param irrigation.flow_rate=0.02:0.1
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+import csv
+from datetime import datetime
+import itertools
+import os
+import random
+import time
+from app import Application
+from config import DEFAULT_CONFIG, merge
+from util import clock
+
+# simulated start of every season, so runs with the same seed are identical
+SEASON_START = datetime(2025, 3, 1)
+
+# settings of a headless run
+HEADLESS = {"mqtt": {"enabled": False}, "http": {"enabled": False}, "vision": {"workers": 0}}
+
+METRICS = ("harvested", "water_used", "fertigation_used", "sick_fraction", "final_sick_fraction", "utilisation")
+
+
+class DiscardQueue:
+    """
+    Stands in for the measurement queue of a headless robot, the messages are dropped.
+    """
+
+    def put(self, item, block=True, timeout=None):
+        pass
+
+
+def to_overrides(params: dict) -> dict:
+    """
+    Converts settings by configuration path ({"plant.min_moisture": 0.2}) into nested configuration overrides.
+    """
+    overrides = {}
+    for path, value in params.items():
+        *sections, key = path.split(".")
+        target = overrides
+        for section in sections:
+            target = target.setdefault(section, {})
+        target[key] = value
+    return overrides
+
+
+def run_scenario(params: dict, seed: int, season_days: float = 112) -> dict:
+    """
+    Simulates a season with the given settings.
+
+    Parameters:
+        params (dict): The settings by configuration path, applied to the defaults.
+        seed (int): The seed of the random number streams.
+        season_days (float): The simulated length of the season in days.
+    Returns:
+        dict: The settings, the seed and the metrics of the run.
+    """
+    config = merge(merge(DEFAULT_CONFIG, to_overrides(params)), dict(HEADLESS, simulation={"seed": seed}))
+    season = season_days * 24 * 3600
+    simulation_cycle_time = config["simulation"]["cycle_time"]
+    robot_cycle_time = config["robot"]["cycle_time"]
+
+    simulated_clock = clock.SimulatedClock(SEASON_START)
+    clock.set_clock(simulated_clock)
+    started = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            app = Application(config)
+            app.measurement_queue = DiscardQueue()
+            app.message_stream = None
+            robot = app.robot
+            simulation = app.simulation
+            plants = app.plants
+
+            sick_shares = []
+
+            def record_sick_share():
+                planted = sick = 0
+                for plant in plants:
+                    if plant.has_plant:
+                        planted += 1
+                        sick += not plant.healthy
+                sick_shares.append(sick / planted if planted else 0.0)
+
+            simulation.add_cycle_listener(record_sick_share)
+
+            # the simulation cycles and robot steps in the order of their simulated times
+            next_cycle = next_step = 0.0
+            cycles = steps = 0
+            while min(next_cycle, next_step) < season:
+                if next_cycle <= next_step:
+                    simulated_clock.advance_to(next_cycle)
+                    simulation.run_cycle()
+                    next_cycle += simulation_cycle_time
+                    cycles += 1
+                else:
+                    simulated_clock.advance_to(next_step)
+                    robot.step()
+                    next_step += robot_cycle_time
+                    steps += 1
+    finally:
+        clock.set_clock()
+
+    irrigation_system = app.irrigation_system
+    return dict(
+        params,
+        seed=seed,
+        harvested=robot.actions["harvest"],
+        water_used=irrigation_system.water_used,
+        fertigation_used=irrigation_system.fertigation_used,
+        sick_fraction=sum(sick_shares) / len(sick_shares) if sick_shares else 0.0,
+        final_sick_fraction=sick_shares[-1] if sick_shares else 0.0,
+        utilisation=robot.busy_time / season,
+        cycles=cycles,
+        robot_steps=steps,
+        runtime=time.perf_counter() - started,
+    )
+
+
+def _run_task(task):
+    return run_scenario(*task)
+
+
+def parse_value(text: str):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_params(specs: list) -> dict:
+    """
+    Parses settings like "plant.min_moisture=0.2,0.3" or "plant.min_moisture=0.1:0.5" into lists of values
+    or (low, high) ranges, by configuration path.
+
+    Raises:
+        KeyError: If a path is not a known setting.
+    """
+    params = {}
+    for spec in specs:
+        path, _, values = spec.partition("=")
+        merge(DEFAULT_CONFIG, to_overrides({path: None}))  # raises KeyError for unknown settings
+        if ":" in values:
+            low, high = values.split(":")
+            params[path] = (parse_value(low), parse_value(high))
+        else:
+            params[path] = [parse_value(value) for value in values.split(",")]
+    return params
+
+
+def grid(params: dict) -> list:
+    """
+    Returns all combinations of the listed values of the settings.
+    """
+    for path, values in params.items():
+        if isinstance(values, tuple):
+            raise ValueError(f"Ranges are only supported by random search: {path}")
+    return [dict(zip(params, values)) for values in itertools.product(*params.values())]
+
+
+def random_samples(params: dict, samples: int, rng: random.Random) -> list:
+    """
+    Returns randomly sampled settings: uniform within ranges (integers if both ends are integers),
+    or one of the listed values.
+    """
+    settings = []
+    for _ in range(samples):
+        setting = {}
+        for path, values in params.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    setting[path] = rng.randint(low, high)
+                else:
+                    setting[path] = rng.uniform(low, high)
+            else:
+                setting[path] = rng.choice(values)
+        settings.append(setting)
+    return settings
+
+
+def run_scenarios(settings: list, seeds: int, season_days: float, workers: int = None):
+    """
+    Runs every setting with each seed across a process pool.
+
+    Yields:
+        dict: The result of each run, in the order of the settings and seeds.
+    """
+    tasks = [(setting, seed, season_days) for setting in settings for seed in range(seeds)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 8))
+        yield from executor.map(_run_task, tasks, chunksize=chunksize)
+
+
+def summarize(results: list, params: list) -> list:
+    """
+    Averages the metrics of the runs of each setting.
+
+    Returns:
+        list[dict]: The settings with the mean of each metric and the number of runs, by descending yield.
+    """
+    groups = {}
+    for result in results:
+        groups.setdefault(tuple(result[path] for path in params), []).append(result)
+    summary = []
+    for key, runs in groups.items():
+        row = dict(zip(params, key), runs=len(runs))
+        for metric in METRICS:
+            row[metric] = sum(run[metric] for run in runs) / len(runs)
+        summary.append(row)
+    summary.sort(key=lambda row: row["harvested"], reverse=True)
+    return summary
+
+
+def print_summary(summary: list, params: list, limit: int = 20):
+    columns = list(params) + ["runs"] + list(METRICS)
+    print("  ".join(f"{column:>20}" for column in columns))
+    for row in summary[:limit]:
+        print("  ".join(f"{row[column]:>20.4g}" if isinstance(row[column], float) else f"{row[column]!s:>20}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless season simulations with varying settings.")
+    parser.add_argument("--param", action="append", default=[], help="Setting path and values, e.g. plant.min_moisture=0.2,0.3 or plant.min_moisture=0.1:0.5 (repeatable)")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid", help="Run all combinations of the values or random samples (default: grid)")
+    parser.add_argument("--samples", type=int, default=100, help="Number of random settings (default: 100)")
+    parser.add_argument("--search_seed", type=int, default=0, help="Seed of the random search (default: 0)")
+    parser.add_argument("--seeds", type=int, default=3, help="Number of seeded runs per setting (default: 3)")
+    parser.add_argument("--season_days", type=float, default=112, help="Simulated length of a season in days (default: 112)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--output", type=str, default="scenario_results.csv", help="CSV file the result of every run is written to (default: scenario_results.csv)")
+    args = parser.parse_args()
+
+    params = parse_params(args.param)
+    if args.search == "grid":
+        settings = grid(params)
+    else:
+        settings = random_samples(params, args.samples, random.Random(args.search_seed))
+    print(f"Running {len(settings)} settings with {args.seeds} seeds each")
+
+    started = time.perf_counter()
+    results = []
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(params) + ["seed", *METRICS, "cycles", "robot_steps", "runtime"])
+        writer.writeheader()
+        for result in run_scenarios(settings, args.seeds, args.season_days, args.workers):
+            writer.writerow(result)
+            results.append(result)
+    print(f"Finished {len(results)} runs in {time.perf_counter() - started:.1f} s, results written to {args.output}")
+    print_summary(summarize(results, list(params)), list(params))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,181 @@
 from .sensor_interface import SensorInterface
 from util.overrides_annotation import overrides
+from util import clock
+import os
+import random
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it only PPM images can be loaded
+    Image = None
+
+
+# Age in days at which a plant is fully grown and ripe
+RIPE_AGE_DAYS = 15 * 7
+# Share of the frame showing fruit when the plant is fully grown, the fruit grows from 80% of the ripe age on
+FRUIT_SHARE = 0.15
+
+# Base colours of the synthetic frames (RGB)
+SOIL_COLOUR = (90, 60, 40)
+LEAF_COLOUR = (40, 150, 40)
+SICK_LEAF_COLOUR = (185, 165, 50)
+FRUIT_COLOUR = (200, 30, 30)
+UNRIPE_FRUIT_COLOUR = (80, 160, 50)
+
+
+class Frame:
+    """
+    A class representing an RGB image captured by the camera.
+
+    Attributes:
+        plant_id (int): The ID of the plant the frame shows.
+        width (int): The width of the frame in pixels.
+        height (int): The height of the frame in pixels.
+        pixels (bytes): The pixel data, row by row, three bytes (R, G, B) per pixel.
+    """
+
+    def __init__(self, plant_id: int, width: int, height: int, pixels: bytes):
+        self.plant_id = plant_id
+        self.width = width
+        self.height = height
+        self.pixels = pixels
 
 
 class Camera(SensorInterface):
     """
     This class represents a camera sensor in the digital twin system.
+    Frames are either loaded from an image directory (files named plant_<id>.ppm, or any format Pillow can read)
+    or synthesized from the simulated state of the plant.
+
+    Attributes:
+        image_directory (str): Optional directory with images of the plants.
+        frame_size (int): The width and height of the frames in pixels.
+        last_frame (Frame): The most recently captured frame.
     """
 
+    def __init__(self, image_directory: str = None, frame_size: int = 32):
+        self.image_directory = image_directory
+        self.frame_size = frame_size
+        self.last_frame = None
+        self._captures = 0
+
     @overrides(SensorInterface)
     def read_data(self):
         """
         Reads data from the camera sensor.
         Returns:
-            str: A placeholder string representing the image data captured by the camera.
+            Frame: The most recently captured frame, or None if nothing was captured yet.
+        """
+        return self.last_frame
+
+    def describe(self, plant) -> tuple:
+        """
+        Returns everything needed to capture a frame of the plant later, e.g. in a worker process.
+        Describing a plant is cheap, so the robot loop is not blocked by capturing and analysing frames.
         """
-        return "image_data_placeholder"
+        self._captures += 1
+        age_days = (
+            (clock.now() - plant.datetime_planted).days
+            if plant.has_plant and plant.datetime_planted is not None
+            else 0
+        )
+        return (
+            plant.id,
+            plant.has_plant,
+            plant.healthy,
+            age_days,
+            self._captures,
+            self.frame_size,
+            self.image_directory,
+        )
+
+    def capture(self, plant) -> Frame:
+        """
+        Captures a frame of the plant immediately.
+        """
+        self.last_frame = capture_frame(self.describe(plant))
+        return self.last_frame
+
+
+def capture_frame(description: tuple) -> Frame:
+    """
+    Captures the frame described by Camera.describe(): loads the plant's image if there is one, otherwise synthesizes it.
+    """
+    plant_id, has_plant, healthy, age_days, capture_number, frame_size, image_directory = description
+    if image_directory is not None:
+        frame = load_frame(image_directory, plant_id, frame_size)
+        if frame is not None:
+            return frame
+    return render_frame(plant_id, has_plant, healthy, age_days, capture_number, frame_size)
+
+
+def render_frame(plant_id: int, has_plant: bool, healthy: bool, age_days: int, seed: int, frame_size: int) -> Frame:
+    """
+    Synthesizes a frame of a plant from its state.
+    The plant covers more of the soil the older it is, sick plants have yellowed leaves
+    and plants close to ripeness carry green fruit, which turns red at the ripe age. All colours have some random noise.
+    """
+    rng = random.Random(plant_id * 1_000_003 + seed)
+    growth = min(age_days / RIPE_AGE_DAYS, 1.0) if has_plant else 0.0
+    leaf_share = 0.15 + 0.55 * growth if has_plant else 0.0
+    fruit_share = FRUIT_SHARE * max(growth - 0.8, 0.0) / 0.2
+    fruit_colour = FRUIT_COLOUR if has_plant and age_days >= RIPE_AGE_DAYS else UNRIPE_FRUIT_COLOUR
+    sick_share = 0.0 if healthy else 0.6
+
+    pixels = bytearray()
+    for _ in range(frame_size * frame_size):
+        x = rng.random()
+        if x < fruit_share:
+            colour = fruit_colour
+        elif x < fruit_share + leaf_share:
+            colour = SICK_LEAF_COLOUR if rng.random() < sick_share else LEAF_COLOUR
+        else:
+            colour = SOIL_COLOUR
+        pixels.extend(min(max(c + rng.randint(-15, 15), 0), 255) for c in colour)
+    return Frame(plant_id, frame_size, frame_size, bytes(pixels))
+
+
+def load_frame(image_directory: str, plant_id: int, frame_size: int):
+    """
+    Loads the image of a plant (1-based file name, as in the twin) from the image directory.
+    Returns None if there is no image of the plant.
+    """
+    base = os.path.join(image_directory, f"plant_{plant_id + 1}")
+    if os.path.exists(base + ".ppm"):
+        return read_ppm(base + ".ppm", plant_id)
+    if Image is not None:
+        for extension in (".png", ".jpg", ".jpeg"):
+            if os.path.exists(base + extension):
+                with Image.open(base + extension) as image:
+                    image = image.convert("RGB").resize((frame_size, frame_size))
+                    return Frame(plant_id, frame_size, frame_size, image.tobytes())
+    return None
+
+
+def read_ppm(path: str, plant_id: int) -> Frame:
+    """
+    Reads a binary PPM (P6) image with 8 bits per channel.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # the header consists of four whitespace separated tokens, comments start with '#'
+    tokens = []
+    position = 0
+    while len(tokens) < 4:
+        while data[position : position + 1].isspace():
+            position += 1
+        if data[position : position + 1] == b"#":
+            position = data.index(b"\n", position)
+            continue
+        end = position
+        while not data[end : end + 1].isspace():
+            end += 1
+        tokens.append(data[position:end])
+        position = end
+    position += 1  # single whitespace before the pixel data
+
+    magic, width, height, max_value = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    if magic != b"P6" or max_value > 255:
+        raise ValueError(f"Unsupported image format: {path}")
+    return Frame(plant_id, width, height, data[position : position + width * height * 3])
@@ -8,11 +8,29 @@ class HumiditySensor(SensorInterface):
     This class represents a humidity sensor in the digital twin system.
     """
 
+    def __init__(self, simulation_instance: simulation.Simulation = None):
+        """
+        Parameters:
+            simulation_instance (Simulation): The simulation of the greenhouse the sensor is in (default: the default simulation).
+        """
+        self.simulation = simulation_instance if simulation_instance is not None else simulation.get_simulation()
+
     @overrides(SensorInterface)
     def read_data(self):
         """
-        Reads data from the humidity sensor.
+        Reads the greenhouse-wide average from the humidity sensors.
+        Returns:
+            float: The mean humidity level over all zones of the simulation environment, in percent.
+        """
+        return self.simulation.get_environment_field().aggregates["humidity_mean"]
+
+    @overrides(SensorInterface)
+    def read_data_at_plant(self, id):
+        """
+        Reads data from the humidity sensor at a specific plant position.
+        Parameters:
+            id (int): The ID (position) of the plant where the humidity level is to be read.
         Returns:
-            float: The current humidity level in the simulation environment.
+            float: The humidity level in the zone of the specified position, in percent.
         """
-        return simulation.get_environment().humidity
+        return self.simulation.get_environment_field().sample("humidity", id)
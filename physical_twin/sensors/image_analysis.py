@@ -0,0 +1,218 @@
+"""
+This module analyses the camera frames of the plants to estimate their health and ripeness.
+
+Frames are described by the robot, then captured and analysed in batches by a worker pool,
+so neither capturing nor inference blocks the robot loop.
+The classifier only uses cheap colour and texture features of the whole frame.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import logging
+import queue
+import threading
+from .camera import FRUIT_SHARE, Camera, Frame, capture_frame
+
+# a plant is considered sick if at least this share of its leaf pixels is yellowed
+SICK_LEAF_SHARE = 0.3
+# a plant is considered ripe if at least this share of the frame shows red fruit: half the fruit of a grown plant,
+# which is green until the plant is ripe
+RIPE_FRUIT_SHARE = FRUIT_SHARE / 2
+# a pot is considered empty if less than this share of the frame shows leaves
+EMPTY_LEAF_SHARE = 0.05
+
+
+class PlantEstimate:
+    """
+    A class representing the result of the image analysis of a plant.
+
+    Attributes:
+        plant_id (int): The ID of the plant.
+        health (str): "healthy" or "sick".
+        ripeness (str): "ripe" or "not ripe".
+        has_plant (bool): Whether a plant is visible in the pot.
+        features (dict): The features the estimate is based on.
+    """
+
+    def __init__(self, plant_id: int, health: str, ripeness: str, has_plant: bool, features: dict):
+        self.plant_id = plant_id
+        self.health = health
+        self.ripeness = ripeness
+        self.has_plant = has_plant
+        self.features = features
+
+
+def extract_features(frame: Frame) -> dict:
+    """
+    Extracts the colour and texture features of a frame.
+
+    Returns:
+        dict: The shares of green leaf, yellowed leaf and red fruit pixels,
+        and the texture (mean absolute green difference of horizontally neighbouring pixels).
+    """
+    pixels = frame.pixels
+    red, green, blue = pixels[0::3], pixels[1::3], pixels[2::3]
+    count = len(green)
+
+    leaf = yellow = fruit = 0
+    for r, g, b in zip(red, green, blue):
+        if g > r + 40 and g > b + 40:
+            leaf += 1
+        elif r > 120 and g > 110 and b < 90 and abs(r - g) < 50:
+            yellow += 1
+        elif r > g + 80 and r > b + 80:
+            fruit += 1
+
+    # neighbouring pixels within a row, pairs spanning two rows are rare enough to be ignored
+    texture = sum(map(abs, map(int.__sub__, green[1:], green[:-1]))) / max(count - 1, 1)
+
+    return {
+        "leaf_share": leaf / count,
+        "yellow_share": yellow / count,
+        "fruit_share": fruit / count,
+        "texture": texture,
+    }
+
+
+def classify(plant_id: int, features: dict) -> PlantEstimate:
+    """
+    Estimates the health and ripeness of a plant from the features of its frame.
+    """
+    foliage = features["leaf_share"] + features["yellow_share"]
+    has_plant = foliage + features["fruit_share"] >= EMPTY_LEAF_SHARE
+    sick = has_plant and foliage > 0 and features["yellow_share"] / foliage >= SICK_LEAF_SHARE
+    ripe = has_plant and features["fruit_share"] >= RIPE_FRUIT_SHARE
+    return PlantEstimate(
+        plant_id,
+        "sick" if sick else "healthy",
+        "ripe" if ripe else "not ripe",
+        has_plant,
+        features,
+    )
+
+
+def analyze_batch(descriptions: list) -> list[PlantEstimate]:
+    """
+    Captures and analyses a batch of frames described by Camera.describe().
+    Runs in the worker processes, so it must only use picklable arguments and results.
+    """
+    estimates = []
+    for description in descriptions:
+        frame = capture_frame(description)
+        estimates.append(classify(frame.plant_id, extract_features(frame)))
+    return estimates
+
+
+class ImageAnalysisPipeline:
+    """
+    A class that captures and analyses frames of the plants in the background.
+
+    Plants submitted by the robot are collected into batches by a dispatcher thread. Each batch is captured
+    and analysed by a pool of worker processes (or by the dispatcher thread itself if no workers are configured),
+    and the latest estimate of each plant is kept for the robot to use. Each frame is tagged with the generation
+    of its plant, which is advanced when the estimate is discarded, so batches still in flight cannot bring back
+    an estimate of the previous plant.
+
+    Attributes:
+        camera (Camera): The camera used to describe the frames.
+        batch_size (int): The maximum number of frames analysed in one batch.
+        on_estimate (callable): Optional function called with each new PlantEstimate.
+    """
+
+    def __init__(self, camera: Camera, workers: int = 1, batch_size: int = 32, max_pending: int = 10000, on_estimate=None, executor=None):
+        """
+        Parameters:
+            camera (Camera): The camera used to describe the frames.
+            workers (int): The number of worker processes, 0 analyses in the dispatcher thread.
+            batch_size (int): The maximum number of frames analysed in one batch.
+            max_pending (int): The maximum number of waiting frames, further frames are skipped until there is room.
+            on_estimate (callable): Optional function called with each new PlantEstimate.
+            executor (Executor): Optional worker pool shared with other pipelines, used instead of starting own
+                worker processes. Its batches in flight are limited as if it had the given number of workers.
+        """
+        self.camera = camera
+        self.batch_size = batch_size
+        self.on_estimate = on_estimate
+        self.logger = logging.getLogger(__name__)
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._estimates = {}
+        self._generations = {}  # generation of each plant's frames, by plant ID, advanced when its estimate is discarded
+        self._lock = threading.Lock()
+        if executor is None and workers > 0:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        self._executor = executor
+        # limits the batches in flight, so the pending queue and not the executor holds the backlog
+        self._in_flight = threading.Semaphore(max(workers, 1) * 2)
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def submit(self, plant) -> bool:
+        """
+        Queues a frame of the plant for capture and analysis without blocking.
+
+        Returns:
+            bool: False if the frame was skipped because the pipeline is saturated.
+        """
+        try:
+            self._pending.put_nowait((self._generations.get(plant.id, 0), self.camera.describe(plant)))
+            return True
+        except queue.Full:
+            return False
+
+    def get_estimate(self, plant_id: int):
+        """
+        Returns the latest estimate of the plant, or None if none was made yet.
+        """
+        return self._estimates.get(plant_id)
+
+    def discard(self, plant_id: int):
+        """
+        Discards the estimate of a plant, e.g. after it was seeded or harvested,
+        and the estimates of its frames that are still being analysed.
+        """
+        with self._lock:
+            self._generations[plant_id] = self._generations.get(plant_id, 0) + 1
+            self._estimates.pop(plant_id, None)
+
+    def pending(self) -> int:
+        """
+        Returns the number of frames waiting for analysis.
+        """
+        return self._pending.qsize()
+
+    def _dispatch(self):
+        """
+        Collects the submitted frames into batches and hands them to the workers.
+        """
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            generations = [generation for generation, description in batch]
+            descriptions = [description for generation, description in batch]
+            if self._executor is None:
+                self._store(analyze_batch(descriptions), generations)
+                continue
+
+            self._in_flight.acquire()
+            future = self._executor.submit(analyze_batch, descriptions)
+            future.add_done_callback(partial(self._on_batch_done, generations))
+
+    def _on_batch_done(self, generations: list[int], future):
+        self._in_flight.release()
+        try:
+            self._store(future.result(), generations)
+        except Exception:
+            self.logger.exception("Image analysis batch failed")
+
+    def _store(self, estimates: list[PlantEstimate], generations: list[int]):
+        for estimate, generation in zip(estimates, generations):
+            with self._lock:
+                if generation != self._generations.get(estimate.plant_id, 0):
+                    continue  # the plant changed since the frame was described
+                self._estimates[estimate.plant_id] = estimate
+            if self.on_estimate is not None:
+                self.on_estimate(estimate)
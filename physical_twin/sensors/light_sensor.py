@@ -8,11 +8,29 @@ class LightSensor(SensorInterface):
     This class represents a light sensor in the digital twin system.
     """
 
+    def __init__(self, simulation_instance: simulation.Simulation = None):
+        """
+        Parameters:
+            simulation_instance (Simulation): The simulation of the greenhouse the sensor is in (default: the default simulation).
+        """
+        self.simulation = simulation_instance if simulation_instance is not None else simulation.get_simulation()
+
     @overrides(SensorInterface)
     def read_data(self):
         """
-        Reads data from the light sensor.
+        Reads the greenhouse-wide average from the light sensors.
+        Returns:
+            float: The mean light intensity over all zones of the simulation environment, measured in lux.
+        """
+        return self.simulation.get_environment_field().aggregates["light_mean"]
+
+    @overrides(SensorInterface)
+    def read_data_at_plant(self, id):
+        """
+        Reads data from the light sensor at a specific plant position.
+        Parameters:
+            id (int): The ID (position) of the plant where the light intensity is to be read.
         Returns:
-            float: The current light intensity in the simulation environment, measured in lux.
+            float: The light intensity in the zone of the specified position, measured in lux.
         """
-        return simulation.get_environment().light
+        return self.simulation.get_environment_field().sample("light", id)
@@ -8,6 +8,13 @@ class SoilMoistureSensor(SensorInterface):
     This class represents a soil moisture sensor in the digital twin system.
     """
 
+    def __init__(self, simulation_instance: simulation.Simulation = None):
+        """
+        Parameters:
+            simulation_instance (Simulation): The simulation of the greenhouse the sensor is in (default: the default simulation).
+        """
+        self.simulation = simulation_instance if simulation_instance is not None else simulation.get_simulation()
+
     @overrides(SensorInterface)
     def read_data_at_plant(self, id):
         """
@@ -17,4 +24,4 @@ class SoilMoistureSensor(SensorInterface):
         Returns:
             float: The current soil moisture level at the specified plant location.
         """
-        return simulation.get_plants()[id].moisture_level
+        return self.simulation.get_plants()[id].moisture_level
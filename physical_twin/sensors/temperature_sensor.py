@@ -8,11 +8,29 @@ class TemperatureSensor(SensorInterface):
     This class represents a temperature sensor in the digital twin system.
     """
 
+    def __init__(self, simulation_instance: simulation.Simulation = None):
+        """
+        Parameters:
+            simulation_instance (Simulation): The simulation of the greenhouse the sensor is in (default: the default simulation).
+        """
+        self.simulation = simulation_instance if simulation_instance is not None else simulation.get_simulation()
+
     @overrides(SensorInterface)
     def read_data(self):
         """
-        Reads data from the temperature sensor.
+        Reads the greenhouse-wide average from the temperature sensors.
+        Returns:
+            float: The mean temperature over all zones of the simulation environment, measured in degrees Celsius.
+        """
+        return self.simulation.get_environment_field().aggregates["temperature_mean"]
+
+    @overrides(SensorInterface)
+    def read_data_at_plant(self, id):
+        """
+        Reads data from the temperature sensor at a specific plant position.
+        Parameters:
+            id (int): The ID (position) of the plant where the temperature is to be read.
         Returns:
-            float: The current temperature in the simulation environment, measured in degrees Celsius.
+            float: The temperature in the zone of the specified position, measured in degrees Celsius.
         """
-        return simulation.get_environment().temperature
+        return self.simulation.get_environment_field().sample("temperature", id)
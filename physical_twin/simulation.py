@@ -1,89 +1,304 @@
 """
 Simulation module for the Digital Twin project.
 Used to simulate the environment and plant growth dynamics.
+
+Each greenhouse has its own Simulation, the module functions operate on the default simulation of the process.
+Several simulations can be run by one SimulationScheduler thread.
+The random numbers of the environment and of each plant are drawn from their own streams (see util.rng),
+so a seeded simulation is reproducible, also if its plants are updated in shards.
 """
 
 from model.environment import Environment
+from model.environment_field import EnvironmentField
 from model.plant import Plant
+from model.plant_aggregates import PlantAggregates
+import heapq
+import threading
 import time
-import random
 import effectors.irrigation as irrigation
+import tracing
+from util import clock
+from util.rng import RandomStreams
+
+
+class Simulation:
+    """
+    A class simulating the environment and the plants of one greenhouse.
+
+    Attributes:
+        environment (Environment): The greenhouse-wide environment.
+        environment_field (EnvironmentField): The climate zones of the greenhouse.
+        plants (list[Plant]): The plants, indexed by plant id.
+        cycle_time (float): The time in seconds between two cycles.
+        irrigation_controller (IrrigationController): Optional controller switching the valves at the start of each cycle.
+        irrigation (IrrigationSystem): The irrigation system whose flow is applied to the plants.
+        cycle_listeners (list[callable]): Functions called without arguments after each cycle.
+        random_streams (RandomStreams): The source of the random number streams of the greenhouse.
+        aggregates (PlantAggregates): The greenhouse-wide aggregates of the plants, updated with every plant change.
+        anomaly_detector (AnomalyDetector): Optional detector of anomalies in the plant levels, run each cycle.
+        anomalies (list[tuple[int, str, dict | None]]): The alerts of the detector that changed in the last cycle.
+    """
+
+    def __init__(
+        self,
+        environment: Environment = None,
+        plants: list[Plant] = None,
+        cycle_time: int = 10,
+        environment_field: EnvironmentField = None,
+        irrigation_controller=None,
+        irrigation_system: irrigation.IrrigationSystem = None,
+        random_streams: RandomStreams = None,
+    ):
+        self.random_streams = random_streams if random_streams is not None else RandomStreams()
+        self.environment = None
+        self.environment_field = None
+        self.plants = None
+        self.cycle_time = cycle_time
+        self.irrigation_controller = None
+        self.irrigation = irrigation_system if irrigation_system is not None else irrigation.get_system()
+        self.cycle_listeners = []
+        self.aggregates = None
+        self.anomaly_detector = None
+        self.anomalies = []
+        self.initialized = False
+        if environment is not None:
+            self.initialize(environment, plants, cycle_time, environment_field, irrigation_controller)
+
+    def initialize(
+        self,
+        environment: Environment,
+        plants: list[Plant],
+        cycle_time: int = 10,
+        environment_field: EnvironmentField = None,
+        irrigation_controller=None,
+    ):
+        """
+        Initializes the simulation with the given environment and plants.
+        If no environment field is given, a single zone field covering the whole greenhouse is used.
+        If an irrigation controller is given, it switches the valves at the start of each cycle.
+        """
+        self.environment = environment
+        self.environment_field = (
+            environment_field
+            if environment_field is not None
+            else EnvironmentField(environment, plant_count=len(plants))
+        )
+        self.plants = plants
+        self.irrigation_controller = irrigation_controller
+        self.cycle_time = cycle_time
+        self._environment_rng = self.random_streams.stream("environment")
+        self._field_rng = self.random_streams.stream("environment_field")
+        self._plant_rngs = [self.random_streams.stream("plant", plant.id) for plant in plants]
+        self.aggregates = PlantAggregates(plants)
+        self.initialized = True
+
+    def get_environment(self):
+        return self.environment
+
+    def get_environment_field(self):
+        return self.environment_field
+
+    def get_plants(self):
+        return self.plants
+
+    def add_cycle_listener(self, listener):
+        self.cycle_listeners.append(listener)
+
+    def run_cycle(self):
+        """
+        Runs a simulation cycle - updates the environment and plant states.
+        """
+        print("running cycle")
+
+        environment = self.environment
+        rng = self._environment_rng
+        environment.temperature += rng.uniform(-0.5, 0.5)
+        environment.humidity += rng.uniform(-0.5, 0.5)
+        environment.light += rng.randint(-100, 100)
+        with tracing.span("simulation.environment_field"):
+            self.environment_field.step(environment, self._field_rng)
+
+        if self.irrigation_controller is not None:
+            with tracing.span("simulation.irrigation_controller"):
+                self.irrigation_controller.step()
+
+        # the valves of this cycle, so the robot switching a valve meanwhile does not change them halfway through
+        water_flow = list(self.irrigation.get_water_flow())
+        fertigation_flow = list(self.irrigation.get_fertigation_flow())
+        self.update_plants(0, len(self.plants), water_flow, fertigation_flow)
+
+        if self.anomaly_detector is not None:
+            with tracing.span("simulation.anomaly_detection"):
+                self.anomalies = self.anomaly_detector.step(self.plants, water_flow, fertigation_flow)
+
+        self.irrigation.record_cycle()
+
+        with tracing.span("simulation.listeners"):
+            for listener in self.cycle_listeners:
+                listener()
+
+    def update_plants(self, start: int, stop: int, water_flow: list = None, fertigation_flow: list = None):
+        """
+        Updates the moisture, nutrient level and health of the plants with IDs from start to stop (exclusive)
+        for one cycle, and their contributions to the aggregates. Each plant draws from its own random stream,
+        so updating the plants in several shards, in any order, gives the same results as updating them at once.
+        The flows of the valves by plant ID default to the current flows of the irrigation system.
+
+        The flows are applied plant by plant rather than to flat arrays in one pass: the levels live on the Plant
+        objects, which the robot, the twin messages and the aggregates read, so an array pass would have to copy
+        them back each cycle, and each plant's random draws must stay in its own stream.
+        """
+        if water_flow is None:
+            water_flow = self.irrigation.get_water_flow()
+        if fertigation_flow is None:
+            fertigation_flow = self.irrigation.get_fertigation_flow()
+        update_aggregates = self.aggregates.update
+        now = clock.now()
+
+        for i in range(start, stop):
+            plant = self.plants[i]
+            rng = self._plant_rngs[i]
+            # update the plant's moisture and nutrient levels based on the flow of its valves and consumption
+            plant.moisture_level = min(
+                max(
+                    plant.moisture_level
+                    + water_flow[i]
+                    - plant.base_water_consumption * rng.uniform(0.8, 1.2),
+                    0.0,
+                ),
+                1.0,
+            )
+            plant.nutrient_level = min(
+                max(
+                    plant.nutrient_level
+                    + fertigation_flow[i]
+                    - plant.base_nutrient_consumption * rng.uniform(0.8, 1.2),
+                    0.0,
+                ),
+                1.0,
+            )
+            # small chance of the plant getting sick, increased by suboptimal moisture or nutrient levels
+            if plant.healthy:
+                sickness_chance = (
+                    0.005
+                    if plant.moisture_level >= plant.MIN_MOISTURE
+                    and plant.nutrient_level >= plant.MIN_NUTRIENTS
+                    else 0.02
+                )
+                plant.healthy = rng.random() > sickness_chance
+            update_aggregates(plant, now)
 
-_environment = None
-_plants = None
-_initialized = False
-_cycle_time : int
+    def run(self):
+        """
+        Runs the simulation cycles until the process ends.
+        """
+        while True:
+            with tracing.span("simulation.run_cycle"):
+                self.run_cycle()
+            time.sleep(self.cycle_time)
 
 
-def initialize(environment: Environment, plants: list[Plant], cycle_time: int = 10):
+class SimulationScheduler:
     """
-    Initializes the simulation module with the given environment and plants.
+    A class running the cycles of several simulations in one thread, each at its own cycle time.
+    The cycles of the simulations are interleaved, so N greenhouses need one thread instead of N.
+    """
+
+    def __init__(self):
+        self._due = []  # heap of (due time, order, simulation)
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def add(self, simulation: Simulation, start: float = None):
+        """
+        Schedules the cycles of a simulation, the first one at the given time.monotonic() time (default: now).
+        Simulations can be added while the scheduler is running.
+        """
+        with self._condition:
+            heapq.heappush(self._due, (time.monotonic() if start is None else start, self._count, simulation))
+            self._count += 1
+            self._condition.notify()
+
+    def __len__(self):
+        return len(self._due)
+
+    def run(self):
+        """
+        Runs the due cycles until the process ends.
+        """
+        while True:
+            with self._condition:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._condition.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                due, order, simulation = heapq.heappop(self._due)
+            with tracing.span("simulation.run_cycle"):
+                simulation.run_cycle()
+            # the next cycle is due one cycle time after the previous one was due, a late cycle does not shift the others
+            with self._condition:
+                heapq.heappush(self._due, (max(due + simulation.cycle_time, time.monotonic()), order, simulation))
+
+
+# the simulation used by the module functions
+_simulation = Simulation()
+
+
+def initialize(
+    environment: Environment,
+    plants: list[Plant],
+    cycle_time: int = 10,
+    environment_field: EnvironmentField = None,
+    irrigation_controller=None,
+):
+    """
+    Initializes the default simulation with the given environment and plants.
+    If no environment field is given, a single zone field covering the whole greenhouse is used.
+    If an irrigation controller is given, it switches the valves at the start of each cycle.
     This function should be called once before using other functions.
     """
-    global _environment, _plants, _initialized, _cycle_time
-    _environment = environment
-    _plants = plants
-    _initialized = True
-    _cycle_time = cycle_time
-    
+    _simulation.initialize(environment, plants, cycle_time, environment_field, irrigation_controller)
+
+
+def get_simulation() -> Simulation:
+    """
+    Returns the default simulation.
+    """
+    return _simulation
 
 
 def get_environment():
     """
     Returns the environment of the simulation.
     """
-    return _environment
+    return _simulation.get_environment()
+
+
+def get_environment_field():
+    """
+    Returns the spatial environment field of the simulation.
+    """
+    return _simulation.get_environment_field()
+
+
+def add_cycle_listener(listener):
+    """
+    Registers a function that is called without arguments after each simulation cycle.
+    """
+    _simulation.add_cycle_listener(listener)
 
 
 def get_plants():
     """
     Returns the list of plants in the simulation.
     """
-    return _plants
+    return _simulation.get_plants()
 
 
 def run_cycle():
     """
     Runs a simulation cycle - updates the environment and plant states.
     """
-    print("running cycle")
-    
-    _environment.temperature += random.uniform(-0.5, 0.5)
-    _environment.humidity += random.uniform(-0.5, 0.5)
-    _environment.light += random.randint(-100, 100)
-    
-    for plant in _plants:
-        # update the plant's moisture and nutrient levels based on irrigation/fertigation and consumption
-        plant.moisture_level = min(
-            max(
-                plant.moisture_level
-                + irrigation.read_data()
-                - plant.base_water_consumption * random.uniform(0.8, 1.2),
-                0.0,
-            ),
-            1.0,
-        )
-        plant.nutrient_level = min(
-            max(
-                plant.nutrient_level
-                + irrigation.read_data()
-                - plant.base_nutrient_consumption * random.uniform(0.8, 1.2),
-                0.0,
-            ),
-            1.0,
-        )
-        # small chance of the plant getting sick, increased by suboptimal moisture or nutrient levels
-        if plant.healthy:
-            sickness_chance = (
-                0.005
-                if plant.moisture_level >= Plant.MIN_MOISTURE
-                and plant.nutrient_level >= Plant.MIN_NUTRIENTS
-                else 0.02
-            )
-            plant.healthy = random.random() > sickness_chance
+    _simulation.run_cycle()
 
 
 def run_simulation():
-    while True:
-        run_cycle()
-        time.sleep(_cycle_time)
+    _simulation.run()
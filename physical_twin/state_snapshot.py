@@ -0,0 +1,128 @@
+"""
+This module provides cached, serialized snapshots of the robot, plant and environment state
+for the read-only endpoints of the HTTP server.
+"""
+
+import gzip
+import hashlib
+import itertools
+import json
+import threading
+from robot import Robot
+
+
+class StateSnapshot:
+    """
+    A class that serves the current state as serialized JSON documents.
+
+    The documents are built on the first request after a state change and then served from the cache,
+    so polling clients cost no more than a dictionary lookup while the state is unchanged.
+    Each document has a content-based ETag, and its gzip-compressed form is cached alongside it.
+
+    Attributes:
+        robot (Robot): The robot whose state (and plants) is served.
+        version (int): Counter of state changes, incremented by invalidate().
+        max_cached (int): Maximum number of cached documents per state version.
+    """
+
+    def __init__(self, robot: Robot, max_cached: int = 256):
+        self.robot = robot
+        self.version = 0
+        self._versions = itertools.count(1)
+        self.max_cached = max_cached
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._cache_version = 0
+        self._plants_data = None  # data of all plants for the cached version
+
+    def invalidate(self, *args):
+        """
+        Marks the state as changed. Called by the robot and the simulation after each change,
+        accepts and ignores any callback arguments.
+        """
+        self.version = next(self._versions)  # atomic, unlike incrementing
+
+    def get(self, resource: str, plant_id: int = None, fields=None, offset: int = 0, limit: int = None, compressed: bool = False):
+        """
+        Returns a serialized state document and its ETag.
+
+        Parameters:
+            resource (str): One of "robot", "plants", "plant" or "environment".
+            plant_id (int, optional): The ID of the plant (1-based, as in the twin) for the "plant" resource.
+            fields (Iterable[str], optional): Plant features to include, all if not given.
+            offset (int): Index of the first plant of the "plants" resource.
+            limit (int, optional): Maximum number of plants of the "plants" resource.
+            compressed (bool): Whether to return the gzip-compressed document.
+        Returns:
+            tuple[bytes, str]: The document and its ETag, or (None, None) if the plant does not exist.
+        """
+        fields = tuple(sorted(fields)) if fields else None
+        key = (resource, plant_id, fields, offset, limit)
+
+        with self._lock:
+            if self._cache_version != self.version:
+                self._cache.clear()
+                self._plants_data = None
+                self._cache_version = self.version
+
+            entry = self._cache.get(key)
+            if entry is None:
+                data = self._build(resource, plant_id, fields, offset, limit)
+                if data is None:
+                    return None, None
+                body = json.dumps(data).encode()
+                etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+                entry = {"body": body, "etag": f'"{etag}"', "gzip": None}
+                if len(self._cache) >= self.max_cached:
+                    self._cache.clear()
+                self._cache[key] = entry
+
+            if not compressed:
+                return entry["body"], entry["etag"]
+            if entry["gzip"] is None:
+                entry["gzip"] = gzip.compress(entry["body"], compresslevel=5)
+            return entry["gzip"], entry["etag"][:-1] + '-gzip"'
+
+    def _build(self, resource, plant_id, fields, offset, limit):
+        """
+        Builds the data of a state document.
+        """
+        if resource == "robot":
+            return self.robot.get_robot_data()
+        if resource == "environment":
+            return self.robot.get_environmental_data()
+        if resource == "plant":
+            if plant_id is None or not 1 <= plant_id <= len(self.robot.plants):
+                return None
+            if self._plants_data is not None:
+                return self._select(self._plants_data[plant_id - 1], fields)
+            return self._select(
+                {"id": plant_id, **self.robot.get_plant_data(plant_id - 1)}, fields
+            )
+        if resource == "plants":
+            plants = self._get_plants_data()
+            end = len(plants) if limit is None else offset + limit
+            return {
+                "total": len(plants),
+                "offset": offset,
+                "limit": limit,
+                "plants": [self._select(plant, fields) for plant in plants[offset:end]],
+            }
+        raise ValueError(f"Unknown resource: {resource}")
+
+    def _get_plants_data(self):
+        """
+        Returns the data of all plants, built once per state version.
+        """
+        if self._plants_data is None:
+            self._plants_data = [
+                {"id": plant.id + 1, **self.robot.get_plant_data(plant.id)}
+                for plant in self.robot.plants
+            ]
+        return self._plants_data
+
+    @staticmethod
+    def _select(plant_data: dict, fields):
+        if fields is None:
+            return plant_data
+        return {"id": plant_data["id"], **{f: plant_data[f] for f in fields if f in plant_data}}
@@ -0,0 +1,333 @@
+"""
+This module serves the static files of the Unity WebGL build for the grafana panel.
+
+All files are loaded once at startup: small files are kept in memory, large files are memory-mapped,
+and compressible files are precompressed with gzip (and brotli, if the brotli package is installed).
+Files are served with the best encoding the client accepts, with ETag/Last-Modified validation,
+long-lived caching for build files named by their content hash and byte range support.
+"""
+
+import email.utils
+import gzip
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+from urllib.parse import unquote, urlparse
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+# content types of the Unity WebGL build files that mimetypes does not know
+CONTENT_TYPES = {
+    ".wasm": "application/wasm",
+    ".data": "application/octet-stream",
+    ".unityweb": "application/octet-stream",
+    ".js": "application/javascript",
+    ".json": "application/json",
+}
+
+# content types that are worth compressing
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/wasm",
+    "application/octet-stream",
+    "image/svg+xml",
+)
+
+# Unity builds can be precompressed by Unity itself, such files are served as they are
+PRECOMPRESSED_SUFFIXES = {".gz": "gzip", ".br": "br"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# file names containing a content hash, e.g. from Unity's "Name Files As Hashes" (32 hex digits)
+HASHED_NAME = re.compile(r"(?:^|[^0-9a-f])[0-9a-f]{16,}(?:[^0-9a-f]|$)", re.IGNORECASE)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+WRITE_CHUNK_SIZE = 1 << 20
+
+
+class Asset:
+    """
+    A class representing a static file prepared for serving.
+
+    Attributes:
+        content_type (str): The MIME type of the file.
+        last_modified (str): The modification time of the file as HTTP date.
+        mtime (int): The modification time of the file in seconds since the epoch.
+        etag (str): The ETag of the identity encoded file.
+        cache_control (str): The Cache-Control header value of the file.
+        encodings (dict[str, bytes | mmap.mmap]): The file content by content encoding ("identity", "gzip", "br").
+    """
+
+    def __init__(self, path: str, cache_control: str, memory_limit: int, compression_limit: int):
+        base, suffix = os.path.splitext(path)
+        native_encoding = PRECOMPRESSED_SUFFIXES.get(suffix)
+        self.content_type = content_type_of(base if native_encoding else path)
+        self.cache_control = cache_control
+
+        stat = os.stat(path)
+        self.mtime = int(stat.st_mtime)
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+
+        content = load(path, stat.st_size, memory_limit)
+        digest = hashlib.blake2b(content, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+
+        if native_encoding:
+            # the file is already compressed, it is only served in its own encoding
+            self.encodings = {native_encoding: content}
+            return
+
+        self.encodings = {"identity": content}
+        if 0 < stat.st_size <= compression_limit and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(content, compresslevel=9)
+            if len(compressed) < stat.st_size:
+                self.encodings["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(bytes(content))
+                if len(compressed) < stat.st_size:
+                    self.encodings["br"] = compressed
+
+    def etag_for(self, encoding: str) -> str:
+        """
+        Returns the ETag of the file in the given encoding, each encoding has its own ETag.
+        """
+        if encoding == "identity":
+            return self.etag
+        return self.etag[:-1] + f'-{encoding}"'
+
+
+class StaticAssets:
+    """
+    A class that holds the prepared static files of a directory and serves them to a request handler.
+
+    Attributes:
+        directory (str): The directory whose files are served.
+        url_prefix (str): The URL path under which the directory is served, e.g. "/unity/".
+        immutable_directories (tuple[str]): Subdirectories whose files named by their content hash may be cached
+            by clients without revalidation.
+        assets (dict[str, Asset]): The prepared files by URL path.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        url_prefix: str = "/unity/",
+        immutable_directories=("Build",),
+        memory_limit: int = 8 << 20,
+        compression_limit: int = 64 << 20,
+    ):
+        """
+        Prepares all files of the directory for serving.
+
+        Parameters:
+            directory (str): The directory whose files are served.
+            url_prefix (str): The URL path under which the directory is served.
+            immutable_directories (Iterable[str]): Subdirectories whose files get immutable caching if their names
+                contain a content hash (e.g. Unity's "Name Files As Hashes"), other files are always revalidated.
+            memory_limit (int): Files up to this size in bytes are read into memory, larger files are memory-mapped.
+            compression_limit (int): Files up to this size in bytes are precompressed.
+        """
+        self.directory = os.path.abspath(directory)
+        self.url_prefix = "/" + url_prefix.strip("/") + "/"
+        self.immutable_directories = tuple(immutable_directories)
+        self.assets = {}
+
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                relative = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                immutable = relative.split("/", 1)[0] in self.immutable_directories and HASHED_NAME.search(filename)
+                self.assets[self.url_prefix + relative] = Asset(
+                    path,
+                    IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+                    memory_limit,
+                    compression_limit,
+                )
+            if "index.html" in filenames:
+                # directories are served with their index page
+                relative_dir = os.path.relpath(dirpath, self.directory).replace(os.sep, "/")
+                url = self.url_prefix if relative_dir == "." else self.url_prefix + relative_dir + "/"
+                self.assets[url] = self.assets[url + "index.html"]
+
+    def serve(self, handler, head_only: bool = False) -> bool:
+        """
+        Serves the file requested by the handler, if it is a prepared static file.
+
+        Parameters:
+            handler (BaseHTTPRequestHandler): The handler of the request.
+            head_only (bool): Whether to send only the headers (HEAD request).
+        Returns:
+            bool: True if the request was answered, False if the path is not a prepared file.
+        """
+        asset = self.assets.get(unquote(urlparse(handler.path).path))
+        if asset is None:
+            return False
+
+        range_header = handler.headers.get("Range")
+        if range_header is not None and handler.headers.get("If-Range") not in (None, asset.etag, asset.last_modified):
+            range_header = None  # the client's copy is outdated, send the whole file
+        if "identity" not in asset.encodings:
+            range_header = None  # files precompressed by Unity are always sent whole
+
+        # ranges refer to the identity encoding, so range requests are never compressed
+        encoding = "identity" if range_header else negotiate_encoding(
+            handler.headers.get("Accept-Encoding", ""), asset.encodings
+        )
+        content_type = asset.content_type
+        if encoding is None:
+            if "identity" in asset.encodings:
+                handler.send_response(406)
+                handler.end_headers()
+                return True
+            # a file precompressed by Unity in an encoding the client does not accept (e.g. br over plain http)
+            # is sent as it is stored, Unity's loader decompresses it
+            (encoding, content), = asset.encodings.items()
+            etag = asset.etag
+            content_type = "application/octet-stream"
+            send_encoding = None
+        else:
+            content = asset.encodings[encoding]
+            etag = asset.etag_for(encoding)
+            send_encoding = encoding if encoding != "identity" else None
+
+        if self.is_not_modified(handler, asset, etag):
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Cache-Control", asset.cache_control)
+            handler.end_headers()
+            return True
+
+        start, end = 0, len(content)
+        status = 200
+        if range_header:
+            byte_range = parse_range(range_header, len(content))
+            if byte_range is False:
+                handler.send_response(416)
+                handler.send_header("Content-Range", f"bytes */{len(content)}")
+                handler.end_headers()
+                return True
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(end - start))
+        handler.send_header("ETag", etag)
+        handler.send_header("Last-Modified", asset.last_modified)
+        handler.send_header("Cache-Control", asset.cache_control)
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Vary", "Accept-Encoding")
+        if send_encoding is not None:
+            handler.send_header("Content-Encoding", send_encoding)
+        if status == 206:
+            handler.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(content)}")
+        handler.end_headers()
+
+        if not head_only:
+            view = memoryview(content)
+            for offset in range(start, end, WRITE_CHUNK_SIZE):
+                handler.wfile.write(view[offset : min(offset + WRITE_CHUNK_SIZE, end)])
+        return True
+
+    @staticmethod
+    def is_not_modified(handler, asset: Asset, etag: str) -> bool:
+        """
+        Evaluates the conditional request headers, If-None-Match takes precedence over If-Modified-Since.
+        """
+        if_none_match = handler.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = handler.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return asset.mtime <= since
+        return False
+
+
+def content_type_of(path: str) -> str:
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in CONTENT_TYPES:
+        return CONTENT_TYPES[suffix]
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def load(path: str, size: int, memory_limit: int):
+    """
+    Reads a file into memory, or memory-maps it if it is larger than the memory limit.
+    """
+    with open(path, "rb") as f:
+        if size == 0:
+            return b""
+        if size <= memory_limit:
+            return f.read()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def negotiate_encoding(accept_encoding: str, available):
+    """
+    Chooses the smallest available content encoding that the client accepts.
+    Returns None if the client accepts none of the available encodings.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    def is_accepted(encoding):
+        if encoding in accepted:
+            return accepted[encoding] > 0
+        if encoding == "identity":
+            return accepted.get("*", 1.0) > 0  # identity is acceptable unless excluded explicitly
+        return accepted.get("*", 0.0) > 0
+
+    candidates = [encoding for encoding in available if is_accepted(encoding)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda encoding: len(available[encoding]))
+
+
+def parse_range(range_header: str, size: int):
+    """
+    Parses a single byte range of a Range header.
+
+    Returns:
+        tuple[int, int] | None | bool: The range as (start, end) with exclusive end,
+        None if the header should be ignored (unsupported or multiple ranges),
+        or False if the range cannot be satisfied.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size or end <= start:
+        return False
+    return start, min(end, size)
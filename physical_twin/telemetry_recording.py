@@ -0,0 +1,225 @@
+"""
+This module records the telemetry published by the MQTT client and replays it to a broker.
+
+A recording is an append-only file of independently compressed frames, each holding a batch of records
+(time, topic, payload). Appending to an existing recording only adds frames, and a frame cut off by a crash
+only loses that frame. Reading streams one frame at a time, so replaying multi-day recordings needs constant memory.
+
+The replay publishes the messages at their original pace, N times faster or as fast as the broker accepts them.
+The feature times in the Ditto payloads are shifted by the time between recording and publishing, so the twins
+receive current values.
+
+Example:
+    python main.py --mqtt_port 1883 --record_file telemetry.rec
+    python telemetry_recording.py telemetry.rec --mqtt_port 1883 --speed 10
+"""
+
+import argparse
+import atexit
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+# identifies recording files and their format version
+MAGIC = b"TWINREC1"
+# frame header: compressed size, number of records
+FRAME_HEADER = struct.Struct("<II")
+# record header: unix time in seconds, topic size, payload size
+RECORD_HEADER = struct.Struct("<dHI")
+
+# feature times ("time": <unix ms>) in payloads formatted by mqtt_client.features_to_ditto_protocol
+FEATURE_TIME = re.compile(rb'"time": (\d+)')
+
+
+class TelemetryRecorder:
+    """
+    A class appending published messages to a recording file.
+    Records are collected in memory and written as one compressed frame when the frame is full
+    or the flush interval has passed at the next record, and when the recorder is closed (also at exit).
+
+    Attributes:
+        path (str): The path of the recording file.
+        frame_size (int): The uncompressed size in bytes after which a frame is written.
+        flush_interval (float): The maximum time in seconds records are kept in memory while messages are published.
+        records (int): The number of records written by this recorder.
+    """
+
+    def __init__(self, path: str, frame_size: int = 1 << 16, flush_interval: float = 1.0, level: int = 6):
+        self.path = path
+        self.frame_size = frame_size
+        self.flush_interval = flush_interval
+        self.level = level
+        self.records = 0
+        self._buffer = bytearray()
+        self._count = 0
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new:
+            self._file.write(MAGIC)
+        atexit.register(self.close)
+
+    def record(self, topic: str, payload, timestamp: float = None):
+        """
+        Adds a message to the recording.
+
+        Parameters:
+            topic (str): The MQTT topic.
+            payload (str | bytes): The payload.
+            timestamp (float): The unix time the message was published (default: now).
+        """
+        topic = topic.encode()
+        payload = payload.encode() if isinstance(payload, str) else payload
+        with self._lock:
+            self._buffer += RECORD_HEADER.pack(time.time() if timestamp is None else timestamp, len(topic), len(payload))
+            self._buffer += topic
+            self._buffer += payload
+            self._count += 1
+            if len(self._buffer) >= self.frame_size or time.monotonic() - self._flushed >= self.flush_interval:
+                self._write_frame()
+
+    def flush(self):
+        """
+        Writes the collected records to the file.
+        """
+        with self._lock:
+            self._write_frame()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write_frame()
+            self._file.close()
+        atexit.unregister(self.close)
+
+    def _write_frame(self):
+        self._flushed = time.monotonic()
+        if not self._count:
+            return
+        data = zlib.compress(bytes(self._buffer), self.level)
+        self._file.write(FRAME_HEADER.pack(len(data), self._count) + data)
+        self._file.flush()
+        self.records += self._count
+        self._buffer.clear()
+        self._count = 0
+
+
+def read_records(path: str):
+    """
+    Reads the records of a recording one frame at a time. A truncated last frame is skipped.
+
+    Yields:
+        tuple[float, str, bytes]: The unix time, topic and payload of each record.
+    Raises:
+        ValueError: If the file is not a recording.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a telemetry recording")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            size, count = FRAME_HEADER.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                return
+            frame = memoryview(zlib.decompress(data))
+            offset = 0
+            for _ in range(count):
+                timestamp, topic_size, payload_size = RECORD_HEADER.unpack_from(frame, offset)
+                offset += RECORD_HEADER.size
+                topic = bytes(frame[offset : offset + topic_size]).decode()
+                offset += topic_size
+                payload = bytes(frame[offset : offset + payload_size])
+                offset += payload_size
+                yield timestamp, topic, payload
+
+
+def shift_feature_times(payload: bytes, shift_ms: int) -> bytes:
+    """
+    Shifts the feature times of a Ditto payload by the given number of milliseconds.
+    """
+    return FEATURE_TIME.sub(lambda match: b'"time": %d' % (int(match.group(1)) + shift_ms), payload)
+
+
+def replay(records, publish, speed: float = 1.0, rewrite_times: bool = True) -> dict:
+    """
+    Publishes recorded messages.
+
+    Parameters:
+        records (Iterable[tuple[float, str, bytes]]): The records, e.g. from read_records().
+        publish (callable): Called with the topic and payload of each message, may block to limit the pace.
+        speed (float): The replay speed relative to the recording, 0 replays as fast as possible.
+        rewrite_times (bool): Whether the feature times are shifted to the time of publishing.
+    Returns:
+        dict: The number of replayed messages, the elapsed time and the replayed recording time in seconds.
+    """
+    start = time.monotonic()
+    first = last = None
+    count = 0
+    for timestamp, topic, payload in records:
+        if first is None:
+            first = timestamp
+        last = timestamp
+        if speed > 0:
+            delay = (timestamp - first) / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+        if rewrite_times:
+            payload = shift_feature_times(payload, round((time.time() - timestamp) * 1000))
+        publish(topic, payload)
+        count += 1
+    return {
+        "messages": count,
+        "elapsed": time.monotonic() - start,
+        "recorded": last - first if first is not None else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a telemetry recording to an MQTT broker.")
+    parser.add_argument("file", type=str, help="The recording file")
+    parser.add_argument("--mqtt_broker", type=str, default="localhost", help="Address of the MQTT broker (default: localhost)")
+    parser.add_argument("--mqtt_port", type=int, required=True, help="Port of the MQTT broker")
+    parser.add_argument("--mqtt_connections", type=int, default=4, help="Number of MQTT connections the topics are sharded across (default: 4)")
+    parser.add_argument("--mqtt_qos", type=int, choices=[0, 1, 2], default=0, help="QoS level of the published messages (default: 0)")
+    parser.add_argument("--mqtt_max_inflight", type=int, default=100, help="Maximum number of unacknowledged messages per MQTT connection (default: 100)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed relative to the recording, 0 replays as fast as possible (default: 1)")
+    parser.add_argument("--keep_times", action="store_true", help="Publish the recorded feature times instead of shifting them to now")
+    args = parser.parse_args()
+
+    import mqtt_client
+
+    pool = mqtt_client.PublisherPool(
+        args.mqtt_broker, args.mqtt_port, args.mqtt_connections, args.mqtt_qos, args.mqtt_max_inflight,
+        max_queued=args.mqtt_max_inflight * 10,
+    )
+    pool.start()
+    if not pool.wait_connected(30):
+        print("Could not connect to the MQTT broker")
+        pool.stop()
+        return
+    try:
+        result = replay(read_records(args.file), pool.publish, args.speed, not args.keep_times)
+    except KeyboardInterrupt:
+        print("Replay interrupted")
+        return
+    finally:
+        # let the connections send the queued messages before disconnecting
+        while any(publisher.outbox.qsize() for publisher in pool.publishers):
+            time.sleep(0.1)
+        pool.stop()
+    print(
+        f"Replayed {result['messages']} messages ({result['recorded']:.1f} s recorded) in {result['elapsed']:.1f} s, "
+        f"{result['messages'] / max(result['elapsed'], 1e-9):.0f} messages/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
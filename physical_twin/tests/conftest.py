@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of the physical twin are imported flat, as when running main.py from the physical_twin directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
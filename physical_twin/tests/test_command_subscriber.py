@@ -0,0 +1,40 @@
+import json
+import pytest
+from commands import CommandQueue
+
+pytest.importorskip("paho")
+import mqtt_client  # noqa: E402
+
+
+def envelope(site: str, plant: int, action: str) -> dict:
+    return {"topic": f"{site}/my_plants:plant_{plant}/things/live/messages/{action}", "value": None}
+
+
+def test_commands_are_routed_by_namespace():
+    subscriber = mqtt_client.CommandSubscriber()
+    house1, house2 = CommandQueue(), CommandQueue()
+    subscriber.add_site("house1", house1, 5)
+    subscriber.add_site("house2", house2, 3)
+    assert subscriber.topic() == "command/+/#"
+
+    results = subscriber.handle(
+        json.dumps(
+            [
+                envelope("house1", 5, "water"),
+                envelope("house2", 3, "seed"),
+                envelope("house2", 5, "seed"),  # house2 has 3 plants
+                envelope("house3", 1, "seed"),
+            ]
+        )
+    )
+
+    assert [status for status, _ in results] == [202, 202, 400, 400]
+    assert results[0][1].plant_id == 4 and results[1][1].plant_id == 2
+    assert house1.qsize() == 1 and house2.qsize() == 1
+    assert subscriber.rejected == 2
+
+
+def test_single_site_subscribes_to_its_namespace():
+    subscriber = mqtt_client.CommandSubscriber(CommandQueue(), 3, "house1")
+    assert subscriber.topic() == "command/house1/#"
+    assert subscriber.handle(json.dumps(envelope("house2", 1, "seed")))[0][0] == 400
@@ -0,0 +1,61 @@
+from app import create_app
+from commands import CommandQueue, CommandStatus
+from scenario_runner import HEADLESS, DiscardQueue
+
+
+def test_robot_performs_queued_commands_once():
+    app = create_app(None, dict(HEADLESS, plant_amount=5, simulation={"seed": 1}))
+    app.measurement_queue = DiscardQueue()
+    app.message_stream = None
+    robot, action_queue = app.robot, app.action_queue
+    plant = app.plants[2]
+    plant.moisture_level = 0.1
+
+    # a double click and a retried request
+    first, queued = action_queue.submit("water", plant.id, request_id="click-1")
+    second, queued_second = action_queue.submit("water", plant.id, request_id="click-2")
+    retried, queued_retry = action_queue.submit("water", plant.id, request_id="click-1")
+    assert (queued, queued_second, queued_retry) == (True, False, False)
+    assert first is second is retried
+    assert first.to_dict()["plant_id"] == 3 and first.status == CommandStatus.QUEUED
+
+    robot.step()
+
+    assert first.status == CommandStatus.DONE
+    assert app.irrigation_system.get_water_flow()[plant.id] > 0
+    assert action_queue.qsize() == 0
+    assert action_queue.get_command("click-2") is first
+
+
+def test_history_keeps_queued_commands():
+    action_queue = CommandQueue(max_history=3)
+    cancelled = [action_queue.submit("water", plant_id)[0] for plant_id in range(5)]
+    waiting = [action_queue.submit("seed", plant_id)[0] for plant_id in range(5)]
+
+    for command in cancelled:
+        action_queue.cancel(command.id)
+    action_queue.submit("harvest", 0)
+
+    # the oldest finished commands beyond the history are forgotten, queued commands are always kept
+    assert [action_queue.get_command(c.id) for c in cancelled] == [None, None] + cancelled[2:]
+    assert all(action_queue.get_command(c.id) is c for c in waiting)
+
+
+def test_closed_valve_is_not_closed_again():
+    app = create_app(None, dict(HEADLESS, plant_amount=5, simulation={"seed": 1}))
+    app.measurement_queue = DiscardQueue()
+    app.message_stream = None
+    robot = app.robot
+    plant = app.plants[1]
+    plant.moisture_level = plant.nutrient_level = 1.0
+    reschedules = []
+    robot.reschedule_monitoring = lambda *plant_ids: reschedules.extend(plant_ids)
+
+    robot.water_plant(plant)
+    robot.fertilize_plant(plant)
+    assert reschedules == []
+
+    app.irrigation_system.set_water_flow(plant.id, 0.05)
+    robot.water_plant(plant)
+    assert reschedules == [plant.id]
+    assert app.irrigation_system.get_water_flow()[plant.id] == 0.0
@@ -0,0 +1,172 @@
+import queue
+import time
+import pytest
+from commands import CommandQueue, CommandStatus, Priority, RateLimit
+
+
+def drain(action_queue: CommandQueue) -> list:
+    commands = []
+    while True:
+        try:
+            commands.append(action_queue.get(block=False))
+        except queue.Empty:
+            return commands
+
+
+def test_lanes_are_served_by_priority():
+    action_queue = CommandQueue()
+    action_queue.submit("monitor", 1, priority=Priority.MONITORING)
+    action_queue.submit("water", 2, priority=Priority.AUTOMATED)
+    action_queue.submit("harvest", 3, priority=Priority.MANUAL)
+    action_queue.submit("seed", 4, priority=Priority.EMERGENCY)
+    action_queue.submit("fertilize", 5, priority=Priority.MANUAL)
+
+    assert [(c.action, c.plant_id) for c in drain(action_queue)] == [
+        ("seed", 4),
+        ("harvest", 3),
+        ("fertilize", 5),
+        ("water", 2),
+        ("monitor", 1),
+    ]
+
+
+def test_aged_commands_overtake_newer_manual_commands():
+    action_queue = CommandQueue(aging_interval=10)
+    aged, _ = action_queue.submit("monitor", 1, priority=Priority.MONITORING)
+    aged.queued_at -= 25  # two and a half classes: reaches the manual rank
+    action_queue.submit("water", 2, priority=Priority.MANUAL)
+    action_queue.submit("seed", 3, priority=Priority.EMERGENCY)
+
+    assert [c.action for c in drain(action_queue)] == ["seed", "monitor", "water"]
+
+
+def test_partly_aged_commands_wait_for_manual_commands():
+    action_queue = CommandQueue(aging_interval=10)
+    aged, _ = action_queue.submit("monitor", 1, priority=Priority.MONITORING)
+    aged.queued_at -= 15  # one and a half classes: still behind the manual lane
+    action_queue.submit("water", 2, priority=Priority.MANUAL)
+
+    assert [c.action for c in drain(action_queue)] == ["water", "monitor"]
+
+
+def test_rate_limited_lane_does_not_block_other_lanes():
+    action_queue = CommandQueue(rate_limits={Priority.MANUAL: RateLimit(rate=0.1, burst=1)})
+    action_queue.submit("water", 1)
+    action_queue.submit("water", 2)
+    action_queue.submit("monitor", 3, priority=Priority.MONITORING)
+
+    assert action_queue.get(block=False).plant_id == 1
+    # the manual lane used up its burst, the monitoring lane is served meanwhile
+    assert action_queue.get(block=False).plant_id == 3
+    with pytest.raises(queue.Empty):
+        action_queue.get(block=False)
+    assert action_queue.lane_sizes()["manual"] == 1
+
+
+def test_wait_sleeps_while_lane_is_rate_limited():
+    action_queue = CommandQueue(rate_limits={Priority.MANUAL: RateLimit(rate=0.1, burst=1)})
+    action_queue.submit("water", 1)
+    action_queue.submit("water", 2)
+    action_queue.get(block=False)
+
+    started = time.monotonic()
+    assert action_queue.wait(0.2) is False
+    assert time.monotonic() - started >= 0.19
+
+    action_queue.submit("seed", 3, priority=Priority.EMERGENCY)
+    assert action_queue.wait(0.2) is True
+
+
+def test_wait_returns_once_rate_limit_allows_a_start():
+    action_queue = CommandQueue(rate_limits={Priority.MANUAL: RateLimit(rate=10, burst=1)})
+    action_queue.submit("water", 1)
+    action_queue.submit("water", 2)
+    action_queue.get(block=False)
+
+    started = time.monotonic()
+    assert action_queue.wait(1.0) is True
+    assert 0.05 <= time.monotonic() - started < 0.5
+
+
+def test_wait_ignores_less_urgent_lanes():
+    action_queue = CommandQueue()
+    action_queue.submit("monitor", 1, priority=Priority.MONITORING)
+
+    assert action_queue.wait(0.05) is False
+    assert action_queue.wait(0.05, Priority.MONITORING) is True
+
+
+def test_same_request_id_is_queued_once():
+    action_queue = CommandQueue()
+    first, queued = action_queue.submit("water", 1, request_id="abc")
+    again, queued_again = action_queue.submit("water", 1, request_id="abc")
+
+    assert queued and not queued_again
+    assert again is first
+    assert action_queue.qsize() == 1
+
+
+def test_identical_pending_plant_action_is_merged():
+    action_queue = CommandQueue()
+    first, _ = action_queue.submit("water", 1, request_id="first", priority=Priority.AUTOMATED)
+    merged, queued = action_queue.submit("water", 1, request_id="second", priority=Priority.MANUAL)
+    other, other_queued = action_queue.submit("water", 2)
+
+    assert merged is first and not queued
+    assert other_queued
+    # the merged request can be polled with its own ID and moved the command to the more urgent lane
+    assert action_queue.get_command("second") is first
+    assert first.priority == Priority.MANUAL
+    assert action_queue.lane_sizes() == {"emergency": 0, "manual": 2, "automated": 0, "monitoring": 0}
+
+
+def test_started_command_is_not_merged():
+    action_queue = CommandQueue()
+    first, _ = action_queue.submit("water", 1)
+    action_queue.get(block=False)
+    second, queued = action_queue.submit("water", 1)
+
+    assert queued and second is not first
+
+
+def test_cancel_removes_queued_command():
+    action_queue = CommandQueue()
+    command, _ = action_queue.submit("water", 1)
+
+    assert action_queue.cancel(command.id) is command
+    assert command.status == CommandStatus.CANCELLED
+    assert action_queue.qsize() == 0
+    # a new identical command is queued again instead of being merged into the cancelled one
+    assert action_queue.submit("water", 1)[1]
+
+
+def test_cancel_leaves_running_and_unknown_commands():
+    action_queue = CommandQueue()
+    command, _ = action_queue.submit("water", 1)
+    action_queue.get(block=False)
+
+    assert action_queue.cancel(command.id).status == CommandStatus.RUNNING
+    assert action_queue.cancel("unknown") is None
+
+
+def test_full_lane_rejects_commands():
+    action_queue = CommandQueue(lane_capacity=1)
+    action_queue.submit("water", 1)
+
+    with pytest.raises(queue.Full):
+        action_queue.submit("water", 2)
+    assert action_queue.submit("water", 2, priority=Priority.AUTOMATED)[1]
+
+
+def test_command_records_failure():
+    action_queue = CommandQueue()
+
+    def fail(robot):
+        raise RuntimeError("arm blocked")
+
+    command, _ = action_queue.submit("water", 1, function=fail)
+    action_queue.get(block=False)(robot=None)
+
+    assert command.status == CommandStatus.FAILED
+    assert command.error == "arm blocked"
+    assert command.finished_at is not None
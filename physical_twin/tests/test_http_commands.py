@@ -0,0 +1,90 @@
+import http.client
+import http.server
+import json
+import threading
+import pytest
+from app import create_app
+from http_server import make_handler
+from scenario_runner import HEADLESS, DiscardQueue
+
+
+@pytest.fixture
+def server():
+    app = create_app(None, dict(HEADLESS, plant_amount=5))
+    app.measurement_queue = DiscardQueue()
+    app.message_stream = None
+    robot = app.robot
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), make_handler(robot, app.action_queue))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_port, robot, app.action_queue
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(port: int, method: str, path: str, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(method, path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        if response.getheader("Content-Type") == "application/json":
+            body = json.loads(body)
+        return response.status, body, response
+    finally:
+        connection.close()
+
+
+def test_command_status_transitions(server):
+    port, robot, action_queue = server
+    status, command, response = request(port, "POST", "/plant/3/water?request_id=abc")
+    assert status == 202
+    assert response.getheader("Location") == "/commands/abc"
+    assert command["status"] == "queued" and command["plant_id"] == 3 and command["priority"] == "manual"
+
+    assert request(port, "GET", "/commands")[1] == {
+        "queued": 1,
+        "lanes": {"emergency": 0, "manual": 1, "automated": 0, "monitoring": 0},
+    }
+
+    running = action_queue.get(block=False)
+    assert request(port, "GET", "/commands/abc")[1]["status"] == "running"
+    running(robot)
+    status, command, _ = request(port, "GET", "/commands/abc")
+    assert status == 200
+    assert command["status"] == "done"
+    assert command["queued_at"] <= command["started_at"] <= command["finished_at"]
+
+
+def test_repeated_request_is_not_queued_again(server):
+    port, _, action_queue = server
+    assert request(port, "POST", "/plant/2/seed", {"X-Request-ID": "r1"})[0] == 202
+    status, command, _ = request(port, "POST", "/plant/2/seed", {"X-Request-ID": "r1"})
+    assert status == 200 and command["id"] == "r1"
+    # an identical action for the plant is merged into the waiting command
+    status, command, _ = request(port, "POST", "/plant/2/seed?request_id=r2&priority=emergency")
+    assert status == 200 and command["id"] == "r1" and command["priority"] == "emergency"
+    assert action_queue.qsize() == 1
+
+
+def test_cancel_command(server):
+    port, robot, action_queue = server
+    request(port, "POST", "/plant/1/fertilize?request_id=c1")
+    status, command, _ = request(port, "DELETE", "/commands/c1")
+    assert status == 200 and command["status"] == "cancelled"
+    assert action_queue.qsize() == 0
+
+    request(port, "POST", "/plant/1/harvest?request_id=c2")
+    action_queue.get(block=False)(robot)
+    status, command, _ = request(port, "POST", "/commands/c2/cancel")
+    assert status == 409 and command["status"] == "done"
+
+    assert request(port, "DELETE", "/commands/unknown")[0] == 404
+    assert request(port, "GET", "/commands/unknown")[0] == 404
+
+
+def test_invalid_requests_are_rejected(server):
+    port, _, action_queue = server
+    assert request(port, "POST", "/plant/9/water")[0] == 404
+    assert request(port, "POST", "/plant/1/water?priority=urgent")[0] == 400
+    assert request(port, "POST", "/robot/move?i=0")[0] == 400
+    assert action_queue.qsize() == 0
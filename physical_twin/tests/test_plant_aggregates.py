@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import random
+import pytest
+from app import create_app
+from model.plant import Plant
+from model.plant_aggregates import PlantAggregates
+from scenario_runner import HEADLESS, DiscardQueue
+from util import clock
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def simulated_clock():
+    clock.set_clock(clock.SimulatedClock(NOW))
+    yield
+    clock.set_clock()
+
+
+def assert_equal_to_recount(aggregates: PlantAggregates, plants: list):
+    recount = PlantAggregates(plants, aggregates.bins)
+    assert aggregates.counts == recount.counts
+    assert aggregates.moisture_histogram == recount.moisture_histogram
+    assert aggregates.nutrient_histogram == recount.nutrient_histogram
+    assert aggregates.moisture_sum == pytest.approx(recount.moisture_sum)
+    assert aggregates.nutrient_sum == pytest.approx(recount.nutrient_sum)
+    assert aggregates.get_twin_data() == pytest.approx(recount.get_twin_data())
+
+
+def test_incremental_updates_equal_recount():
+    rng = random.Random(5)
+    plants = [Plant(i, date_time_planted=NOW - timedelta(days=rng.uniform(0, 120))) for i in range(300)]
+    aggregates = PlantAggregates(plants)
+
+    for step in range(5000):
+        plant = rng.choice(plants)
+        change = rng.randrange(5)
+        if change == 0:
+            plant.moisture_level = rng.random()
+        elif change == 1:
+            plant.nutrient_level = rng.random()
+        elif change == 2:
+            plant.healthy = not plant.healthy
+        elif change == 3:
+            plant.has_plant = False
+        else:
+            plant.has_plant = True
+            plant.datetime_planted = NOW - timedelta(days=rng.uniform(0, 120))
+        aggregates.update(plant, NOW)
+        if step % 1000 == 0:
+            assert_equal_to_recount(aggregates, plants)
+    assert_equal_to_recount(aggregates, plants)
+
+
+def test_counts_and_percentiles():
+    plants = [Plant(i, date_time_planted=NOW - timedelta(days=10)) for i in range(10)]
+    for i, plant in enumerate(plants):
+        plant.moisture_level = i / 10 + 0.05
+        plant.nutrient_level = 0.5
+    plants[0].has_plant = False
+    plants[1].healthy = False
+    plants[2].datetime_planted = NOW - timedelta(days=110)
+
+    data = PlantAggregates(plants, bins=10).get_twin_data()
+
+    assert data["planted_count"] == 9 and data["empty_count"] == 1
+    assert data["sick_count"] == 1 and data["ripe_count"] == 1
+    assert data["dry_count"] == 2  # 0.15 and 0.25 are below the minimum moisture of 0.3
+    assert data["soil_moisture_mean"] == pytest.approx(55)
+    assert data["soil_moisture_p50"] == pytest.approx(55)
+    assert data["soil_nutrients_p90"] == pytest.approx(55)
+
+
+def test_empty_greenhouse_has_no_levels():
+    data = PlantAggregates([Plant(0, has_plant=False)]).get_twin_data()
+    assert data["soil_moisture_mean"] is None and data["soil_moisture_p50"] is None
+
+
+def test_simulation_and_robot_keep_aggregates_current():
+    app = create_app(None, dict(HEADLESS, plant_amount=40, simulation={"seed": 3}))
+    app.measurement_queue = DiscardQueue()
+    app.message_stream = None
+    robot, simulation = app.robot, app.simulation
+
+    for _ in range(5):
+        simulation.update_plants(0, len(app.plants))
+    robot.harvest_plant(app.plants[4])
+    robot.seed_plant(app.plants[5])
+
+    assert_equal_to_recount(simulation.aggregates, app.plants)
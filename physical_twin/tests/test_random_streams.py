@@ -0,0 +1,59 @@
+from datetime import datetime
+import pytest
+from app import create_app
+from scenario_runner import HEADLESS
+from util import clock
+from util.rng import RandomStreams
+
+
+@pytest.fixture(autouse=True)
+def simulated_clock():
+    clock.set_clock(clock.SimulatedClock(datetime(2024, 3, 1)))
+    yield
+    clock.set_clock()
+
+
+def state_after(seed: int, cycles: int, shards: int) -> list:
+    """
+    Runs the plant updates of a greenhouse in the given number of shards, each updated in reverse order.
+    """
+    app = create_app(None, dict(HEADLESS, plant_amount=97, simulation={"seed": seed}))
+    simulation = app.simulation
+    for plant_id in range(0, 97, 3):
+        app.irrigation_system.set_water_flow(plant_id, 0.05)
+    count = len(app.plants)
+    bounds = [count * shard // shards for shard in range(shards + 1)]
+    for _ in range(cycles):
+        for start, stop in reversed(list(zip(bounds, bounds[1:]))):
+            simulation.update_plants(start, stop)
+    return [
+        (plant.datetime_planted, plant.moisture_level, plant.nutrient_level, plant.healthy) for plant in app.plants
+    ]
+
+
+def test_sharded_updates_are_bit_identical():
+    reference = state_after(seed=42, cycles=30, shards=1)
+    for shards in (2, 5, 97):
+        assert state_after(seed=42, cycles=30, shards=shards) == reference
+
+
+def test_seed_decides_the_results():
+    assert state_after(seed=1, cycles=10, shards=1) == state_after(seed=1, cycles=10, shards=1)
+    assert state_after(seed=1, cycles=10, shards=1) != state_after(seed=2, cycles=10, shards=1)
+
+
+def test_streams_do_not_depend_on_each_other():
+    streams = RandomStreams(7)
+    first = streams.stream("plant", 3).random()
+
+    interleaved = streams.stream("plant", 3)
+    other = streams.stream("plant", 4)
+    values = []
+    for _ in range(5):
+        other.random()
+        values.append(interleaved.random())
+
+    fresh = streams.stream("plant", 3)
+    assert values == [fresh.random() for _ in range(5)]
+    assert values[0] == first
+    assert streams.stream("plant", 4).random() != values[0]
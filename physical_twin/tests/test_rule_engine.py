@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+import random
+import pytest
+from commands import CommandQueue, Priority
+from effectors.irrigation import IrrigationSystem
+from model.plant import Plant
+from rule_engine import Rule, RuleEngine, load_rules, mask_to_ids
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+def random_greenhouse(count: int, seed: int):
+    rng = random.Random(seed)
+    plants = []
+    for plant_id in range(count):
+        plant = Plant(
+            plant_id,
+            has_plant=rng.random() < 0.8,
+            date_time_planted=NOW - timedelta(days=rng.uniform(0, 120)),
+            min_moisture=rng.choice([0.2, 0.3, 0.4]),
+            min_nutrients=rng.choice([0.2, 0.3]),
+        )
+        plant.moisture_level = rng.random()
+        plant.nutrient_level = rng.random()
+        plant.healthy = rng.random() < 0.7
+        plants.append(plant)
+    irrigation = IrrigationSystem(count)
+    for plant_id in rng.sample(range(count), count // 4):
+        irrigation.set_water_flow(plant_id, 0.05)
+    return plants, irrigation
+
+
+def age_days(plant):
+    return (NOW - plant.datetime_planted).total_seconds() / 86400 if plant.has_plant else -1.0
+
+
+# rules and the same conditions evaluated plant by plant
+REFERENCE_RULES = {
+    "soil_moisture < 0.3 and health == sick -> water, priority 1":
+        lambda p, w: p.moisture_level < 0.3 and not p.healthy,
+    "ripeness == ripe -> harvest":
+        lambda p, w: p.is_harvestable(NOW),
+    "not planted -> seed, priority 3":
+        lambda p, w: not p.has_plant,
+    "soil_nutrients < min_nutrients or (age_days > 100 and soil_nutrients < 0.5) -> fertilize":
+        lambda p, w: p.nutrient_level < p.MIN_NUTRIENTS or (age_days(p) > 100 and p.nutrient_level < 0.5),
+    "planted and not (health == healthy or soil_moisture >= 0.6) -> monitor":
+        lambda p, w: p.has_plant and not (p.healthy or p.moisture_level >= 0.6),
+    "0.5 > soil_moisture and water_flow == 0 and planted == true -> water, priority 2":
+        lambda p, w: 0.5 > p.moisture_level and w == 0 and p.has_plant,
+    "soil_moisture < min_moisture and ripeness != ripe -> water":
+        lambda p, w: p.moisture_level < p.MIN_MOISTURE and not p.is_harvestable(NOW),
+    "not not planted and age_days <= 1e1 -> monitor, priority 0":
+        lambda p, w: p.has_plant and age_days(p) <= 10,
+}
+
+
+@pytest.mark.parametrize("source", REFERENCE_RULES)
+def test_rule_matches_reference_evaluation(source):
+    plants, irrigation = random_greenhouse(500, seed=len(source))
+    reference = REFERENCE_RULES[source]
+    water_flow = irrigation.get_water_flow()
+
+    items = RuleEngine([source]).evaluate(plants, irrigation, NOW)
+
+    rule = Rule(source)
+    expected = [(rule.action, plant.id, rule.priority) for plant in plants if reference(plant, water_flow[plant.id])]
+    assert 0 < len(expected) < len(plants)
+    assert items == expected
+
+
+def test_mask_evaluation_matches_naive_loop():
+    plants, irrigation = random_greenhouse(2000, seed=7)
+    engine = RuleEngine(list(REFERENCE_RULES))
+
+    items = engine.evaluate(plants, irrigation, NOW)
+
+    # each plant on its own, so no mask spans more than one plant
+    naive = []
+    for rule in engine.rules:
+        for plant in plants:
+            single = IrrigationSystem(1)
+            single.set_water_flow(0, irrigation.get_water_flow()[plant.id])
+            if RuleEngine([rule.source]).evaluate([plant], single, NOW):
+                naive.append((rule.action, plant.id, rule.priority))
+    assert items == naive
+
+
+def test_rule_attributes():
+    rule = Rule("soil_moisture < min_moisture and health == sick -> water, priority 1")
+    assert rule.action == "water"
+    assert rule.priority == Priority.MANUAL
+    assert rule.columns == {"soil_moisture", "min_moisture", "health"}
+    assert Rule("planted -> monitor").priority == Priority.AUTOMATED
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "soil_moisture < sick -> water",  # number and word
+        "health < 3 -> water",  # word and number
+        "health < sick -> water",  # ordering words
+        "health == ripeness -> water",  # different word columns
+        "health == sik -> water",  # word the column never holds
+        "planted == 1 -> seed",  # bool and number
+        "planted < true -> seed",  # ordering bools
+        "soil_moisture -> water",  # number column alone
+        "soil_moist < 0.3 -> water",  # unknown column
+        "sick == healthy -> water",  # no column
+        "soil_moisture < 0.3 -> dance",  # unknown action
+        "soil_moisture < 0.3 -> move",  # not a plant action
+        "soil_moisture < 0.3 -> water, priority 7",  # unknown priority
+        "soil_moisture < 0.3",  # no action
+        "(soil_moisture < 0.3 -> water",  # missing parenthesis
+        "soil_moisture < 0.3 and -> water",  # incomplete condition
+        "soil_moisture < 0.3 health == sick -> water",  # missing operator
+        "soil_moisture < 0.3 % 2 -> water",  # invalid character
+    ],
+)
+def test_invalid_rules_are_rejected(source):
+    with pytest.raises(ValueError):
+        Rule(source)
+
+
+def test_mask_to_ids():
+    mask = int.from_bytes(bytes([1, 0, 0, 1, 1, 0]), "little")
+    assert list(mask_to_ids(mask, 6)) == [0, 3, 4]
+    assert list(mask_to_ids(0, 6)) == []
+
+
+def test_submitted_commands_are_merged_until_performed():
+    plants, irrigation = random_greenhouse(50, seed=3)
+    engine = RuleEngine(["not planted -> seed, priority 3"])
+    action_queue = CommandQueue()
+
+    engine.run(plants, irrigation, action_queue)
+    engine.run(plants, irrigation, action_queue)
+
+    empty = sum(not plant.has_plant for plant in plants)
+    assert engine.submitted == empty
+    assert action_queue.lane_sizes()["monitoring"] == empty
+
+
+def test_full_lane_drops_commands():
+    plants, irrigation = random_greenhouse(50, seed=3)
+    engine = RuleEngine(["planted or not planted -> monitor"])
+    action_queue = CommandQueue(lane_capacity=10)
+
+    engine.run(plants, irrigation, action_queue)
+
+    assert engine.submitted == 10
+    assert engine.dropped == 40
+
+
+def test_load_rules_from_file(tmp_path):
+    path = tmp_path / "rules.txt"
+    path.write_text("# watering\nsoil_moisture < 0.3 -> water\n\n  ripeness == ripe -> harvest  \n")
+
+    assert load_rules(["not planted -> seed"], str(path)) == [
+        "not planted -> seed",
+        "soil_moisture < 0.3 -> water",
+        "ripeness == ripe -> harvest",
+    ]
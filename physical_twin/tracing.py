@@ -0,0 +1,339 @@
+"""
+This module provides tracing and profiling of the robot, simulation and MQTT threads, switched on and off at runtime.
+
+Tracing records the duration of each stage (span) of the threads. The trace context of a span can be carried
+in the queued message dicts, so the time a message waits in a queue and its publishing are linked to the stage
+that sent it. The spans are exported in the Chrome trace event format (chrome://tracing, Perfetto).
+
+Profiling runs cProfile around the traced stages of every thread (from Python 3.12 on, of one thread at a time)
+and samples the stacks of all threads, exported as pstats text and as collapsed stacks for flame graphs.
+
+When neither is switched on, a span costs a single flag check.
+"""
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+
+# directory the traces and profiles are exported to (relative to the working directory)
+TRACE_DIRECTORY = "traces"
+
+_tracing = False
+_sample_rate = 1.0
+_spans = deque(maxlen=100_000)
+_ids = itertools.count(1)
+_local = threading.local()
+
+_profiling = False
+_profilers = {}  # cProfile profiler of each thread, by thread ID
+_enabled = set()  # IDs of the threads whose profiler is enabled
+_stacks = Counter()  # sampled collapsed stacks and their counts
+_lock = threading.Lock()
+_profilers_disabled = threading.Condition(_lock)
+
+# from Python 3.12 on, cProfile uses sys.monitoring and only one profiler can be enabled in the process at a time
+_SINGLE_PROFILER = sys.version_info >= (3, 12)
+
+# pushed on the span stack of a thread instead of a context if the trace is not sampled
+_UNSAMPLED = object()
+
+
+def start_tracing(sample_rate: float = 1.0, max_spans: int = 100_000):
+    """
+    Starts recording spans, discarding previously recorded ones.
+
+    Parameters:
+        sample_rate (float): The share of traces recorded, decided at the root span of each trace.
+        max_spans (int): The maximum number of recorded spans, older spans are dropped.
+    """
+    global _tracing, _sample_rate, _spans
+    _spans = deque(maxlen=max_spans)
+    _sample_rate = sample_rate
+    _tracing = True
+
+
+def stop_tracing() -> list:
+    """
+    Stops recording spans.
+
+    Returns:
+        list[tuple]: The recorded spans.
+    """
+    global _tracing
+    _tracing = False
+    return list(_spans)
+
+
+def get_spans() -> list:
+    """
+    Returns the spans recorded so far, without stopping.
+    """
+    return list(_spans)
+
+
+def is_tracing() -> bool:
+    return _tracing
+
+
+def current_context():
+    """
+    Returns the trace context of the current span of this thread, to be carried in a queued message dict,
+    or None if no traced span is active.
+    The context includes the time it was taken, so the consumer can record how long the message waited.
+    """
+    stack = getattr(_local, "stack", None)
+    if not _tracing or not stack or stack[-1] is _UNSAMPLED:
+        return None
+    trace_id, span_id = stack[-1]
+    return {"trace_id": trace_id, "span_id": span_id, "time": time.perf_counter_ns()}
+
+
+@contextmanager
+def span(name: str, parent: dict = None, **attributes):
+    """
+    Records the duration of the enclosed block as a span.
+    The span is a child of the given parent context (e.g. from a message dict), or of the enclosing span of this thread.
+
+    Parameters:
+        name (str): The name of the stage, e.g. "simulation.run_cycle".
+        parent (dict): Optional trace context returned by current_context().
+        attributes: Additional values stored with the span.
+    """
+    if not (_tracing or _profiling):
+        yield
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    profiler = None
+    if _profiling and not stack:
+        # profile the outermost stage of the thread
+        profiler = _enable_profiler()
+
+    try:
+        context = _UNSAMPLED
+        parent_id = None
+        if _tracing:
+            if parent is not None:
+                trace_id, parent_id = parent["trace_id"], parent["span_id"]
+            elif stack and stack[-1] is not _UNSAMPLED:
+                trace_id, parent_id = stack[-1]
+            elif not stack and random.random() < _sample_rate:
+                trace_id = next(_ids)
+            else:
+                trace_id = None
+            if trace_id is not None:
+                context = (trace_id, next(_ids))
+
+        stack.append(context)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            if context is not _UNSAMPLED:
+                _spans.append((name, context[0], context[1], parent_id, threading.get_ident(), start, end, attributes))
+    finally:
+        if profiler is not None:
+            _disable_profiler(profiler)
+
+
+def _enable_profiler():
+    """
+    Enables the cProfile profiler of this thread, unless profiling stopped meanwhile or, from Python 3.12 on,
+    the profiler of another thread is enabled.
+
+    Returns:
+        cProfile.Profile: The enabled profiler, or None.
+    """
+    thread_id = threading.get_ident()
+    with _lock:
+        if not _profiling or (_SINGLE_PROFILER and _enabled):
+            return None
+        profiler = _profilers.get(thread_id)
+        if profiler is None:
+            profiler = _profilers[thread_id] = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiling tool is active, the stack samples still cover this thread
+            return None
+        _enabled.add(thread_id)
+        return profiler
+
+
+def _disable_profiler(profiler):
+    profiler.disable()
+    with _lock:
+        _enabled.discard(threading.get_ident())
+        _profilers_disabled.notify_all()
+
+
+def record_span(name: str, start: int, end: int = None, parent: dict = None, **attributes):
+    """
+    Records a span with explicit start and end times (time.perf_counter_ns()), e.g. the time a message waited in a queue.
+    """
+    if not _tracing or parent is None:
+        return
+    end = end if end is not None else time.perf_counter_ns()
+    _spans.append(
+        (name, parent["trace_id"], next(_ids), parent["span_id"], threading.get_ident(), start, end, attributes)
+    )
+
+
+def to_chrome_trace(spans: list) -> dict:
+    """
+    Converts spans into the Chrome trace event format.
+    """
+    pid = os.getpid()
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_names.get(tid, str(tid))}}
+        for tid in {s[4] for s in spans}
+    ]
+    for name, trace_id, span_id, parent_id, tid, start, end, attributes in spans:
+        events.append(
+            {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (end - start) / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": dict(attributes, trace_id=trace_id, span_id=span_id, parent_id=parent_id),
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_trace(spans: list, directory: str = TRACE_DIRECTORY) -> str:
+    """
+    Writes spans to a new Chrome trace file in the trace directory.
+
+    Returns:
+        str: The path of the file.
+    """
+    path = _new_file(directory, "trace", "json")
+    with open(path, "w") as f:
+        json.dump(to_chrome_trace(spans), f)
+    return path
+
+
+def start_profiling(interval: float = 0.01):
+    """
+    Starts profiling the traced stages with cProfile and sampling the stacks of all threads.
+
+    Parameters:
+        interval (float): The time in seconds between two stack samples.
+    """
+    global _profiling
+    with _lock:
+        if _profiling:
+            return
+        _profilers.clear()
+        _stacks.clear()
+        _profiling = True
+    threading.Thread(target=_sample_stacks, args=(interval,), name="stack-sampler", daemon=True).start()
+
+
+def stop_profiling(directory: str = TRACE_DIRECTORY, timeout: float = 5.0) -> dict:
+    """
+    Stops profiling and writes the cProfile statistics and the sampled stacks to new files in the trace directory.
+    Waits for the threads to finish their profiled stages, so each profiler is disabled by its own thread before
+    its statistics are collected. Profilers still enabled after the timeout are left out.
+
+    Returns:
+        dict: The paths of the files ("profile" and "stacks") and the profile summary (top 30 functions).
+    """
+    global _profiling
+    with _lock:
+        _profiling = False
+        _profilers_disabled.wait_for(lambda: not _enabled, timeout)
+        profilers = [profiler for thread_id, profiler in _profilers.items() if thread_id not in _enabled]
+
+    stats = None
+    for profiler in profilers:
+        profiler.create_stats()
+        if not profiler.stats:
+            continue
+        if stats is None:
+            stats = pstats.Stats(profiler)
+        else:
+            stats.add(profiler)
+
+    summary = io.StringIO()
+    profile_path = _new_file(directory, "profile", "txt")
+    with open(profile_path, "w") as f:
+        if stats is None:
+            f.write("No traced stage ran while profiling.\n")
+        else:
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats()
+            stats.stream = summary
+            stats.print_stats(30)
+
+    stacks_path = _new_file(directory, "stacks", "txt")
+    with open(stacks_path, "w") as f:
+        for stack, count in _stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    return {"profile": profile_path, "stacks": stacks_path, "summary": summary.getvalue()}
+
+
+def is_profiling() -> bool:
+    return _profiling
+
+
+def dump_stacks() -> str:
+    """
+    Returns the current stack of every thread as text.
+    """
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    lines = []
+    for tid, frame in sys._current_frames().items():
+        lines.append(f"Thread {names.get(tid, tid)} ({tid}):")
+        stack = []
+        while frame is not None:
+            stack.append(f"  {frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+            frame = frame.f_back
+        lines.extend(reversed(stack))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _sample_stacks(interval: float):
+    """
+    Samples the stacks of all other threads until profiling is stopped, counting them as collapsed stacks
+    (thread;outermost function;...;innermost function).
+    """
+    own = threading.get_ident()
+    while _profiling:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            functions = []
+            while frame is not None:
+                functions.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            functions.append(names.get(tid, str(tid)))
+            _stacks[";".join(reversed(functions))] += 1
+        time.sleep(interval)
+
+
+def _new_file(directory: str, kind: str, extension: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.{extension}")
@@ -0,0 +1,44 @@
+"""
+The clock plant ages are measured with.
+It is the system clock, unless a simulated clock is set, e.g. to simulate a whole season in seconds.
+"""
+
+from datetime import datetime, timedelta
+
+_now = datetime.now
+
+
+def now() -> datetime:
+    """
+    Returns the current time of the clock.
+    """
+    return _now()
+
+
+def set_clock(clock=None):
+    """
+    Sets the function returning the current time, e.g. a SimulatedClock, or the system clock if None.
+    The clock is process-wide.
+    """
+    global _now
+    _now = clock if clock is not None else datetime.now
+
+
+class SimulatedClock:
+    """
+    A clock that only advances when told to.
+
+    Attributes:
+        start (datetime): The time the clock was started at.
+        elapsed (float): The simulated time in seconds since the start.
+    """
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.elapsed = 0.0
+
+    def __call__(self) -> datetime:
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def advance_to(self, elapsed: float):
+        self.elapsed = elapsed
@@ -0,0 +1,90 @@
+"""
+Seeded, counter-based random number streams for the simulation.
+
+Every stream is named by a path, e.g. ("plant", 17) or ("environment_field",). Its key is derived from the seed and
+the path with BLAKE2b, and its n-th number is the SplitMix64 output for the counter n under that key. So a stream
+shares no state with other streams: its numbers do not depend on which other streams were drawn from before, or in
+which thread, process or shard, and a simulation split into shards produces the same results as an unsplit one.
+"""
+
+import hashlib
+import os
+import random
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def mix64(z: int) -> int:
+    """
+    The SplitMix64 output function, a bijective mix of a 64 bit integer.
+    """
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def derive_key(seed: int, *path) -> int:
+    """
+    Derives the 64 bit key of a stream from the seed and the stream's path.
+    """
+    return int.from_bytes(hashlib.blake2b(repr((seed, *path)).encode(), digest_size=8).digest(), "little")
+
+
+class Stream(random.Random):
+    """
+    A random number stream with the interface of random.Random, computing its n-th number from its key and n.
+
+    Attributes:
+        key (int): The 64 bit key of the stream.
+        counter (int): The number of 64 bit values drawn so far.
+    """
+
+    def __init__(self, key: int, counter: int = 0):
+        self.key = key
+        super().__init__()
+        self.counter = counter
+
+    def seed(self, a=None, version=2):
+        """
+        Restarts the stream. The key of a stream is fixed, so the argument is ignored.
+        """
+        self.counter = 0
+
+    def getstate(self):
+        return self.key, self.counter
+
+    def setstate(self, state):
+        self.key, self.counter = state
+
+    def random(self) -> float:
+        self.counter += 1
+        return (mix64((self.key + self.counter * GOLDEN_GAMMA) & MASK64) >> 11) * 2.0**-53
+
+    def getrandbits(self, k: int) -> int:
+        bits = 0
+        drawn = 0
+        while drawn < k:
+            self.counter += 1
+            bits = (bits << 64) | mix64((self.key + self.counter * GOLDEN_GAMMA) & MASK64)
+            drawn += 64
+        return bits >> (drawn - k)
+
+
+class RandomStreams:
+    """
+    A class providing the independent random number streams of a simulation.
+
+    Attributes:
+        seed (int): The seed all streams are derived from, random if not given.
+    """
+
+    def __init__(self, seed: int = None):
+        self.seed = seed if seed is not None else int.from_bytes(os.urandom(8), "little")
+
+    def stream(self, *path) -> Stream:
+        """
+        Returns a new stream named by the given path, e.g. stream("plant", 17).
+        Streams with the same seed and path produce the same numbers.
+        """
+        return Stream(derive_key(self.seed, *path))